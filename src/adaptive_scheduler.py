@@ -0,0 +1,194 @@
+import random
+from collections import Counter
+import numpy as np
+from problem_index import has_constraints, problem_index
+from profiling import timed
+from question_generator import build_question, new_seed
+from skill_buckets import BUCKET_COUNT, BUCKET_EDGES, bucket_bounds, skill_cell
+
+# Smoothing for the running latency/error estimates of each skill cell
+ALPHA = 0.2
+# How much a 100% error rate multiplies a cell's weight on top of its latency
+ERROR_WEIGHT = 4.0
+# Assumed for cells that have never been asked
+PRIOR_LATENCY = 3.0
+PRIOR_ERROR = 0.5
+# Cell layout; recorded games keep the version they were played with so they replay exactly.
+# 1: cells by draw buckets, weights summed over all cells. 2: '-' cells by the shown
+# (larger, smaller) buckets, and each operation's weights averaged over its cells.
+SCHEDULER_VERSION = 2
+
+
+class FenwickTree:
+    """Prefix sums over cell weights: O(log n) weight updates and weighted draws"""
+
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.tree = [0.0] * (self.size + 1)
+        self.weights = [0.0] * self.size
+        self.sum = 0.0
+        for i, weight in enumerate(weights):
+            self.update(i, weight)
+
+    def update(self, i, weight):
+        delta = weight - self.weights[i]
+        self.weights[i] = weight
+        self.sum += delta
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        return self.sum
+
+    def find(self, value):
+        """Index of the cell whose cumulative weight range contains value"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] <= value:
+                position = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        return min(position, self.size - 1)
+
+
+class AdaptiveScheduler:
+    """Training mode question source that favours the player's weakest skills.
+
+    A skill cell is (operation, term1 bucket, term2 bucket) of the question
+    as shown, the same key skill_cell gives answers and the stored skill
+    summary. Each cell keeps a running latency and error estimate, seeded
+    from the stored skill summary and updated in O(1) per answer. Within an
+    operation, cells are drawn in proportion to
+    latency * (1 + ERROR_WEIGHT * error rate), and terms uniformly inside
+    them; each operation's share is its mean cell weight, so an operation
+    split into more buckets isn't drawn more often for that alone. A '-'
+    cell (larger, smaller) covers both draws that show as it: term1 from
+    the larger bucket and term2 from the smaller, or the other way round.
+    For an operation with constraints, a cell's terms are drawn from its
+    slice of the problem index (sorted by cell), and cells with no valid
+    pairs are never drawn.
+    """
+
+    @timed('scheduler.build')
+    def __init__(self, ranges, skill_summary=(), seed=None, version=SCHEDULER_VERSION):
+        self.ranges = ranges
+        self.seed = new_seed() if seed is None else seed
+        self.version = version
+        self.rng = random.Random(self.seed)
+        self.cells = []
+        # Per cell: list of (term1 low, term1 high, term2 low, term2 high, pair count) draw rectangles
+        self.bounds = []
+        # (term1 draws, term2 draws, start, end) for cells of constrained operations
+        self.pairs = []
+        for op, terms in ranges.items():
+            if has_constraints(terms):
+                self._add_indexed_cells(op, *problem_index(op, terms))
+            else:
+                self._add_range_cells(op, terms)
+        if not self.cells:
+            raise ValueError('No questions satisfy the constraints')
+        self.index = {cell: i for i, cell in enumerate(self.cells)}
+        cells_per_operation = Counter(op for op, _, _ in self.cells)
+        self.scale = [1.0 if version < 2 else 1.0 / cells_per_operation[op] for op, _, _ in self.cells]
+
+        self.latency = [PRIOR_LATENCY] * len(self.cells)
+        self.error = [PRIOR_ERROR] * len(self.cells)
+        # Kept so a recorded game can rebuild the scheduler exactly
+        self.skill_summary = [list(row) for row in skill_summary]
+        for operation, b1, b2, count, correct, time_sum in self.skill_summary:
+            i = self.index.get((operation, b1, b2))
+            if i is not None and count:
+                self.latency[i] = time_sum / count
+                self.error[i] = 1 - correct / count
+        self.weights = FenwickTree([self.weight(i) for i in range(len(self.cells))])
+
+    @staticmethod
+    def _clip(bounds, term_range):
+        low, high = bounds
+        low = term_range['min'] if low is None else max(low, term_range['min'])
+        high = term_range['max'] if high is None else min(high, term_range['max'])
+        return (low, high) if low <= high else None
+
+    def _shown_buckets(self, op, b1, b2):
+        """Cell of a draw from buckets (b1, b2); '-' shows the larger term first"""
+        if op == '-' and self.version >= 2:
+            return max(b1, b2), min(b1, b2)
+        return b1, b2
+
+    def _add_range_cells(self, op, terms):
+        rectangles = {}
+        for b1 in range(BUCKET_COUNT):
+            x_bounds = self._clip(bucket_bounds(b1), terms['term1'])
+            if x_bounds is None:
+                continue
+            for b2 in range(BUCKET_COUNT):
+                y_bounds = self._clip(bucket_bounds(b2), terms['term2'])
+                if y_bounds is not None:
+                    size = (x_bounds[1] - x_bounds[0] + 1) * (y_bounds[1] - y_bounds[0] + 1)
+                    cell = (op,) + self._shown_buckets(op, b1, b2)
+                    rectangles.setdefault(cell, []).append(x_bounds + y_bounds + (size,))
+        for cell in sorted(rectangles):
+            self.cells.append(cell)
+            self.bounds.append(rectangles[cell])
+            self.pairs.append(None)
+
+    def _add_indexed_cells(self, op, x, y):
+        if op == '-' and self.version >= 2:
+            b1 = np.searchsorted(BUCKET_EDGES, np.maximum(x, y), side='right')
+            b2 = np.searchsorted(BUCKET_EDGES, np.minimum(x, y), side='right')
+        else:
+            b1 = np.searchsorted(BUCKET_EDGES, x, side='right')
+            b2 = np.searchsorted(BUCKET_EDGES, y, side='right')
+        cell_codes = b1 * BUCKET_COUNT + b2
+        order = np.argsort(cell_codes, kind='stable')
+        x, y, cell_codes = x[order], y[order], cell_codes[order]
+        ends = np.searchsorted(cell_codes, np.arange(BUCKET_COUNT * BUCKET_COUNT), side='right')
+        start = 0
+        for code, end in enumerate(ends.tolist()):
+            if end > start:
+                self.cells.append((op,) + divmod(code, BUCKET_COUNT))
+                self.bounds.append(None)
+                self.pairs.append((x, y, start, end))
+            start = end
+
+    def weight(self, i):
+        return self.scale[i] * self.latency[i] * (1 + ERROR_WEIGHT * self.error[i])
+
+    def snapshot(self):
+        """What game_engine.question_source_from_snapshot needs to regenerate these questions"""
+        return {'kind': 'adaptive', 'seed': self.seed, 'skill_summary': self.skill_summary,
+                'version': self.version}
+
+    def prefetch(self):
+        """Draws are O(log cells) on demand, so there is nothing to prepare"""
+
+    def next_question(self):
+        i = self.weights.find(self.rng.random() * self.weights.total())
+        operation = self.cells[i][0]
+        if self.pairs[i] is not None:
+            x, y, start, end = self.pairs[i]
+            j = self.rng.randrange(start, end)
+            return build_question(operation, int(x[j]), int(y[j]))
+        rectangles = self.bounds[i]
+        if len(rectangles) == 1:
+            x_low, x_high, y_low, y_high, _ = rectangles[0]
+        else:
+            # Uniform over the cell's pairs: pick a rectangle by its size
+            k = self.rng.randrange(sum(rectangle[4] for rectangle in rectangles))
+            for x_low, x_high, y_low, y_high, size in rectangles:
+                if k < size:
+                    break
+                k -= size
+        return build_question(operation, self.rng.randint(x_low, x_high), self.rng.randint(y_low, y_high))
+
+    def record(self, operation, term1, term2, time_taken, correct):
+        i = self.index.get(skill_cell(operation, term1, term2))
+        if i is None:
+            return
+        self.latency[i] += ALPHA * (time_taken - self.latency[i])
+        self.error[i] += ALPHA * ((0.0 if correct else 1.0) - self.error[i])
+        self.weights.update(i, self.weight(i))
@@ -0,0 +1,299 @@
+"""Cross-session weakness analytics computed in one chunked scan of the question history"""
+import zlib
+from profiling import timed
+from histogram import BIN_COUNT, QUANTILES, LogHistogram, bin_indexes, quantile_name
+from session_recorder import OPERATIONS, OPERATION_CODES
+from skill_buckets import BUCKET_COUNT, BUCKET_EDGES, bucket_bounds
+
+CHUNK_SIZE = 200_000
+# Seconds a wrong answer is assumed to cost on top of the time spent on it
+ERROR_PENALTY = 5.0
+# Cells and facts answered fewer times than this are too noisy to rank
+MIN_ATTEMPTS = 3
+TOP_FACTS = 20
+
+OPERATION_CODE_SQL = 'CASE operation ' + ' '.join(
+    f"WHEN '{op}' THEN {code}" for code, op in enumerate(OPERATIONS)
+) + ' END'
+CELL_COUNT = len(OPERATIONS) * BUCKET_COUNT * BUCKET_COUNT
+# Columns read per answer. Fetching each row as a Python tuple is most of the cost of a scan,
+# so correct is folded into the operation code to save a column
+ROW_SQL = f'({OPERATION_CODE_SQL}) * 2 + correct, term1, term2, time_taken'
+ROW_DTYPE = [('code', 'i8'), ('term1', 'i8'), ('term2', 'i8'), ('time', 'f8')]
+# Facts are grouped by one packed int64 while every (operation, term1, term2) fits below this
+MAX_PACKED_KEY = 2 ** 62
+
+
+def bucket_label(bucket):
+    low, high = bucket_bounds(bucket)
+    if low is None:
+        return f'<{high + 1}'
+    if high is None:
+        return f'{low}+'
+    return f'{low}-{high}'
+
+
+def cell_keys(codes, term1, term2):
+    """Cell index (operation, term1 bucket, term2 bucket) of each answer, over NumPy arrays"""
+    import numpy as np
+
+    # Divisions are bucketed by their quotient, as in skill_buckets.skill_terms
+    divisions = (codes == OPERATIONS.index('÷')) & (term2 != 0)
+    skill1 = np.where(divisions, term1 // np.where(term2 == 0, 1, term2), term1)
+    buckets1 = np.searchsorted(BUCKET_EDGES, skill1, side='right')
+    buckets2 = np.searchsorted(BUCKET_EDGES, term2, side='right')
+    return (codes * BUCKET_COUNT + buckets1) * BUCKET_COUNT + buckets2
+
+
+def cell_of(key):
+    operation, rest = divmod(key, BUCKET_COUNT * BUCKET_COUNT)
+    bucket1, bucket2 = divmod(rest, BUCKET_COUNT)
+    return OPERATIONS[operation], bucket1, bucket2
+
+
+class WeaknessAccumulator:
+    """Running per-cell tallies/latency histograms and per-fact tallies"""
+
+    def __init__(self):
+        import numpy as np
+
+        self.cell_counts = np.zeros(CELL_COUNT, dtype=np.int64)
+        self.cell_correct = np.zeros(CELL_COUNT, dtype=np.int64)
+        self.cell_histograms = np.zeros((CELL_COUNT, BIN_COUNT), dtype=np.int64)
+        # (operation code, term1, term2) -> [count, correct, time_sum]
+        self.facts = {}
+
+    def add_rows(self, rows):
+        """Add rows selected with ROW_SQL"""
+        import numpy as np
+
+        # Straight from the row tuples into columns, without transposing them into Python lists first
+        table = np.fromiter(rows, dtype=ROW_DTYPE, count=len(rows))
+        codes, correct = np.divmod(table['code'], 2)
+        self.add_chunk(codes, table['term1'], table['term2'], table['time'], correct.astype(np.float64))
+
+    def add_chunk(self, codes, term1, term2, times, correct):
+        import numpy as np
+
+        keys = cell_keys(codes, term1, term2)
+        self.cell_counts += np.bincount(keys, minlength=CELL_COUNT)
+        self.cell_correct += np.bincount(keys, weights=correct, minlength=CELL_COUNT).astype(np.int64)
+        self.cell_histograms += np.bincount(
+            keys * BIN_COUNT + bin_indexes(times), minlength=CELL_COUNT * BIN_COUNT
+        ).reshape(CELL_COUNT, BIN_COUNT)
+
+        low1 = int(term1.min())
+        low2 = int(term2.min())
+        span1 = int(term1.max()) - low1 + 1
+        span2 = int(term2.max()) - low2 + 1
+        if len(OPERATIONS) * span1 * span2 <= MAX_PACKED_KEY:
+            # Pack (operation, term1, term2) into one integer so grouping is a 1-D unique
+            fact_keys = (codes * span1 + (term1 - low1)) * span2 + (term2 - low2)
+            unique, inverse = np.unique(fact_keys, return_inverse=True)
+            rest, b = np.divmod(unique, span2)
+            code, a = np.divmod(rest, span1)
+            a += low1
+            b += low2
+        else:
+            # Ranges too wide to pack without overflowing; group the rows themselves
+            unique, inverse = np.unique(np.stack([codes, term1, term2], axis=1), axis=0, return_inverse=True)
+            code, a, b = unique.T
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse)
+        correct_sums = np.bincount(inverse, weights=correct)
+        time_sums = np.bincount(inverse, weights=times)
+        for code, a, b, count, right, time_sum in zip(
+                code.tolist(), a.tolist(), b.tolist(),
+                counts.tolist(), correct_sums.tolist(), time_sums.tolist()):
+            tally = self.facts.get((code, a, b))
+            if tally is None:
+                self.facts[(code, a, b)] = [count, right, time_sum]
+            else:
+                tally[0] += count
+                tally[1] += right
+                tally[2] += time_sum
+
+    def add_cell(self, operation, bucket1, bucket2, count, correct, histogram):
+        """Add a rolled-up cell; histogram is a blob from cell_rollups"""
+        import numpy as np
+
+        key = (OPERATION_CODES[operation] * BUCKET_COUNT + bucket1) * BUCKET_COUNT + bucket2
+        self.cell_counts[key] += count
+        self.cell_correct[key] += correct
+        self.cell_histograms[key] += np.frombuffer(zlib.decompress(histogram), dtype=np.int64)
+
+    def add_fact(self, operation, term1, term2, count, correct, time_sum):
+        key = (OPERATION_CODES[operation], term1, term2)
+        tally = self.facts.get(key)
+        if tally is None:
+            self.facts[key] = [count, correct, time_sum]
+        else:
+            tally[0] += count
+            tally[1] += correct
+            tally[2] += time_sum
+
+    def cell_rollups(self):
+        """(operation, bucket1, bucket2, count, correct, histogram blob) for every cell seen.
+
+        Histograms are mostly empty bins, so they are stored compressed.
+        """
+        for key in self.cell_counts.nonzero()[0].tolist():
+            operation, bucket1, bucket2 = cell_of(key)
+            yield (operation, bucket1, bucket2, int(self.cell_counts[key]), int(self.cell_correct[key]),
+                   zlib.compress(LogHistogram(self.cell_histograms[key].tolist()).to_bytes()))
+
+    def add_tallies(self, facts, bins):
+        """Add all-time tallies from ResultsStore.weakness_tallies.
+
+        facts are (operation, term1, term2, count, correct, time_sum) rows,
+        which also give the cells' counts; bins are (operation, bucket1,
+        bucket2, bin, count) rows of the cells' latency histograms.
+        """
+        import numpy as np
+
+        if facts:
+            for row in facts:
+                self.add_fact(*row)
+            operations, term1, term2, counts, correct, _ = zip(*facts)
+            keys = cell_keys(np.array([OPERATION_CODES[op] for op in operations], dtype=np.int64),
+                             np.array(term1, dtype=np.int64), np.array(term2, dtype=np.int64))
+            self.cell_counts += np.bincount(keys, weights=counts, minlength=CELL_COUNT).astype(np.int64)
+            self.cell_correct += np.bincount(keys, weights=correct, minlength=CELL_COUNT).astype(np.int64)
+        for operation, bucket1, bucket2, index, count in bins:
+            key = (OPERATION_CODES[operation] * BUCKET_COUNT + bucket1) * BUCKET_COUNT + bucket2
+            self.cell_histograms[key, index] += count
+
+    def cell_bins(self):
+        """(operation, bucket1, bucket2, bin, count) for every non-empty latency bin"""
+        for key, index in zip(*(axis.tolist() for axis in self.cell_histograms.nonzero())):
+            operation, bucket1, bucket2 = cell_of(key)
+            yield operation, bucket1, bucket2, index, int(self.cell_histograms[key, index])
+
+    def fact_rollups(self):
+        """(operation, term1, term2, count, correct, time_sum) for every fact seen"""
+        for (code, a, b), (count, right, time_sum) in self.facts.items():
+            yield OPERATIONS[code], a, b, int(count), int(right), time_sum
+
+    def report(self, top_facts=TOP_FACTS):
+        operations = []
+        for code, operation in enumerate(OPERATIONS):
+            keys = range(code * BUCKET_COUNT * BUCKET_COUNT, (code + 1) * BUCKET_COUNT * BUCKET_COUNT)
+            count = int(self.cell_counts[keys.start:keys.stop].sum())
+            if not count:
+                continue
+            histogram = LogHistogram(self.cell_histograms[keys.start:keys.stop].sum(axis=0).tolist())
+            operations.append(self._row(
+                {'operation': operation},
+                count, int(self.cell_correct[keys.start:keys.stop].sum()), histogram
+            ))
+
+        cells = []
+        for key in self.cell_counts.nonzero()[0].tolist():
+            operation, bucket1, bucket2 = cell_of(key)
+            cells.append(self._row(
+                {'operation': operation, 'term1': bucket_label(bucket1), 'term2': bucket_label(bucket2)},
+                int(self.cell_counts[key]), int(self.cell_correct[key]),
+                LogHistogram(self.cell_histograms[key].tolist())
+            ))
+        cells.sort(key=lambda row: (row['count'] >= MIN_ATTEMPTS, row['cost']), reverse=True)
+
+        facts = []
+        for (code, a, b), (count, right, time_sum) in self.facts.items():
+            if count < MIN_ATTEMPTS:
+                continue
+            accuracy = right / count
+            mean_time = time_sum / count
+            facts.append({
+                'question': f'{a} {OPERATIONS[code]} {b}',
+                'operation': OPERATIONS[code],
+                'term1': a,
+                'term2': b,
+                'count': count,
+                'accuracy': accuracy,
+                'mean_time': mean_time,
+                'cost': mean_time + ERROR_PENALTY * (1 - accuracy),
+            })
+        facts.sort(key=lambda row: row['cost'], reverse=True)
+
+        return {
+            'questions': int(self.cell_counts.sum()),
+            'operations': operations,
+            'cells': cells,
+            'facts': facts[:top_facts],
+        }
+
+    @staticmethod
+    def _row(row, count, correct, histogram):
+        accuracy = correct / count
+        row.update({'count': count, 'accuracy': accuracy})
+        for q in QUANTILES:
+            row[quantile_name(q)] = histogram.quantile(q)
+        # Expected seconds lost per question: typical latency plus the error penalty
+        row['cost'] = row['p50'] + ERROR_PENALTY * (1 - accuracy)
+        return row
+
+
+def fold_history(conn, accumulator, where='', rollup_where='', params=(), chunk_size=CHUNK_SIZE):
+    """Fold raw answers and rollups selected by the WHERE clauses into the accumulator.
+
+    Rows are streamed in chunks, so memory stays bounded however long the
+    history is; the scan costs about 2s per million raw answers.
+    """
+    cursor = conn.execute(f'SELECT {ROW_SQL} FROM questions {where}', params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        accumulator.add_rows(rows)
+    for row in conn.execute(
+        'SELECT operation, bucket1, bucket2, question_count, correct_count, histogram '
+        f'FROM question_rollups {rollup_where}', params
+    ):
+        accumulator.add_cell(*row)
+    for row in conn.execute(
+        'SELECT operation, term1, term2, question_count, correct_count, time_sum '
+        f'FROM fact_rollups {rollup_where}', params
+    ):
+        accumulator.add_fact(*row)
+
+
+@timed('analytics.weakness_report')
+def weakness_report(store, since=None, until=None, chunk_size=CHUNK_SIZE, profile=None):
+    """Accuracy, latency percentiles and costliest facts across the stored history.
+
+    All-time reports come from the per-profile tallies the store keeps up to
+    date as games are saved, so they cost the same however long the history
+    is. A since/until window scans the raw answers instead (see
+    fold_history); compacted history is then read from its rollups, which
+    since/until select by the start of their day or week.
+    """
+    accumulator = WeaknessAccumulator()
+    if since is None and until is None:
+        accumulator.add_tallies(*store.weakness_tallies(profile))
+        return accumulator.report()
+
+    conditions = []
+    rollup_conditions = []
+    params = []
+    if since is not None:
+        conditions.append('answered_at >= ?')
+        rollup_conditions.append('period_start >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('answered_at < ?')
+        rollup_conditions.append('period_start < ?')
+        params.append(until)
+    if profile is not None:
+        conditions.append(
+            'session_id IN (SELECT s.id FROM sessions s JOIN profiles p ON p.id = s.profile_id WHERE p.name = ?)'
+        )
+        rollup_conditions.append('profile_id = (SELECT id FROM profiles WHERE name = ?)')
+        params.append(profile)
+    where = f"WHERE {' AND '.join(conditions)}"
+    rollup_where = f"WHERE {' AND '.join(rollup_conditions)}"
+    with store.connect() as conn:
+        # One read transaction, so a compaction running meanwhile can't make
+        # answers show up in both the raw rows and the rollups (or in neither)
+        conn.execute('BEGIN')
+        fold_history(conn, accumulator, where, rollup_where, params, chunk_size)
+    return accumulator.report()
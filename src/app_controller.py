@@ -0,0 +1,150 @@
+import time
+from PyQt5.QtWidgets import QStackedWidget
+from PyQt5.QtCore import QTimer
+from menu_window import MenuWindow
+from persistence import run_in_background
+import profiling
+
+
+class AppController(QStackedWidget):
+    """Single window that switches between the menu, game and results screens.
+
+    The store, data manager and game screen live for the whole run, so
+    "Play Again" and rematches reuse them instead of rebuilding everything.
+    Only the menu is built up front: the store is opened once the menu has
+    been drawn (open_store), the game screen, which needs NumPy, on the
+    first start, and the results screen (tables, charts) is imported when
+    the first game ends.
+    """
+
+    def __init__(self, store=None, sync=None):
+        super().__init__()
+        self.store = store
+        self.sync = sync
+        self.data_manager = None
+        # Size each screen asked for, restored when it is shown
+        self.page_sizes = {}
+        self.settings = None
+        self.games_started = 0
+        self.next_generator = None
+        self.requested_at = None
+
+        self.menu = MenuWindow()
+        self.menu.start_requested.connect(self.start_game)
+        self.add_page(self.menu)
+        self.game_window = None
+        self.results_window = None
+        self.show_page(self.menu)
+
+    def open_store(self):
+        """Open the results store and fill in the menu's players; returns the store"""
+        if self.data_manager is None:
+            from data_manager import DataManager
+            from results_store import ResultsStore
+            if self.store is None:
+                self.store = ResultsStore()
+            self.data_manager = DataManager(self.store, sync=self.sync)
+            self.menu.set_profiles(self.store.profiles(), self.data_manager.profile)
+        return self.store
+
+    def ensure_game_window(self):
+        if self.game_window is None:
+            from game_window import GameWindow
+            self.game_window = GameWindow(self.data_manager)
+            self.game_window.finished.connect(self.show_results)
+            self.add_page(self.game_window)
+        return self.game_window
+
+    def add_page(self, page):
+        self.page_sizes[page] = page.size()
+        self.addWidget(page)
+
+    def show_page(self, page):
+        self.setCurrentWidget(page)
+        self.setWindowTitle(page.windowTitle())
+        self.resize(self.page_sizes[page])
+
+    def start_game(self, time_limit, ranges, training, profile, generator=None):
+        if self.games_started:
+            # Everything since the last game started, including its results screen
+            profiling.session_report(self.data_manager.current_sheet_name)
+        self.open_store()
+        self.ensure_game_window()
+        self.settings = (time_limit, ranges, training, profile)
+        self.data_manager.profile = profile
+        self.games_started += 1
+        self.requested_at = time.perf_counter()
+        self.game_window.start_game(time_limit, ranges, training=training, generator=generator)
+        self.show_page(self.game_window)
+        # Fires once the first question has actually been painted
+        QTimer.singleShot(0, self.first_question_shown)
+
+    def first_question_shown(self):
+        self.game_window.start_latency = time.perf_counter() - self.requested_at
+
+    def show_results(self):
+        with profiling.span('app.show_results'):
+            from results_window import ResultsWindow
+            game = self.games_started
+            time_limit, ranges, training, profile = self.settings
+            engine = self.game_window.engine
+            session = self.data_manager.session
+            results = ResultsWindow(
+                engine.score,
+                engine.questions_asked,
+                time_limit,
+                self.data_manager.get_statistics(),
+                self.data_manager
+            )
+            results.play_again_requested.connect(self.play_again)
+            results.rematch_requested.connect(self.rematch)
+            self.replace_results(results)
+            self.next_generator = None
+
+            # Save, reload history and prepare the rematch's question source off
+            # the GUI thread; training picks up this game's answers once it is saved
+            def task():
+                from game_engine import create_question_source
+                all_stats = self.data_manager.finish_game(session)
+                generator = create_question_source(ranges, None, training, self.store, profile)
+                generator.prefetch()
+                return all_stats, generator
+            run_in_background(task, lambda result: self.game_saved(results, game, result),
+                              lambda error: self.game_save_failed(results, error))
+
+    @profiling.timed('app.game_saved')
+    def game_saved(self, results, game, result):
+        all_stats, generator = result
+        # Only useful if no other game has been started since
+        if game == self.games_started:
+            self.next_generator = generator
+        # A rematch may already have replaced this results screen
+        if results is self.results_window:
+            results.show_all_game_statistics(all_stats)
+
+    def game_save_failed(self, results, error):
+        # A rematch may already have replaced this results screen
+        if results is self.results_window:
+            results.show_all_games_error(error)
+        else:
+            print(f"Error finishing game: {error!r}")
+
+    def replace_results(self, results):
+        if self.results_window is not None:
+            self.removeWidget(self.results_window)
+            del self.page_sizes[self.results_window]
+            self.results_window.deleteLater()
+        self.results_window = results
+        self.add_page(results)
+        self.show_page(results)
+
+    def play_again(self):
+        self.menu.set_profiles(self.store.profiles(), self.data_manager.profile)
+        self.show_page(self.menu)
+
+    def rematch(self):
+        """Replay the last settings with a fresh seed"""
+        if self.currentWidget() is not self.results_window:
+            return
+        generator, self.next_generator = self.next_generator, None
+        self.start_game(*self.settings, generator=generator)
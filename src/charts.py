@@ -0,0 +1,167 @@
+"""Chart rendering for the results window, done in worker processes and cached on disk"""
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from profiling import count
+from results_store import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, 'chart_cache')
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+CHART_SIZE = (6, 4)
+DPI = 100
+MAX_WORKERS = 2
+# A latency chart is a few hundred pixels wide; longer games are averaged down to this many points
+MAX_LATENCY_POINTS = 1000
+
+_pool = None
+
+
+def chart_key(kind, data, params):
+    """Content hash of everything a chart is drawn from"""
+    payload = json.dumps([kind, data, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def latency_points(times, max_points=MAX_LATENCY_POINTS):
+    """(times, params) for a latency chart: every time, or the means of runs of `step` questions.
+
+    Keeps the chart's cache key and the data sent to the renderer small
+    however long the game was.
+    """
+    if len(times) <= max_points:
+        return list(times), {'window': 5}
+    step = -(-len(times) // max_points)
+    points = [sum(times[i:i + step]) / len(times[i:i + step]) for i in range(0, len(times), step)]
+    return points, {'window': 5, 'step': step}
+
+
+class ChartCache:
+    """Directory of rendered PNGs named by content hash, evicted least recently used first"""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def get(self, key):
+        """Path of a cached chart, marking it as recently used, or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.png'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def render_chart(kind, data, params, path):
+    """Draw one chart to path with the Agg backend (runs in a worker process)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=CHART_SIZE, dpi=DPI)
+    if kind == 'latency':
+        times = data
+        # Each point is the mean of `step` questions, plotted at the first of them
+        step = params.get('step', 1)
+        questions = [1 + i * step for i in range(len(times))]
+        ax.plot(questions, times, marker='o' if step == 1 else None, markersize=3, linewidth=1)
+        window = params.get('window', 5)
+        if len(times) >= window:
+            rolling = [sum(times[i - window:i]) / window for i in range(window, len(times) + 1)]
+            ax.plot(questions[window - 1:], rolling, linewidth=2, label=f'{window * step}-question average')
+            ax.legend()
+        ax.set_xlabel('Question')
+        ax.set_ylabel('Seconds')
+        ax.set_title('Time per Question')
+    elif kind == 'accuracy':
+        operations = [op for op, _ in data]
+        accuracies = [accuracy * 100 for _, accuracy in data]
+        ax.bar(operations, accuracies, color='#4c9be8')
+        ax.set_ylim(0, 100)
+        ax.set_ylabel('Accuracy (%)')
+        ax.set_title('Accuracy by Operation')
+    elif kind == 'heatmap':
+        plt.close(fig)
+        labels = params['labels']
+        operations = params['operations']
+        fig, axes = plt.subplots(1, len(operations), figsize=(3 * len(operations), 3.5), dpi=DPI, squeeze=False)
+        for ax, operation in zip(axes[0], operations):
+            grid = [[float('nan')] * len(labels) for _ in labels]
+            for op, term1, term2, value in data:
+                if op == operation:
+                    grid[labels.index(term2)][labels.index(term1)] = value
+            image = ax.imshow(grid, origin='lower', cmap='magma_r')
+            ax.set_title(f"{operation} {params.get('metric', '')}")
+            ax.set_xticks(range(len(labels)), labels, rotation=45, fontsize=7)
+            ax.set_yticks(range(len(labels)), labels, fontsize=7)
+            ax.set_xlabel('Term 1')
+            ax.set_ylabel('Term 2')
+            fig.colorbar(image, ax=ax, shrink=0.7)
+    fig.tight_layout()
+    # Write under a temporary name so a half-written file is never served from the cache
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fig.savefig(tmp_path, format='png')
+    plt.close(fig)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: forking copies a process already running Qt and worker threads,
+        # whose locks may be held by threads that don't exist in the child
+        _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def request_chart(cache, kind, data, params, callback):
+    """Call callback(path) with a chart, rendering it in the process pool unless cached.
+
+    Returns True when the chart was already cached (callback has been called).
+    The callback of a rendered chart runs on a pool thread.
+    """
+    key = chart_key(kind, data, params)
+    path = cache.get(key)
+    if path is not None:
+        count('charts.cache_hits')
+        callback(path)
+        return True
+    count('charts.rendered')
+
+    def done(future):
+        try:
+            path = future.result()
+        except Exception as e:
+            print(f"Error rendering {kind} chart: {e}")
+            return
+        cache.evict()
+        callback(path)
+
+    _get_pool().submit(render_chart, kind, data, params, cache.path(key)).add_done_callback(done)
+    return False
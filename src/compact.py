@@ -0,0 +1,105 @@
+# compact.py
+"""Roll old games' raw answers up into daily or weekly aggregates.
+
+Examples:
+    python compact.py                                  # use the store's saved retention settings
+    python compact.py --retention-days 90 --period day --save-settings
+    python compact.py --db ../tests/simulated.db --verify --vacuum
+
+The game also compacts in the background, at most once a day, using the
+saved settings (default: keep a year of raw answers, weekly rollups).
+"""
+import argparse
+import math
+import os
+import time
+
+from analytics import weakness_report
+from results_store import ResultsStore, DB_PATH, PERIODS
+
+# Relative difference allowed between float sums added up in a different order
+FLOAT_TOLERANCE = 1e-9
+
+
+def store_pages(store):
+    """(total pages, free pages, page size); deleted rows free pages that VACUUM returns to the OS"""
+    with store.connect() as conn:
+        return tuple(conn.execute(f'PRAGMA {name}').fetchone()[0]
+                     for name in ('page_count', 'freelist_count', 'page_size'))
+
+
+def snapshot(store):
+    """Every all-time statistic compaction must leave unchanged"""
+    profiles = store.profiles()
+    return {
+        'history': store.session_statistics(),
+        'skills': sorted(store.skill_summary(profile) for profile in profiles),
+        # since=0 scans the raw answers and rollups instead of reading the all-time tallies
+        'weakness': [weakness_report(store, since=0)] +
+                    [weakness_report(store, since=0, profile=profile) for profile in profiles],
+    }
+
+
+def differences(before, after, path='statistics'):
+    """Paths where two snapshots differ, ignoring float rounding"""
+    if isinstance(before, dict) and isinstance(after, dict):
+        if before.keys() != after.keys():
+            return [path]
+        return [d for key in before for d in differences(before[key], after[key], f'{path}.{key}')]
+    if isinstance(before, (list, tuple)) and isinstance(after, (list, tuple)):
+        if len(before) != len(after):
+            return [path]
+        return [d for i, (a, b) in enumerate(zip(before, after)) for d in differences(a, b, f'{path}[{i}]')]
+    if isinstance(before, float) and isinstance(after, (int, float)):
+        if math.isclose(before, after, rel_tol=FLOAT_TOLERANCE) or (math.isnan(before) and math.isnan(after)):
+            return []
+        return [path]
+    return [] if before == after else [path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH, help='results store to compact')
+    parser.add_argument('--retention-days', type=float, default=None,
+                        help='keep raw answers for games younger than this')
+    parser.add_argument('--period', choices=sorted(PERIODS), default=None, help='rollup granularity')
+    parser.add_argument('--save-settings', action='store_true',
+                        help='make --retention-days/--period the defaults for background compaction')
+    parser.add_argument('--verify', action='store_true',
+                        help='check that all-time statistics are the same afterwards')
+    parser.add_argument('--vacuum', action='store_true', help='shrink the file afterwards')
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f'no results store at {args.db}')
+
+    store = ResultsStore(args.db)
+    if args.save_settings:
+        retention_days, period = store.compaction_settings()
+        store.set_compaction_settings(
+            retention_days if args.retention_days is None else args.retention_days,
+            period if args.period is None else args.period
+        )
+
+    before = snapshot(store) if args.verify else None
+    pages, free, page_size = store_pages(store)
+    start = time.perf_counter()
+    result = store.compact(args.retention_days, args.period)
+    elapsed = time.perf_counter() - start
+    print(f"Rolled up {result['questions']:,} answers from {result['sessions']:,} sessions in {elapsed:.2f}s")
+
+    if args.vacuum:
+        with store.connect() as conn:
+            conn.execute('VACUUM')
+    after_pages, after_free, _ = store_pages(store)
+    print(f'Data: {(pages - free) * page_size / 1e6:,.1f} MB -> {(after_pages - after_free) * page_size / 1e6:,.1f} MB'
+          f', file {pages * page_size / 1e6:,.1f} MB -> {after_pages * page_size / 1e6:,.1f} MB')
+
+    if args.verify:
+        changed = differences(before, snapshot(store))
+        if changed:
+            raise SystemExit('Statistics changed after compaction: ' + ', '.join(changed[:10]))
+        print('All-time statistics are unchanged')
+
+
+if __name__ == '__main__':
+    main()
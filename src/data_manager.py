@@ -1,121 +1,229 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime
-import os
-import numpy as np
-
-class DataManager:
-    def __init__(self):
-        self.file_path = '../tests/arithmetic_game_results.xlsx'
-        self.current_sheet_name = self.generate_sheet_name()
-        self.df = self.load_or_create_dataframe()
-        self.last_question_time = datetime.now()
-
-    def generate_sheet_name(self):
+import threading
+import time
+from session_recorder import SessionRecorder
+from results_store import ResultsStore, DEFAULT_PROFILE
+from journal import SessionJournal
+from profiling import count, timed
+
+class GameSession:
+    """Everything recorded for one game.
+
+    Kept apart from DataManager so a finished game can be saved in the
+    background while the next one is already being played.
+    """
+
+    def __init__(self, seed=None, ranges=None, started_at=None, journal=True, profile=DEFAULT_PROFILE):
+        self.profile = profile
+        self.started_at = time.time() if started_at is None else started_at
         # Generate a unique sheet name based on timestamp
-        return f"Game_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.name = f"Game_{datetime.fromtimestamp(self.started_at).strftime('%Y%m%d_%H%M%S')}"
+        self.seed = seed
+        self.ranges = ranges
+        self.recorder = SessionRecorder()
+        # GUI latency histograms etc. saved alongside the session
+        self.instrumentation = None
+        # session_log.SessionEventLog attached by the engine, saved for replay
+        self.event_log = None
+        # Opened with the first answer, so games without answers leave no journal behind
+        self.journaling = journal
+        self.journal = None
+
+    def append(self, row):
+        self.recorder.append(*row)
+        if self.journaling:
+            if self.journal is None:
+                self.journal = SessionJournal(self.name, self.started_at, self.seed, self.ranges, self.profile)
+            self.journal.append(row)
 
-    def load_or_create_dataframe(self):
-        if os.path.exists(self.file_path):
-            # File exists, but we'll create a new sheet
-            return pd.DataFrame(columns=['Time_Taken_Seconds', 'Operation', 'Term1', 'Term2', 'Correct'])
+
+class DataManager:
+    def __init__(self, store=None, journal=True, seed=None, ranges=None, started_at=None,
+                 profile=DEFAULT_PROFILE, sync=None):
+        # Opened on first use, so replays that never save don't touch the store
+        self._store = store
+        self.journal_enabled = journal
+        # Optional sync_client.SyncClient that uploads saved games to a leaderboard service
+        self.sync = sync
+        # Player whose games are recorded and whose history is shown
+        self.profile = profile
+        # ((profile, store signature), statistics) for the all-games history
+        self.all_stats_cache = None
+        self.cache_lock = threading.Lock()
+        self.start_session(seed, ranges, started_at)
+
+    def start_session(self, seed=None, ranges=None, started_at=None):
+        """Begin recording a new game; the previous session object stays valid for saving"""
+        self.session = GameSession(seed, ranges, started_at, self.journal_enabled, self.profile)
+        self.last_question_time = time.perf_counter_ns()
+        return self.session
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = ResultsStore()
+        return self._store
+
+    @property
+    def recorder(self):
+        return self.session.recorder
+
+    @property
+    def current_sheet_name(self):
+        return self.session.name
+
+    @property
+    def started_at(self):
+        return self.session.started_at
+
+    @property
+    def instrumentation(self):
+        return self.session.instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, value):
+        self.session.instrumentation = value
+
+    @timed('data.add_result')
+    def add_result(self, operation, term1, term2, user_answer, correct, timing=None):
+        """Record an answer; timing is a keystroke_log.QuestionTiming when input was logged"""
+        current_time = time.perf_counter_ns()
+        if timing is None:
+            time_taken = (current_time - self.last_question_time) / 1e9
+            row = (time_taken, operation, int(term1), int(term2), user_answer, bool(correct))
         else:
-            # Create new file and first sheet
-            return pd.DataFrame(columns=['Time_Taken_Seconds', 'Operation', 'Term1', 'Term2', 'Correct'])
-
-    def add_result(self, operation, term1, term2, correct):
-        current_time = datetime.now()
-        time_taken = (current_time - self.last_question_time).total_seconds()
-        
-        new_row = {
-            'Time_Taken_Seconds': time_taken,
-            'Operation': operation,
-            'Term1': int(term1),
-            'Term2': int(term2),
-            'Correct': int(correct)
-        }
-        self.df = pd.concat([self.df, pd.DataFrame([new_row])], ignore_index=True)
+            time_taken = timing.time_taken
+            row = (time_taken, operation, int(term1), int(term2), user_answer, bool(correct),
+                   timing.first_key, timing.submit_delay, timing.corrections)
+        self.session.append(row)
+        count('answers')
         self.last_question_time = current_time
-
-    def save_results(self):
+        return time_taken
+
+    @timed('data.save_results')
+    def save_results(self, session=None):
+        if session is None:
+            session = self.session
+        # Taken before writing: if it still matches the cache's, nothing else has saved since
+        signature = self.store.signature()
         try:
-            # Read existing Excel file if it exists
-            if os.path.exists(self.file_path):
-                with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a') as writer:
-                    self.df.to_excel(writer, sheet_name=self.current_sheet_name, index=False)
-            else:
-                # Create new Excel file if it doesn't exist
-                self.df.to_excel(self.file_path, sheet_name=self.current_sheet_name, index=False)
+            session_id = self.store.save_session(
+                session.name, session.started_at, session.recorder, session.seed, session.ranges,
+                session.instrumentation, session.profile,
+                None if session.event_log is None else session.event_log.to_bytes()
+            )
         except Exception as e:
             print(f"Error saving results: {e}")
+            # Keep the journal so the game is recovered on the next launch
+            if session.journal is not None:
+                session.journal.close()
+            return False
+
+        if session.journal is not None:
+            session.journal.discard()
+        if self.sync is not None and len(session.recorder):
+            self.sync.submit_session(session)
+        # Extend a still-valid history cache with just this game instead of dropping it. If another
+        # process or the journal recovery thread saved meanwhile, the cache is missing their games
+        with self.cache_lock:
+            if self.all_stats_cache is not None and self.all_stats_cache[0] == (session.profile, signature):
+                all_stats = self.all_stats_cache[1]
+                all_stats.extend(self.format_game_statistics(self.store.session_statistics([session_id])))
+                self.all_stats_cache = ((session.profile, self.store.signature()), all_stats)
+            else:
+                self.all_stats_cache = None
+        return True
+
+    @timed('data.finish_game')
+    def finish_game(self, session=None):
+        """Save the game and return the refreshed all-games history (runs off the GUI thread)"""
+        if session is None:
+            session = self.session
+        if not self.save_results(session):
+            if session.journal is not None:
+                raise RuntimeError('The game could not be saved; it will be recovered the next time the game starts')
+            raise RuntimeError('The game could not be saved')
+        self.compact_if_due()
+        return self.get_all_game_statistics()
+
+    @timed('data.compact_if_due')
+    def compact_if_due(self):
+        """Roll up old history now and then, using the store's retention settings"""
+        try:
+            if self.store.compaction_due():
+                self.store.compact()
+        except Exception as e:
+            print(f"Error compacting results: {e}")
+
+    def export_results(self, path):
+        """Export the profile's stored games to an xlsx workbook, one sheet per game"""
+        self.store.export_xlsx(path, self.profile)
 
+    @timed('data.all_game_statistics')
     def get_all_game_statistics(self):
-        """Get statistics for all games in the Excel file"""
-        if not os.path.exists(self.file_path):
-            return []
+        """Get statistics for all of the profile's stored games"""
+        try:
+            self.store.import_legacy_xlsx()
+        except Exception as e:
+            print(f"Error importing legacy results: {e}")
+
+        with self.cache_lock:
+            key = (self.profile, self.store.signature())
+            if self.all_stats_cache is None or self.all_stats_cache[0] != key:
+                all_stats = self.format_game_statistics(self.store.session_statistics(profile=self.profile))
+                self.all_stats_cache = (key, all_stats)
+            return list(self.all_stats_cache[1])
 
+    def format_game_statistics(self, session_statistics):
         all_stats = []
-        excel_file = pd.ExcelFile(self.file_path)
-        
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
-            
-            if len(df) == 0:
-                continue
-
-            total_questions = len(df)
-            correct_answers = df['Correct'].sum()
+        for name, total_questions, correct_answers, avg_time, performance, latency in session_statistics:
             accuracy = correct_answers / total_questions
-
-            # Calculate performance by operation
-            performance = {}
-            for operation in df['Operation'].unique():
-                op_data = df[df['Operation'] == operation]
-                op_accuracy = op_data['Correct'].mean()
-                performance[operation] = op_accuracy if not pd.isna(op_accuracy) else 0.0
-
-            # Calculate average time per question
-            avg_time = df['Time_Taken_Seconds'].mean()
-
             game_stats = {
-                'Game Session': sheet_name,
+                'Game Session': name,
                 'Total Questions': total_questions,
                 'Correct Answers': int(correct_answers),
                 'Accuracy': f'{accuracy:.2%}',
                 'Average Time per Question': f'{avg_time:.2f} seconds',
+                'Average Time Seconds': avg_time,
+                'Latency Percentiles': latency,
                 'Performance by Operation': performance
             }
             all_stats.append(game_stats)
-
         return all_stats
 
+    @timed('data.weakness_report')
+    def get_weakness_report(self):
+        """Accuracy/latency by operation and term bucket plus the costliest facts, across the profile's games"""
+        from analytics import weakness_report
+        return weakness_report(self.store, profile=self.profile)
+
+    @timed('data.latency_percentiles')
+    def get_latency_percentiles(self):
+        """Answer-time percentiles by operation across all of the profile's games"""
+        return self.store.latency_percentiles(profile=self.profile)
+
+    @timed('data.current_statistics')
     def get_statistics(self):
         """Get statistics for current game"""
-        total_questions = len(self.df)
+        total_questions = len(self.recorder)
         if total_questions == 0:
             return {
                 'Total Questions': 0,
                 'Correct Answers': 0,
                 'Accuracy': '0.00%',
                 'Performance by Operation': {},
+                'Latency Percentiles': {},
                 'Game Session': self.current_sheet_name
             }
 
-        correct_answers = self.df['Correct'].sum()
+        correct_answers = self.recorder.correct_total
         accuracy = correct_answers / total_questions
 
-        # Calculate performance by operation
-        performance = {}
-        for operation in self.df['Operation'].unique():
-            op_data = self.df[self.df['Operation'] == operation]
-            op_accuracy = op_data['Correct'].mean()
-            performance[operation] = op_accuracy if not pd.isna(op_accuracy) else 0.0
-
         return {
             'Total Questions': total_questions,
-            'Correct Answers': int(correct_answers),
+            'Correct Answers': correct_answers,
             'Accuracy': f'{accuracy:.2%}',
-            'Performance by Operation': performance,
+            'Performance by Operation': self.recorder.performance_by_operation(),
+            'Latency Percentiles': self.recorder.latency_percentiles(),
             'Game Session': self.current_sheet_name
         }
\ No newline at end of file
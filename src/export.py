@@ -0,0 +1,185 @@
+# export.py
+"""Stream stored games to a single CSV or Parquet file, one question per row.
+
+Examples:
+    python export.py history.csv
+    python export.py history.parquet --profile Alice --since 2024-01-01 --operation × --operation ÷
+    python export.py everything.csv --db ../tests/simulated.db --stats
+
+Rows are read from the store and written out chunk by chunk, so memory use
+stays the same however long the history is. Parquet needs pyarrow.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+
+from results_store import ResultsStore, DB_PATH
+from session_recorder import OPERATIONS
+
+CHUNK_SIZE = 50_000
+# (output column, SQL expression)
+EXPORT_COLUMNS = [
+    ('profile', 'p.name'),
+    ('session', 's.name'),
+    ('session_started_at', 's.started_at'),
+    ('seq', 'q.seq'),
+    ('answered_at', 'q.answered_at'),
+    ('time_taken', 'q.time_taken'),
+    ('operation', 'q.operation'),
+    ('term1', 'q.term1'),
+    ('term2', 'q.term2'),
+    ('user_answer', 'q.user_answer'),
+    ('correct', 'q.correct'),
+    ('first_key', 'q.first_key'),
+    ('submit_delay', 'q.submit_delay'),
+    ('corrections', 'q.corrections'),
+]
+
+
+def export_query(since=None, until=None, operations=None, profile=None):
+    """SQL and parameters selecting the rows to export, in session then question order.
+
+    Sessions are walked through their start-time index and each session's
+    questions come from its primary key range, so no sort over the whole
+    history is needed.
+    """
+    conditions = []
+    params = []
+    if since is not None:
+        conditions.append('s.started_at >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('s.started_at < ?')
+        params.append(until)
+    if profile is not None:
+        conditions.append('s.profile_id = (SELECT id FROM profiles WHERE name = ?)')
+        params.append(profile)
+    if operations:
+        # Unary + keeps SQLite from reading through the operation index and re-sorting
+        conditions.append(f"+q.operation IN ({', '.join('?' * len(operations))})")
+        params.extend(operations)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = (
+        f"SELECT {', '.join(expression for _, expression in EXPORT_COLUMNS)} "
+        'FROM sessions s JOIN profiles p ON p.id = s.profile_id '
+        f'JOIN questions q ON q.session_id = s.id {where} '
+        'ORDER BY s.started_at, s.id, q.seq'
+    )
+    return sql, params
+
+
+def iter_chunks(store, chunk_size=CHUNK_SIZE, **filters):
+    """Yield lists of up to chunk_size row tuples"""
+    sql, params = export_query(**filters)
+    with store.connect() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+
+def export_csv(store, path, chunk_size=CHUNK_SIZE, **filters):
+    rows_written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in EXPORT_COLUMNS])
+        for rows in iter_chunks(store, chunk_size, **filters):
+            writer.writerows(rows)
+            rows_written += len(rows)
+    return rows_written
+
+
+def export_parquet(store, path, chunk_size=CHUNK_SIZE, **filters):
+    """Write each chunk as its own row group"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit('Parquet export needs pyarrow (pip install pyarrow); CSV export works without it')
+
+    schema = pa.schema([
+        ('profile', pa.string()), ('session', pa.string()), ('session_started_at', pa.float64()),
+        ('seq', pa.int64()), ('answered_at', pa.float64()), ('time_taken', pa.float64()),
+        ('operation', pa.string()), ('term1', pa.int64()), ('term2', pa.int64()),
+        ('user_answer', pa.float64()), ('correct', pa.int8()), ('first_key', pa.float64()),
+        ('submit_delay', pa.float64()), ('corrections', pa.int64()),
+    ])
+    rows_written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in iter_chunks(store, chunk_size, **filters):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            rows_written += len(rows)
+    return rows_written
+
+
+EXPORTERS = {'csv': export_csv, 'parquet': export_parquet}
+
+
+def parse_time(text):
+    """Accept a date (YYYY-MM-DD), a date and time (YYYY-MM-DDTHH:MM[:SS]) or a Unix timestamp"""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'not a date or timestamp: {text!r}')
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process, or None where it can't be read"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='file to write; .csv or .parquet')
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default=None,
+                        help='output format (default: from the file extension)')
+    parser.add_argument('--db', default=DB_PATH, help='results store to read')
+    parser.add_argument('--since', type=parse_time, default=None, help='only games started at or after this')
+    parser.add_argument('--until', type=parse_time, default=None, help='only games started before this')
+    parser.add_argument('--operation', action='append', choices=OPERATIONS, default=None,
+                        help='only these operations (repeatable)')
+    parser.add_argument('--profile', default=None, help='only this player\'s games')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--stats', action='store_true', help='print row count, throughput and peak memory')
+    args = parser.parse_args()
+
+    export_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if export_format not in EXPORTERS:
+        parser.error('cannot tell the format from the file name; pass --format')
+    if not os.path.exists(args.db):
+        parser.error(f'no results store at {args.db}')
+
+    start = time.perf_counter()
+    rows = EXPORTERS[export_format](
+        ResultsStore(args.db), args.output, args.chunk_size,
+        since=args.since, until=args.until, operations=args.operation, profile=args.profile
+    )
+    elapsed = time.perf_counter() - start
+    print(f'Exported {rows:,} rows to {args.output}')
+    if args.stats:
+        peak = peak_rss_mb()
+        print(f'seconds       {elapsed:,.3f}')
+        print(f'rows_per_sec  {rows / elapsed if elapsed else 0.0:,.0f}')
+        print(f"peak_rss_mb   {'n/a' if peak is None else f'{peak:,.1f}'}")
+
+
+if __name__ == '__main__':
+    main()
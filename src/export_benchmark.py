@@ -0,0 +1,91 @@
+# export_benchmark.py
+"""Benchmark export.py: export a synthetic history of N question rows and report time and peak memory.
+
+Example:
+    python export_benchmark.py --rows 5000000
+
+Each export runs in a fresh process, so its peak RSS covers the export alone;
+a smaller history is exported first to show memory does not grow with size.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from results_store import ResultsStore, QUESTION_COLUMNS
+from session_recorder import OPERATIONS, correct_answer
+
+EXPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'export.py')
+QUESTIONS_PER_SESSION = 100
+PROFILE_COUNT = 20
+
+
+def build_store(path, rows, seed=None):
+    """Fill a store with `rows` random answers spread over sessions and profiles"""
+    rng = random.Random(seed)
+    store = ResultsStore(path)
+    start = time.time() - rows
+    with store.connect(write=True) as conn:
+        conn.executemany(
+            'INSERT INTO profiles (id, name) VALUES (?, ?)',
+            [(i + 2, f'Player {i + 1}') for i in range(PROFILE_COUNT)]
+        )
+        sessions = (rows + QUESTIONS_PER_SESSION - 1) // QUESTIONS_PER_SESSION
+        conn.executemany(
+            'INSERT INTO sessions (id, name, started_at, profile_id) VALUES (?, ?, ?, ?)',
+            [(i + 1, f'Game_{i}', start + i * QUESTIONS_PER_SESSION, rng.randrange(PROFILE_COUNT) + 2)
+             for i in range(sessions)]
+        )
+
+        def questions():
+            for i in range(rows):
+                session, seq = divmod(i, QUESTIONS_PER_SESSION)
+                operation = rng.choice(OPERATIONS)
+                term1, term2 = rng.randint(1, 100), rng.randint(1, 12)
+                answer = correct_answer(operation, term1, term2)
+                time_taken = rng.uniform(0.5, 6.0)
+                yield (session + 1, seq, start + i, time_taken, operation, term1, term2,
+                       answer, 1, time_taken / 2, 0.1, 0)
+
+        conn.executemany(
+            f"INSERT INTO questions (session_id, {', '.join(QUESTION_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(QUESTION_COLUMNS)})",
+            questions()
+        )
+
+
+def run_export(db, output, extra=()):
+    """Run export.py in a child process and return its --stats lines"""
+    result = subprocess.run(
+        [sys.executable, EXPORT_SCRIPT, output, '--db', db, '--stats', *extra],
+        capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in (args.rows // 10, args.rows):
+            db = os.path.join(tmp, f'history_{rows}.db')
+            start = time.perf_counter()
+            build_store(db, rows, args.seed)
+            print(f'Built a store of {rows:,} rows in {time.perf_counter() - start:,.1f}s')
+            output = os.path.join(tmp, f'history_{rows}.{args.format}')
+            print(run_export(db, output))
+            print(f'output_mb     {os.path.getsize(output) / 1e6:,.1f}')
+            print(run_export(db, output, ['--operation', '×', '--profile', 'Player 1']))
+            os.remove(output)
+            os.remove(db)
+
+
+if __name__ == '__main__':
+    main()
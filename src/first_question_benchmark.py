@@ -0,0 +1,138 @@
+# first_question_benchmark.py
+"""Time from the results screen to the next game's first question, rebuilding everything versus a rematch.
+
+Examples:
+    python first_question_benchmark.py
+    python first_question_benchmark.py --rounds 10 --training
+
+Runs under QT_QPA_PLATFORM=offscreen against a temporary store holding
+--games synthetic games. Each cold round does what every "Play Again"
+used to: it builds a new controller, so the data manager, the game screen
+and the question source are all made from scratch before the first
+question is painted. Each warm round is a rematch on one long-lived
+AppController, started from the results screen once the previous game has
+been saved and its successor's question source prepared. Every game lasts
+one second and gets a few answers, so it is saved like a real one. The
+script exits with an error if the median warm start takes more than
+--max-warm-ms, or is not at least --min-speedup times quicker than the
+median cold start.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QEventLoop
+from PyQt5.QtWidgets import QApplication
+
+import persistence
+from export_benchmark import QUESTIONS_PER_SESSION, build_store
+from results_store import DEFAULT_PROFILE, ResultsStore
+from simulation import print_report
+
+MAX_WARM_MS = 20
+MIN_SPEEDUP = 5
+# Seconds each game lasts; the menu's smallest time limit
+GAME_SECONDS = 1
+ANSWERS_PER_GAME = 3
+# Seconds to wait for a game to show, end or be saved before giving up
+WAIT_TIMEOUT = 60
+
+
+def wait_until(app, condition, what):
+    deadline = time.perf_counter() + WAIT_TIMEOUT
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise SystemExit(f'Timed out waiting for {what}')
+        app.processEvents(QEventLoop.AllEvents, 10)
+        time.sleep(0.001)
+
+
+def play_to_the_end(app, controller):
+    """Answer a few questions, then wait until the game is saved and the results screen's analysis is done.
+
+    Waiting for the analysis keeps the next start from sharing the CPU with
+    it, whichever way the next game is started.
+    """
+    game_window = controller.game_window
+    for _ in range(ANSWERS_PER_GAME):
+        game_window.answer_input.setText(str(game_window.engine.answer))
+        game_window.handle_enter()
+    wait_until(app, lambda: controller.next_generator is not None, 'the game to be saved')
+    wait_until(app, lambda: persistence.running() == 0, 'the results analysis')
+
+
+def cold_start(app, controller_class, store, settings):
+    """Seconds from asking for a game to its first question, building the controller and screens anew"""
+    requested_at = time.perf_counter()
+    controller = controller_class(store=store)
+    controller.start_game(*settings)
+    wait_until(app, lambda: controller.game_window.start_latency is not None, 'the first question')
+    seconds = time.perf_counter() - requested_at
+    play_to_the_end(app, controller)
+    controller.deleteLater()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5, help='games started each way')
+    parser.add_argument('--games', type=int, default=1000, help='stored games before the first round')
+    parser.add_argument('--training', action='store_true', help='play training mode, which reads the history')
+    parser.add_argument('--max-warm-ms', type=float, default=MAX_WARM_MS)
+    parser.add_argument('--min-speedup', type=float, default=MIN_SPEEDUP)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    # Imported after the QApplication, like main.py does
+    from app_controller import AppController
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'history.db')
+        build_store(db, args.games * QUESTIONS_PER_SESSION, args.seed)
+        store = ResultsStore(db)
+        store.session_statistics()
+
+        controller = AppController(store=store)
+        settings = (GAME_SECONDS, controller.menu.read_ranges(), args.training, DEFAULT_PROFILE)
+        # Not counted: the first start also imports the game modules
+        cold_start(app, AppController, store, settings)
+        cold = [cold_start(app, AppController, store, settings) for _ in range(args.rounds)]
+
+        controller.start_game(*settings)
+        wait_until(app, lambda: controller.game_window.start_latency is not None, 'the first question')
+        play_to_the_end(app, controller)
+        warm = []
+        for _ in range(args.rounds):
+            controller.rematch()
+            wait_until(app, lambda: controller.game_window.start_latency is not None, 'the first question')
+            warm.append(controller.game_window.start_latency)
+            play_to_the_end(app, controller)
+        controller.deleteLater()
+
+    cold_ms = statistics.median(cold) * 1000
+    warm_ms = statistics.median(warm) * 1000
+    report['cold_results_to_first_question_ms'] = cold_ms
+    report['warm_results_to_first_question_ms'] = warm_ms
+    report['warm_max_ms'] = max(warm) * 1000
+    report['speedup'] = cold_ms / warm_ms
+    print_report(report)
+
+    problems = []
+    if warm_ms > args.max_warm_ms:
+        problems.append(f'a rematch takes {warm_ms:.1f}ms to show its first question (limit {args.max_warm_ms}ms)')
+    if cold_ms / warm_ms < args.min_speedup:
+        problems.append(f'a rematch is only {cold_ms / warm_ms:.1f}x quicker than a cold start '
+                        f'(expected {args.min_speedup}x)')
+    if problems:
+        raise SystemExit('; '.join(problems))
+    print(f'A rematch shows its first question in {warm_ms:.1f}ms, {cold_ms / warm_ms:.0f}x quicker than a cold start')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import time
+from adaptive_scheduler import AdaptiveScheduler
+from data_manager import DataManager
+from keystroke_log import KeystrokeLog, KEY, BACKSPACE, CORRECT
+from profiling import timed
+from question_generator import QuestionGenerator
+from results_store import ResultsStore, DEFAULT_PROFILE
+from session_log import SessionEventLog, START, TEXT, SUBMIT
+
+
+def parse_answer(text):
+    """Rounded numeric value of an answer, raising ValueError if it is not a number"""
+    return round(float(text.strip()), 6)
+
+
+class GameEngine:
+    """The game itself with no UI: questions, answer checking, scoring and the clock.
+
+    GameWindow and the simulation harness both drive an engine; anything
+    measured here is the same whether a person or a bot is playing.
+
+    The clock is read once per input and every input is written to the
+    session's event log, so replaying the log with the same clock readings
+    reproduces the game exactly.
+    """
+
+    def __init__(self, duration, generator, data_manager, clock=time.perf_counter_ns, record=True):
+        self.duration = duration
+        self.clock = clock
+        self.deadline = None
+        self.generator = generator
+        self.data_manager = data_manager
+        self.keystrokes = KeystrokeLog(clock=clock)
+        self.score = 0
+        self.questions_asked = 0
+        self.text = ''
+        self.correct_answer_ready = False
+        self.question = None
+        self.event_log = None
+        if record:
+            self.event_log = SessionEventLog(duration, data_manager.session.ranges, generator.snapshot())
+            data_manager.session.event_log = self.event_log
+
+    def start(self):
+        """Start the clock and show the first question"""
+        now = self.clock()
+        if self.event_log is not None:
+            self.event_log.record(START, now)
+        self.deadline = now + int(self.duration * 1e9)
+        return self.new_question(now)
+
+    @property
+    def time_left(self):
+        """Seconds until the deadline; the game ends exactly then, however late timers fire"""
+        if self.deadline is None:
+            return float(self.duration)
+        return max(0, self.deadline - self.clock()) / 1e9
+
+    @property
+    def is_over(self):
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def new_question(self, now=None):
+        operation, a, b, self.answer = self.generator.next_question()
+        self.question = f"{a} {operation} {b}"
+        self.current_operation = operation
+        self.current_term1 = a
+        self.current_term2 = b
+        self.text = ''
+        self.correct_answer_ready = False
+        self.keystrokes.question_shown(now)
+        return self.question
+
+    @timed('engine.type_text')
+    def type_text(self, text):
+        """The answer box now holds text; returns whether it is the correct answer"""
+        now = self.clock()
+        if self.event_log is not None:
+            self.event_log.record(TEXT, now, text)
+        kind = BACKSPACE if len(text) < len(self.text) else KEY
+        self.text = text
+        try:
+            self.correct_answer_ready = bool(text.strip()) and parse_answer(text) == round(self.answer, 6)
+        except ValueError:
+            self.correct_answer_ready = False
+        if self.correct_answer_ready:
+            kind |= CORRECT
+        self.keystrokes.log(kind, now)
+        return self.correct_answer_ready
+
+    @timed('engine.submit')
+    def submit(self, text=None):
+        """Submit the answer box; returns whether it was correct, or None if it is not a number.
+
+        Nothing is recorded once the deadline has passed.
+        """
+        now = self.clock()
+        if text is None:
+            text = self.text
+        if self.event_log is not None:
+            self.event_log.record(SUBMIT, now, text)
+        if self.deadline is not None and now >= self.deadline:
+            return None
+        try:
+            user_value = parse_answer(text)
+        except ValueError:
+            return None
+        is_correct = user_value == round(self.answer, 6)
+
+        time_taken = self.data_manager.add_result(
+            self.current_operation,
+            self.current_term1,
+            self.current_term2,
+            user_value,
+            is_correct,
+            self.keystrokes.submit(now)
+        )
+        self.generator.record(
+            self.current_operation, self.current_term1, self.current_term2, time_taken, is_correct
+        )
+        if is_correct:
+            self.score += 1
+        self.questions_asked += 1
+        self.new_question(now)
+        return is_correct
+
+
+@timed('engine.create_question_source')
+def create_question_source(ranges, seed=None, training=False, store=None, profile=DEFAULT_PROFILE):
+    """Uniform generator, or the adaptive scheduler seeded from the profile's stored skill summary"""
+    if training:
+        if store is None:
+            store = ResultsStore()
+        return AdaptiveScheduler(ranges, store.skill_summary(profile), seed)
+    return QuestionGenerator(ranges, seed)
+
+
+def question_source_from_snapshot(ranges, snapshot):
+    """Rebuild a question source in the state it was in when snapshot() was taken"""
+    if snapshot['kind'] == 'adaptive':
+        # Logs from before the cell layout was versioned used layout 1
+        return AdaptiveScheduler(ranges, snapshot['skill_summary'], snapshot['seed'], snapshot.get('version', 1))
+    return QuestionGenerator(ranges, snapshot['seed'], snapshot['batch_size'])
+
+
+@timed('engine.create')
+def create_engine(duration, ranges, seed=None, training=False, store=None, clock=time.perf_counter_ns,
+                  data_manager=None, generator=None, **data_manager_options):
+    """Build an engine for one game.
+
+    A long-lived data_manager is given a fresh session instead of a new
+    DataManager being created, and a prepared generator skips building one.
+    """
+    if data_manager is not None:
+        store = data_manager.store
+    elif store is None:
+        store = ResultsStore()
+    if generator is None:
+        if data_manager is not None:
+            profile = data_manager.profile
+        else:
+            profile = data_manager_options.get('profile', DEFAULT_PROFILE)
+        generator = create_question_source(ranges, seed, training, store, profile)
+    if data_manager is None:
+        data_manager = DataManager(store, seed=generator.seed, ranges=ranges, **data_manager_options)
+    else:
+        data_manager.start_session(generator.seed, ranges, **data_manager_options)
+    return GameEngine(duration, generator, data_manager, clock)
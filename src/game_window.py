@@ -1,33 +1,56 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QMessageBox
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal
 from PyQt5.QtGui import QFont
-import random
-from results_window import ResultsWindow
-from data_manager import DataManager
+from game_engine import create_engine
+from loop_monitor import EventLoopMonitor
+from profiling import span
 
-TIMER = 1000
+# Countdown display refresh; the game itself ends on the engine's deadline
+DISPLAY_REFRESH_MS = 100
 X_DIMENSIONS = 300
 Y_DIMENSIONS = 300
 WIDTH = 400
 HEIGHT = 300
 
 class GameWindow(QWidget):
-    def __init__(self, time, ranges):
+    """Game screen; reused for every game, each one started with start_game"""
+    finished = pyqtSignal()
+
+    def __init__(self, data_manager=None):
         super().__init__()
-        self.time_left = time
-        self.start_time = time
-        self.ranges = ranges
-        self.score = 0
-        self.questions_asked = 0
+        self.data_manager = data_manager
+        self.engine = None
+        # Set by the controller: seconds from asking for this game to its first question showing
+        self.start_latency = None
         self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.update_timer)
-        self.initUI()
-        self.new_question()
-        self.timer.start(TIMER)
-        self.data_manager = DataManager()
+        self.end_timer = QTimer(self)
+        self.end_timer.setTimerType(Qt.PreciseTimer)
+        self.end_timer.setSingleShot(True)
+        self.end_timer.timeout.connect(self.check_deadline)
+        self.monitor = EventLoopMonitor(self)
         self.skipping_enabled = False
-        self.question_history = []  # List to store question history
-        self.correct_answer_ready = False  # New flag to track if correct answer is ready to submit
+        self.initUI()
+
+    def start_game(self, time, ranges, seed=None, training=False, generator=None):
+        """Start a new game; generator may be a question source prepared in advance"""
+        with span('ui.start_game'):
+            self.start_time = time
+            self.ranges = ranges
+            self.engine = create_engine(
+                time, ranges, seed, training, data_manager=self.data_manager, generator=generator
+            )
+            self.data_manager = self.engine.data_manager
+            self.start_latency = None
+            self.monitor.reset()
+            self.score_label.setText('Score: 0')
+            self.engine.start()
+            self.update_timer()
+            self.show_question()
+            self.timer.start(DISPLAY_REFRESH_MS)
+            self.end_timer.start(int(self.engine.time_left * 1000))
+            self.monitor.start()
 
     def initUI(self):
         self.setWindowTitle('Arithmetic Game')
@@ -52,7 +75,7 @@ class GameWindow(QWidget):
         self.score_label.setFont(QFont('Arial', 18))
         layout.addWidget(self.score_label)
         
-        self.time_label = QLabel(f'Time: {self.time_left}', self)
+        self.time_label = QLabel('Time:', self)
         self.time_label.setAlignment(Qt.AlignCenter)
         self.time_label.setFont(QFont('Arial', 18))
         layout.addWidget(self.time_label)
@@ -65,112 +88,59 @@ class GameWindow(QWidget):
         self.setLayout(layout)
 
     def check_answer_on_type(self):
-        user_answer = self.answer_input.text().strip()
-        try:
-            if user_answer:
-                user_value = float(user_answer)
-                # Round both values to handle floating point precision
-                user_value = round(user_value, 6)
-                correct_answer = round(self.answer, 6)
-                
-                if user_value == correct_answer:
-                    self.correct_answer_ready = True
-                    self.hint_label.setText('Press Enter to submit correct answer')
-                else:
-                    self.correct_answer_ready = False
-                    self.hint_label.setText('Press Enter to submit answer')
-        except ValueError:
-            self.correct_answer_ready = False
+        # Timed by the engine's own hook; a second span here would double the
+        # profiling cost of every keystroke (see keystroke_benchmark.py)
+        if self.engine.type_text(self.answer_input.text()):
+            self.hint_label.setText('Press Enter to submit correct answer')
+        else:
             self.hint_label.setText('Press Enter to submit answer')
 
     def handle_enter(self):
-        user_answer = self.answer_input.text().strip()
-        try:
-            user_value = float(user_answer)
-            user_value = round(user_value, 6)
-            correct_answer = round(self.answer, 6)
-            
-            is_correct = user_value == correct_answer
-            
-            # Record the question and result
-            self.question_history.append({
-                'question': self.question,
-                'user_answer': user_value,
-                'correct_answer': correct_answer,
-                'is_correct': is_correct
-            })
-            
-            # Add result to data manager
-            self.data_manager.add_result(
-                self.current_operation, 
-                self.current_term1, 
-                self.current_term2, 
-                is_correct
-            )
-            
+        with span('ui.submit'):
+            if self.engine.is_over:
+                self.check_deadline()
+                return
+            self.monitor.question_submitted()
+            is_correct = self.engine.submit(self.answer_input.text())
+            if is_correct is None:
+                # Handle invalid input
+                self.hint_label.setText('Please enter a valid number')
+                return
             if is_correct:
-                self.score += 1
-                self.score_label.setText(f'Score: {self.score}')
-            
-            self.questions_asked += 1
-            self.new_question()
-            
-        except ValueError:
-            # Handle invalid input
-            self.hint_label.setText('Please enter a valid number')
+                self.score_label.setText(f'Score: {self.engine.score}')
+            self.show_question()
 
-    def new_question(self):
-        operations = list(self.ranges.keys())
-        operation = random.choice(operations)
-        
-        term1_range = self.ranges[operation]['term1']
-        term2_range = self.ranges[operation]['term2']
-        
-        if operation in ['+', '-']:
-            a = random.randint(term1_range['min'], term1_range['max'])
-            b = random.randint(term2_range['min'], term2_range['max'])
-            if operation == '-' and b > a:
-                a, b = b, a
-        elif operation == '×':
-            a = random.randint(term1_range['min'], term1_range['max'])
-            b = random.randint(term2_range['min'], term2_range['max'])
-        else:  # division
-            b = random.randint(term2_range['min'], term2_range['max'])
-            a = b * random.randint(term1_range['min'], term1_range['max'])
-        
-        self.question = f"{a} {operation} {b}"
-        if operation == '×':
-            self.answer = a * b
-        elif operation == '÷':
-            self.answer = a / b
-        else:
-            self.answer = eval(f"{a} {'+' if operation == '+' else '-'} {b}")
-        
-        self.question_label.setText(self.question)
-        self.answer_input.clear()
-        self.answer_input.setFocus()
-        self.current_operation = operation
-        self.current_term1 = a
-        self.current_term2 = b
-        self.correct_answer_ready = False
-        self.hint_label.setText('Press Enter to submit answer')
+    def show_question(self):
+        with span('ui.show_question'):
+            self.question_label.setText(self.engine.question)
+            # Clearing the box fires textChanged; the engine already starts each question empty
+            self.answer_input.blockSignals(True)
+            self.answer_input.clear()
+            self.answer_input.blockSignals(False)
+            self.answer_input.setFocus()
+            self.hint_label.setText('Press Enter to submit answer')
+            self.monitor.question_shown()
 
     def update_timer(self):
-        self.time_left -= 1
-        self.time_label.setText(f'Time: {self.time_left}')
-        if self.time_left <= 0:
-            self.timer.stop()
-            self.end_game()
+        self.time_label.setText(f'Time: {self.engine.time_left:.1f}')
+
+    def check_deadline(self):
+        if not self.engine.is_over:
+            # Timers can fire a little early; wait out the remainder
+            self.end_timer.start(max(1, int(self.engine.time_left * 1000)))
+            return
+        if not self.timer.isActive():
+            return  # already ended
+        self.timer.stop()
+        self.end_timer.stop()
+        self.monitor.stop()
+        self.time_label.setText('Time: 0.0')
+        self.end_game()
 
     def end_game(self):
-        self.data_manager.save_results()
-        statistics = self.data_manager.get_statistics()
-        self.results_window = ResultsWindow(
-            self.score, 
-            self.questions_asked, 
-            self.start_time, 
-            statistics,
-            self.question_history
-        )
-        self.results_window.show()
-        self.close()
\ No newline at end of file
+        with span('ui.end_game'):
+            summary = self.monitor.summary()
+            if self.start_latency is not None:
+                summary['results_to_first_question_seconds'] = self.start_latency
+            self.data_manager.instrumentation = summary
+            self.finished.emit()
\ No newline at end of file
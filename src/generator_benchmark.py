@@ -0,0 +1,170 @@
+# generator_benchmark.py
+"""Measure question generation throughput and check every operation's questions are exact and uniform.
+
+Examples:
+    python generator_benchmark.py
+    python generator_benchmark.py --questions 1000000 --sample 400000
+
+For each set of ranges in CONFIGS (plain, small, negative and constrained
+terms) the generator is timed drawing --questions questions through
+next_question, as the game does. A --sample of questions is then checked:
+  - every answer is exact ('-' never negative, '÷' always whole),
+  - each operation is drawn equally often,
+  - within an operation, every question its ranges and constraints allow
+    comes up in proportion to the number of draws that show as it (so a
+    '-' question shown as (larger, smaller) counts both orders), and no
+    other question ever does.
+Frequencies are compared with a chi-square test, using the Wilson-Hilferty
+normal approximation; the script exits with an error if any check fails.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from problem_index import has_constraints, pair_count, problem_index, question_terms
+from question_generator import QuestionGenerator
+from simulation import DEFAULT_RANGES, print_report
+
+
+def terms(term1_min, term1_max, term2_min, term2_max, constraints=None):
+    ranges = {'term1': {'min': term1_min, 'max': term1_max}, 'term2': {'min': term2_min, 'max': term2_max}}
+    if constraints:
+        ranges['constraints'] = constraints
+    return ranges
+
+
+CONFIGS = {
+    'default': DEFAULT_RANGES,
+    'small': {'+': terms(1, 9, 1, 9), '-': terms(0, 20, 0, 20), '×': terms(2, 12, 2, 12), '÷': terms(1, 12, 1, 12)},
+    'negative': {'+': terms(-50, 50, -50, 50), '-': terms(-20, 20, -5, 5), '×': terms(-12, 12, -12, 12),
+                 '÷': terms(-10, 10, 1, 10)},
+    'constrained': {
+        '+': terms(1, 99, 1, 99, 'no carry'),
+        '-': terms(10, 99, 1, 99, 'no borrow; answer >= 10'),
+        '×': terms(1, 99, 1, 12, '2-digit by 1-digit; exclude 1, 10'),
+        '÷': terms(1, 100, 1, 12, 'exclude 1; answer digits 1'),
+    },
+}
+# Equal-probability bins each operation's questions are grouped into for the chi-square test
+BINS = 50
+# A chi-square statistic this many standard deviations above its mean fails (p < 1e-6)
+MAX_Z = 4.75
+# Operations with more distinct draws than this only get the exactness check
+MAX_ENUMERATED_PAIRS = 5_000_000
+
+
+def chi_square_z(observed, expected):
+    """Standard score of the chi-square statistic of observed against expected counts"""
+    df = len(observed) - 1
+    if df < 1:
+        return 0.0
+    chi2 = float(((observed - expected) ** 2 / expected).sum())
+    return ((chi2 / df) ** (1 / 3) - (1 - 2 / (9 * df))) / np.sqrt(2 / (9 * df))
+
+
+def allowed_questions(operation, ranges):
+    """(term1, term2) keys of every question an operation allows, and the chance of drawing each"""
+    if has_constraints(ranges):
+        x, y = problem_index(operation, ranges)
+        x, y = x.astype(np.int64), y.astype(np.int64)
+    else:
+        x_all = np.arange(ranges['term1']['min'], ranges['term1']['max'] + 1, dtype=np.int64)
+        y_all = np.arange(ranges['term2']['min'], ranges['term2']['max'] + 1, dtype=np.int64)
+        x, y = np.repeat(x_all, len(y_all)), np.tile(y_all, len(x_all))
+    term1, term2, _ = question_terms(operation, x, y)
+    keys, counts = np.unique(np.stack([term1, term2], axis=1), axis=0, return_counts=True)
+    return keys, counts / counts.sum()
+
+
+def exactness_errors(operation, term1, term2, answer):
+    """Number of questions whose answer isn't the exact result"""
+    if operation == '+':
+        wrong = answer != term1 + term2
+    elif operation == '-':
+        wrong = (answer != term1 - term2) | (answer < 0)
+    elif operation == '×':
+        wrong = answer != term1 * term2
+    else:
+        wrong = term1 != answer * term2
+    return int(wrong.sum())
+
+
+def check_distribution(ranges, sample, seed):
+    """{check name: problem} for a sample of questions from these ranges"""
+    generator = QuestionGenerator(ranges, seed)
+    questions = generator.generate_batch(sample)
+    operations = np.array([q[0] for q in questions], dtype=object)
+    values = np.array([q[1:] for q in questions], dtype=np.int64)
+    problems = {}
+
+    observed = np.array([(operations == op).sum() for op in ranges], dtype=np.float64)
+    z = chi_square_z(observed, np.full(len(ranges), sample / len(ranges)))
+    if z > MAX_Z:
+        problems['operations'] = f'operation frequencies {observed.astype(int).tolist()} are not uniform (z={z:.1f})'
+
+    for op, op_ranges in ranges.items():
+        term1, term2, answer = values[operations == op].T
+        errors = exactness_errors(op, term1, term2, answer)
+        if errors:
+            problems[f'{op} exact'] = f'{errors:,} wrong answers'
+        if not has_constraints(op_ranges) and pair_count(op_ranges) > MAX_ENUMERATED_PAIRS:
+            continue
+        keys, probability = allowed_questions(op, op_ranges)
+        # Position of each drawn question among the allowed ones
+        drawn = np.stack([term1, term2], axis=1)
+        packed = (keys[:, 0] - keys[:, 0].min()) * (np.ptp(keys[:, 1]) + 1) + (keys[:, 1] - keys[:, 1].min())
+        drawn_packed = (drawn[:, 0] - keys[:, 0].min()) * (np.ptp(keys[:, 1]) + 1) + (drawn[:, 1] - keys[:, 1].min())
+        position = np.searchsorted(packed, drawn_packed)
+        position = np.minimum(position, len(packed) - 1)
+        outside = int((packed[position] != drawn_packed).sum())
+        if outside:
+            problems[f'{op} allowed'] = f'{outside:,} questions outside the ranges or constraints'
+            continue
+        # Group the allowed questions into bins of about equal probability
+        bins = np.minimum((np.cumsum(probability) - probability / 2) * BINS, BINS - 1).astype(np.int64)
+        expected = np.bincount(bins, weights=probability) * len(drawn)
+        observed = np.bincount(bins[position], minlength=len(expected)).astype(np.float64)
+        used = expected > 0
+        z = chi_square_z(observed[used], expected[used])
+        if z > MAX_Z:
+            problems[f'{op} uniform'] = f'questions are not drawn uniformly (z={z:.1f})'
+    return problems
+
+
+def throughput(ranges, questions, seed):
+    """Questions per second drawn one at a time through next_question"""
+    generator = QuestionGenerator(ranges, seed)
+    generator.prefetch()
+    start = time.perf_counter()
+    for _ in range(questions):
+        generator.next_question()
+    return questions / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=500_000, help='questions timed per configuration')
+    parser.add_argument('--sample', type=int, default=200_000, help='questions checked per configuration')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    report = {}
+    problems = []
+    for name, ranges in CONFIGS.items():
+        first = QuestionGenerator(ranges, args.seed).generate_batch(1000)
+        if first != QuestionGenerator(ranges, args.seed).generate_batch(1000):
+            problems.append(f'{name}: the same seed gave different questions')
+        report[f'{name}_questions_per_second'] = throughput(ranges, args.questions, args.seed)
+        for check, problem in check_distribution(ranges, args.sample, args.seed).items():
+            problems.append(f'{name} {check}: {problem}')
+    report['checks_failed'] = len(problems)
+    print_report(report)
+
+    if problems:
+        raise SystemExit('Question generation is wrong:\n' + '\n'.join(problems))
+    print(f'Every configuration gives exact answers, drawn uniformly ({args.sample:,} questions each)')
+
+
+if __name__ == '__main__':
+    main()
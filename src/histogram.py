@@ -0,0 +1,125 @@
+import math
+from array import array
+
+# Log-spaced bins from MIN_VALUE up, BINS_PER_DECADE per factor of ten
+MIN_VALUE = 0.001
+BINS_PER_DECADE = 20
+DECADES = 6
+BIN_COUNT = BINS_PER_DECADE * DECADES + 2  # plus underflow and overflow
+_LOG_MIN = math.log10(MIN_VALUE)
+# Percentiles reported wherever latency is summarised
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def bin_index(value):
+    if value < MIN_VALUE:
+        return 0
+    return min(int((math.log10(value) - _LOG_MIN) * BINS_PER_DECADE) + 1, BIN_COUNT - 1)
+
+
+def bin_value(index):
+    """Representative (geometric middle) value of a bin"""
+    if index == 0:
+        return MIN_VALUE / 2
+    return 10 ** (_LOG_MIN + (index - 0.5) / BINS_PER_DECADE)
+
+
+class LogHistogram:
+    """Fixed-size, mergeable histogram of durations in seconds.
+
+    Bins are about 12% wide, so quantiles are within ~6% of the exact value,
+    and any number of histograms can be combined by adding their counts.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = array('q', bytes(8 * BIN_COUNT)) if counts is None else array('q', counts)
+
+    def add(self, value):
+        self.counts[bin_index(value)] += 1
+
+    def add_counts(self, counts):
+        """Add a per-bin count sequence, e.g. from a vectorised bincount"""
+        for i, count in enumerate(counts):
+            if count:
+                self.counts[i] += int(count)
+
+    def merge(self, other):
+        self.add_counts(other.counts)
+        return self
+
+    def total(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        total = self.total()
+        if total == 0:
+            return float('nan')
+        target = q * (total - 1)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen > target:
+                return bin_value(i)
+        return bin_value(BIN_COUNT - 1)
+
+    def percentiles(self):
+        return percentile_summary(self.counts)
+
+    def to_dict(self):
+        """Sparse {bin index: count} form for JSON"""
+        return {str(i): count for i, count in enumerate(self.counts) if count}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for i, count in data.items():
+            histogram.counts[int(i)] = count
+        return histogram
+
+    def to_bytes(self):
+        return self.counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        histogram = cls()
+        histogram.counts = array('q')
+        histogram.counts.frombytes(data)
+        return histogram
+
+
+def bin_indexes(values):
+    """Vectorised bin_index over a NumPy array"""
+    import numpy as np
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indexes = np.floor((np.log10(np.maximum(values, MIN_VALUE)) - _LOG_MIN) * BINS_PER_DECADE).astype(np.int64) + 1
+    indexes[values < MIN_VALUE] = 0
+    return np.minimum(indexes, BIN_COUNT - 1)
+
+
+def quantile_name(q):
+    return f'p{int(q * 100)}'
+
+
+def counts_quantiles(counts, quantiles=QUANTILES):
+    """Vectorised LogHistogram.quantile over a (rows, BIN_COUNT) array of counts; NaN for empty rows"""
+    import numpy as np
+
+    cumulative = np.cumsum(np.atleast_2d(counts), axis=1)
+    total = cumulative[:, -1]
+    values = np.array([bin_value(i) for i in range(BIN_COUNT)])
+    result = np.full((len(cumulative), len(quantiles)), np.nan)
+    for j, q in enumerate(quantiles):
+        # The first bin whose running count passes the target
+        index = np.minimum((cumulative <= (q * (total - 1))[:, None]).sum(axis=1), BIN_COUNT - 1)
+        result[:, j] = np.where(total > 0, values[index], np.nan)
+    return result
+
+
+def percentile_summary(counts):
+    """{'count': n, 'p50': seconds, ...} of one histogram's counts"""
+    histogram = LogHistogram(counts)
+    summary = {'count': histogram.total()}
+    for q in QUANTILES:
+        summary[quantile_name(q)] = histogram.quantile(q)
+    return summary
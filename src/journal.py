@@ -0,0 +1,102 @@
+import json
+import os
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from profiling import timed
+from results_store import DATA_DIR, DEFAULT_PROFILE
+from session_recorder import SessionRecorder
+
+JOURNAL_DIR = os.path.join(DATA_DIR, 'journal')
+
+
+class SessionJournal:
+    """Append-only log of the game in progress, one JSON line per answer.
+
+    The file is line buffered, so each answer reaches the OS as soon as it is
+    recorded and survives the process dying before the game is saved.
+    """
+
+    def __init__(self, name, started_at, seed=None, ranges=None, profile=DEFAULT_PROFILE, directory=JOURNAL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{name}_{os.getpid()}.jsonl')
+        self.file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        # Held for the whole game so recovery can tell this journal is still live
+        _try_lock(self.file)
+        header = {'session': name, 'started_at': started_at, 'seed': seed, 'ranges': ranges, 'profile': profile}
+        self.file.write(json.dumps(header) + '\n')
+
+    @timed('journal.append')
+    def append(self, row):
+        self.file.write(json.dumps(row) + '\n')
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def discard(self):
+        """Remove the journal once its session is safely in the store"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read_journal(f):
+    """Load a journal into a recorder, ignoring a final line torn by a crash"""
+    recorder = SessionRecorder()
+    header = json.loads(f.readline())
+    for line in f:
+        try:
+            row = json.loads(line)
+        except ValueError:
+            break
+        recorder.append(*row)
+    return header, recorder
+
+
+def recover_journals(store, directory=JOURNAL_DIR):
+    """Merge journals left behind by games that never finished into the store"""
+    if not os.path.isdir(directory):
+        return 0
+    recovered = 0
+    for entry in sorted(os.listdir(directory)):
+        if not entry.endswith('.jsonl'):
+            continue
+        path = os.path.join(directory, entry)
+        with open(path, 'r+', encoding='utf-8') as f:
+            if not _try_lock(f):
+                continue  # a running game still owns it
+            f.seek(0)
+            try:
+                header, recorder = read_journal(f)
+                name, started_at = header['session'], header['started_at']
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Error reading journal {entry}: {e}")
+                continue
+            # A crash after the save committed but before the journal was removed
+            # must not produce the session twice
+            if not store.has_session(name, started_at):
+                store.save_session(
+                    name, started_at, recorder, header.get('seed'), header.get('ranges'),
+                    profile=header.get('profile', DEFAULT_PROFILE)
+                )
+                recovered += 1
+        os.remove(path)
+    return recovered
+
+
+def _try_lock(f):
+    """Take a non-blocking exclusive lock on an open file"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
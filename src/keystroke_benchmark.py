@@ -0,0 +1,80 @@
+# keystroke_benchmark.py
+"""Check that logging a keystroke costs under a microsecond, and show what the rest of a keystroke costs.
+
+Examples:
+    python keystroke_benchmark.py
+    python keystroke_benchmark.py --number 2000000 --max-log-ns 500
+
+Times, in nanoseconds per keystroke (fastest of --repeat runs):
+  - KeystrokeLog.log reading the clock itself, and given the time;
+  - GameEngine.type_text as the answer box calls it: event log entry,
+    answer check and keystroke log. Its @timed hook is the only profiling
+    hook on the keystroke path, and with profiling off it isn't bound.
+KeystrokeLog.log must stay under --max-log-ns and type_text must be the
+plain function; otherwise the script exits with an error.
+"""
+import argparse
+import timeit
+
+import profiling
+from data_manager import DataManager
+from game_engine import GameEngine
+from keystroke_log import KEY, KeystrokeLog
+from question_generator import QuestionGenerator
+from simulation import DEFAULT_RANGES, print_report
+
+MAX_LOG_NS = 1000
+# Texts typed in turn: two keys then a backspace
+TYPED = ('1', '12', '1')
+
+
+def per_call_ns(function, number, repeat):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e9
+
+
+def make_engine(seed):
+    ranges = DEFAULT_RANGES
+    engine = GameEngine(3600, QuestionGenerator(ranges, seed), DataManager(journal=False, seed=seed, ranges=ranges))
+    engine.start()
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=1_000_000, help='keystrokes per timed run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-log-ns', type=float, default=MAX_LOG_NS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    profiling.disable()
+
+    keystrokes = KeystrokeLog()
+    report = {
+        'log_ns': per_call_ns(lambda: keystrokes.log(KEY), args.number, args.repeat),
+        'log_given_time_ns': per_call_ns(lambda: keystrokes.log(KEY, 0), args.number, args.repeat),
+    }
+
+    # The engine's event log keeps every input, so each run gets a fresh engine
+    def type_keys(type_text, number):
+        engine = make_engine(args.seed)
+        texts = TYPED * (number // len(TYPED) + 1)
+        return lambda: [type_text(engine, text) for text in texts[:number]]
+
+    def per_keystroke_ns(type_text):
+        number = args.number // 10
+        return min(timeit.timeit(type_keys(type_text, number), number=1) for _ in range(args.repeat)) / number * 1e9
+
+    report['type_text_ns'] = per_keystroke_ns(GameEngine.type_text)
+    hooked = [name for name in profiling.bound_hooks() if name.startswith('GameEngine.')]
+    report['hooks_bound'] = ', '.join(hooked) or 'none'
+    print_report(report)
+
+    if report['log_ns'] > args.max_log_ns:
+        raise SystemExit(f"Keystroke logging costs {report['log_ns']:.0f}ns (limit {args.max_log_ns:g}ns)")
+    if hooked:
+        raise SystemExit(f"Profiling wrappers are bound on the keystroke path while profiling is off: {report['hooks_bound']}")
+    print(f'Keystroke logging costs under {args.max_log_ns:g}ns and no profiling hook runs on the keystroke path')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+from array import array
+from collections import namedtuple
+import time
+
+# Event kinds
+SHOWN = 0
+KEY = 1
+BACKSPACE = 2
+SUBMIT = 3
+# Or-ed into KEY/BACKSPACE when the edit leaves the correct answer in the box
+CORRECT = 4
+
+CAPACITY = 4096  # power of two so the ring index is a mask
+
+QuestionTiming = namedtuple(
+    'QuestionTiming', ['time_taken', 'first_key', 'submit_delay', 'corrections']
+)
+
+
+class KeystrokeLog:
+    """Ring buffer of (perf_counter_ns, kind) input events.
+
+    Events go into two preallocated typed arrays, so logging one is a couple
+    of array stores with no per-event objects. Per-question timings are
+    derived when the answer is submitted from the events since it was shown.
+    """
+
+    def __init__(self, capacity=CAPACITY, clock=time.perf_counter_ns):
+        self.mask = capacity - 1
+        self.times = array('q', bytes(8 * capacity))
+        self.kinds = array('b', bytes(capacity))
+        self.position = 0
+        self.question_start = 0
+        self.shown_at = 0
+        self.clock = clock
+
+    def log(self, kind, now=None):
+        i = self.position & self.mask
+        self.times[i] = self.clock() if now is None else now
+        self.kinds[i] = kind
+        self.position += 1
+
+    def question_shown(self, now=None):
+        self.question_start = self.position
+        self.log(SHOWN, now)
+        self.shown_at = self.times[self.question_start & self.mask]
+
+    def submit(self, now=None):
+        """Log the submit and work out the timings of the current question"""
+        self.log(SUBMIT, now)
+        # Skip the SHOWN event, unless it has already been overwritten by newer events
+        start = max(self.question_start + 1, self.position - self.mask - 1)
+        times = self.times
+        kinds = self.kinds
+        mask = self.mask
+        shown = self.shown_at
+        submitted = times[(self.position - 1) & mask]
+        first_key = None
+        correct_at = None
+        corrections = 0
+        for i in range(start, self.position - 1):
+            kind = kinds[i & mask]
+            if first_key is None:
+                first_key = times[i & mask]
+            if kind & ~CORRECT == BACKSPACE:
+                corrections += 1
+            # Time from when the answer last became correct and stayed correct
+            if not kind & CORRECT:
+                correct_at = None
+            elif correct_at is None:
+                correct_at = times[i & mask]
+        return QuestionTiming(
+            (submitted - shown) / 1e9,
+            float('nan') if first_key is None else (first_key - shown) / 1e9,
+            float('nan') if correct_at is None else (submitted - correct_at) / 1e9,
+            corrections,
+        )
@@ -0,0 +1,135 @@
+import hashlib
+import heapq
+import json
+from datetime import datetime, timezone
+
+TOP_K = 100
+# Leaderboards cover all time plus one per (UTC) day for this many recent days
+RETAIN_DAYS = 7
+ALL_TIME = 'all'
+ALL_OPERATIONS = 'all'
+# Fewer answers than this for an operation (or a whole game) don't make a board
+MIN_QUESTIONS = 5
+
+
+def config_key(ranges):
+    """Short stable key for a range configuration"""
+    text = json.dumps(ranges, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def day_of(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+
+def session_id(session):
+    """Uploads are retried, so a session is recognised by who played it and when"""
+    return f"{session['player']}/{session['session']}/{session['started_at']}"
+
+
+class TopK:
+    """The k best entries seen so far.
+
+    Kept as a min-heap whose root is the entry that would drop out next, so
+    a new score is compared against one value and inserted in O(log k).
+    Equal scores rank the earlier entry first.
+    """
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.heap = []
+        self.count = 0
+
+    def add(self, score, entry):
+        """Offer an entry; returns True if it made the board"""
+        self.count += 1
+        item = (score, -self.count, entry)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+            return True
+        if item[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, item)
+            return True
+        return False
+
+    def top(self, limit=None):
+        ranked = sorted(self.heap, key=lambda item: item[:2], reverse=True)
+        return [entry for _, _, entry in ranked[:limit]]
+
+
+class Leaderboards:
+    """Rolling leaderboards per range configuration, operation and time window.
+
+    Entries are ranked by correct answers per minute spent on the operation
+    (or on the whole game for the 'all' board).
+    """
+
+    def __init__(self, k=TOP_K, retain_days=RETAIN_DAYS):
+        self.k = k
+        self.retain_days = retain_days
+        # (window, config, operation) -> TopK
+        self.boards = {}
+        self.configs = {}
+        self.seen = set()
+        self.days = set()
+
+    def add_session(self, session):
+        """Fold one uploaded session summary in; returns False for a duplicate upload"""
+        key = session_id(session)
+        if key in self.seen:
+            return False
+        # Read everything before changing anything, so a malformed session
+        # raises without being half applied or remembered as seen
+        config = config_key(session['ranges'])
+        day = day_of(session['started_at'])
+        operations = [(operation, count, correct, time_sum)
+                      for operation, (count, correct, time_sum) in session['operations'].items()]
+        totals = [0, 0, 0.0]
+        for _, count, correct, time_sum in operations:
+            totals[0] += count
+            totals[1] += correct
+            totals[2] += time_sum
+
+        self.seen.add(key)
+        self.configs.setdefault(config, session['ranges'])
+        if day not in self.days:
+            self.days.add(day)
+            self._prune_days()
+        for operation in operations:
+            self._offer(session, day, config, *operation)
+        self._offer(session, day, config, ALL_OPERATIONS, *totals)
+        return True
+
+    def _offer(self, session, day, config, operation, count, correct, time_sum):
+        if count < MIN_QUESTIONS or time_sum <= 0:
+            return
+        score = correct / time_sum * 60
+        entry = {
+            'player': session['player'],
+            'session': session['session'],
+            'started_at': session['started_at'],
+            'score': round(score, 3),
+            'questions': count,
+            'accuracy': round(correct / count, 4),
+        }
+        for window in (ALL_TIME, day):
+            if window != ALL_TIME and window not in self.days:
+                continue  # too old to have a daily board
+            board = self.boards.get((window, config, operation))
+            if board is None:
+                board = self.boards[(window, config, operation)] = TopK(self.k)
+            board.add(score, entry)
+
+    def _prune_days(self):
+        """Drop daily boards that have rolled out of the retention window"""
+        if len(self.days) <= self.retain_days:
+            return
+        expired = sorted(self.days)[:-self.retain_days]
+        self.days.difference_update(expired)
+        expired = set(expired)
+        for key in [key for key in self.boards if key[0] in expired]:
+            del self.boards[key]
+
+    def top(self, config, operation=ALL_OPERATIONS, window=ALL_TIME, limit=10):
+        board = self.boards.get((window, config, operation))
+        return [] if board is None else board.top(limit)
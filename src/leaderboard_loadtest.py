@@ -0,0 +1,169 @@
+# leaderboard_loadtest.py
+"""Load test: how many session uploads one leaderboard service process ingests per second.
+
+Example:
+    python leaderboard_loadtest.py --sessions 100000 --batch 500 --clients 4
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from leaderboard import Leaderboards, config_key
+from session_recorder import OPERATIONS
+from simulation import DEFAULT_RANGES, print_report
+from sync_client import SyncClient
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'leaderboard_server.py')
+
+
+def synthetic_sessions(count, players=1000, configs=10, seed=None):
+    """Session summaries shaped like the ones DataManager uploads"""
+    rng = random.Random(seed)
+    range_choices = []
+    for i in range(configs):
+        ranges = json.loads(json.dumps(DEFAULT_RANGES))
+        ranges['+']['term1']['max'] = 100 + i
+        range_choices.append(ranges)
+    start = time.time() - count
+    sessions = []
+    for i in range(count):
+        operations = {}
+        for op in OPERATIONS:
+            asked = rng.randint(5, 20)
+            operations[op] = [asked, rng.randint(asked // 2, asked), round(asked * rng.uniform(1.0, 6.0), 3)]
+        sessions.append({
+            'player': f'Player {rng.randrange(players)}',
+            'session': f'Game_{i}',
+            'started_at': start + i,
+            'ranges': rng.choice(range_choices),
+            'operations': operations,
+        })
+    return sessions
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    """Run the service in its own process, pinned to one core where the OS allows it"""
+    process = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPT, '--port', str(port)], stdout=subprocess.PIPE, text=True
+    )
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(process.pid, {min(os.sched_getaffinity(0))})
+    process.stdout.readline()  # listening banner
+    return process
+
+
+def upload(port, bodies, results):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    accepted = 0
+    for body in bodies:
+        connection.request('POST', '/sessions', body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        accepted += json.loads(response.read())['accepted']
+    connection.close()
+    results.append(accepted)
+
+
+def get(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.request('GET', path)
+    data = json.loads(connection.getresponse().read())
+    connection.close()
+    return data
+
+
+def run_load_test(sessions=100000, batch=500, clients=4, client_sessions=2000, seed=None):
+    payloads = synthetic_sessions(sessions, seed=seed)
+
+    # The leaderboard structure alone, without HTTP or JSON
+    leaderboards = Leaderboards()
+    start = time.perf_counter()
+    for session in payloads:
+        leaderboards.add_session(session)
+    in_process = time.perf_counter() - start
+
+    # Bodies are encoded up front so the clients measure the service, not themselves
+    bodies = [
+        json.dumps({'sessions': payloads[i:i + batch]}, ensure_ascii=False).encode('utf-8')
+        for i in range(0, sessions, batch)
+    ]
+    port = free_port()
+    server = start_server(port)
+    try:
+        results = []
+        threads = [
+            threading.Thread(target=upload, args=(port, bodies[i::clients], results)) for i in range(clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ingest = time.perf_counter() - start
+
+        # Every upload again: all of them must be recognised as duplicates
+        duplicates = []
+        upload(port, bodies, duplicates)
+
+        top = get(port, f"/leaderboard?config={config_key(payloads[0]['ranges'])}&limit=3")
+
+        # End to end through the offline queue and background uploader
+        with tempfile.TemporaryDirectory() as tmp:
+            client = SyncClient(f'http://127.0.0.1:{port}', directory=tmp)
+            extra = synthetic_sessions(client_sessions, seed=seed)
+            for session in extra:
+                session['player'] = 'Queued ' + session['player']
+            start = time.perf_counter()
+            for session in extra:
+                client.submit(session)
+            flushed = client.flush(60)
+            queued = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    if sum(results) != sessions or sum(duplicates) or not top or not flushed:
+        raise RuntimeError(
+            f'Unexpected results: accepted={sum(results)} of {sessions}, '
+            f're-accepted={sum(duplicates)}, leaderboard={top!r}, queue flushed={flushed}'
+        )
+    return {
+        'sessions': sessions,
+        'batch_size': batch,
+        'clients': clients,
+        'ingest_seconds': ingest,
+        'sessions_per_second': sessions / ingest,
+        'in_process_sessions_per_second': sessions / in_process,
+        'queued_client_sessions': client_sessions,
+        'queued_client_sessions_per_second': client_sessions / queued,
+        'top_score': top[0]['score'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=500, help='sessions per upload')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent uploading connections')
+    parser.add_argument('--client-sessions', type=int, default=2000,
+                        help='sessions sent through SyncClient\'s offline queue')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    print_report(run_load_test(args.sessions, args.batch, args.clients, args.client_sessions, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# leaderboard_server.py
+"""Optional local service that collects session summaries from many clients and serves leaderboards.
+
+Example:
+    python leaderboard_server.py --port 8765 --data ../tests/leaderboard.jsonl
+
+    POST /sessions            {"sessions": [summary, ...]}
+                              ->  {"accepted": n, "duplicates": n, "rejected": [{"index": i, "error": "..."}, ...]}
+    GET  /configs             range configurations seen so far
+    GET  /leaderboard?config=<key>&operation=all&window=all&limit=10
+"""
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import urlsplit, parse_qs
+
+from leaderboard import Leaderboards, ALL_OPERATIONS, ALL_TIME
+
+DEFAULT_PORT = 8765
+MAX_BODY = 64 * 1024 * 1024
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LeaderboardServer:
+    """Minimal keep-alive HTTP/1.1 JSON API over a Leaderboards instance.
+
+    Accepted sessions are appended to an optional JSONL log (one write per
+    batch) that is replayed on start-up, so the boards survive a restart.
+    """
+
+    def __init__(self, leaderboards=None, log_path=None):
+        self.leaderboards = leaderboards if leaderboards is not None else Leaderboards()
+        self.log = None
+        if log_path is not None:
+            self.replay(log_path)
+            self.log = open(log_path, 'a', encoding='utf-8')
+
+    def replay(self, path):
+        if not os.path.exists(path):
+            return 0
+        replayed = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    session = json.loads(line)
+                except ValueError:
+                    break  # torn final line
+                replayed += self.leaderboards.add_session(session)
+        return replayed
+
+    def ingest(self, sessions):
+        """Add a batch of sessions; a malformed one is reported by its index and the rest still count"""
+        accepted = []
+        rejected = []
+        for index, session in enumerate(sessions):
+            try:
+                if self.leaderboards.add_session(session):
+                    accepted.append(session)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                rejected.append({'index': index, 'error': f'malformed session: {e!r}'})
+        if self.log is not None and accepted:
+            self.log.write(''.join(json.dumps(session, ensure_ascii=False) + '\n' for session in accepted))
+            self.log.flush()
+        return {'accepted': len(accepted), 'duplicates': len(sessions) - len(accepted) - len(rejected),
+                'rejected': rejected}
+
+    def route(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if method == 'POST' and url.path == '/sessions':
+            try:
+                sessions = json.loads(body)['sessions']
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(400, 'expected {"sessions": [...]}')
+            if not isinstance(sessions, list):
+                raise HTTPError(400, 'expected {"sessions": [...]}')
+            return self.ingest(sessions)
+        if method == 'GET' and url.path == '/configs':
+            return self.leaderboards.configs
+        if method == 'GET' and url.path == '/leaderboard':
+            if 'config' not in query:
+                raise HTTPError(400, 'config is required')
+            try:
+                limit = int(query.get('limit', 10))
+            except ValueError:
+                raise HTTPError(400, 'limit must be an integer')
+            return self.leaderboards.top(
+                query['config'], query.get('operation', ALL_OPERATIONS), query.get('window', ALL_TIME), limit
+            )
+        raise HTTPError(404, f'no route for {method} {url.path}')
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                try:
+                    if length > MAX_BODY:
+                        raise HTTPError(413, 'body too large')
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = 200, self.route(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                    if e.status == 413:
+                        headers['connection'] = 'close'
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                writer.write(
+                    f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client went away or sent garbage
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        address = server.sockets[0].getsockname()
+        print(f'Leaderboard service listening on http://{address[0]}:{address[1]}', flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--data', default=None, help='JSONL log of accepted sessions (default: memory only)')
+    args = parser.parse_args()
+
+    server = LeaderboardServer(log_path=args.data)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import time
+from PyQt5.QtCore import QObject, QTimer, Qt
+from histogram import LogHistogram
+
+# How often the heartbeat expects to run; lateness beyond this is a stall
+HEARTBEAT_MS = 20
+STALL_SECONDS = 0.05
+
+
+class EventLoopMonitor(QObject):
+    """Measures how long the GUI thread is kept from the event loop.
+
+    A precise heartbeat timer records how late each beat fires, and
+    question_submitted/question_shown record the latency from pressing
+    Enter until the event loop is free again with the next question drawn.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.reset()
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.beat)
+
+    def reset(self):
+        self.stalls = LogHistogram()
+        self.submit_latency = LogHistogram()
+        self.stall_count = 0
+        self.worst_stall = 0.0
+        self.submitted_at = None
+
+    def start(self):
+        self.expected = time.perf_counter() + HEARTBEAT_MS / 1000
+        self.timer.start(HEARTBEAT_MS)
+
+    def stop(self):
+        self.timer.stop()
+
+    def beat(self):
+        now = time.perf_counter()
+        lateness = max(0.0, now - self.expected)
+        self.stalls.add(lateness)
+        if lateness >= STALL_SECONDS:
+            self.stall_count += 1
+        self.worst_stall = max(self.worst_stall, lateness)
+        self.expected = now + HEARTBEAT_MS / 1000
+
+    def question_submitted(self):
+        self.submitted_at = time.perf_counter()
+
+    def question_shown(self):
+        """Call once the next question is on screen; measured when the event loop gets back to us"""
+        if self.submitted_at is not None:
+            QTimer.singleShot(0, self._record_submit_latency)
+
+    def _record_submit_latency(self):
+        if self.submitted_at is not None:
+            self.submit_latency.add(time.perf_counter() - self.submitted_at)
+            self.submitted_at = None
+
+    def summary(self):
+        """Histograms and headline figures, in the form stored with the session"""
+        return {
+            'event_loop_lateness': self.stalls.to_dict(),
+            'submit_to_next_question': self.submit_latency.to_dict(),
+            'stall_count': self.stall_count,
+            'worst_stall_seconds': self.worst_stall,
+            'submit_p50_seconds': self.submit_latency.quantile(0.5),
+            'submit_p99_seconds': self.submit_latency.quantile(0.99),
+        }
@@ -1,13 +1,47 @@
 # main.py
+import argparse
 import sys
+import threading
 from PyQt5.QtWidgets import QApplication
-from menu_window import MenuWindow
+from PyQt5.QtCore import QTimer
+import profiling
+from app_controller import AppController
+from warmup import warm_imports
+
+def after_menu_shown(controller):
+    from journal import recover_journals
+    store = controller.open_store()
+    # Start loading the game and analytics stack while the user sets up a game
+    warm_imports()
+    # Merge games left unsaved by a crash back into the store
+    threading.Thread(target=lambda: recover_journals(store), daemon=True).start()
 
 def main():
-    app = QApplication(sys.argv)
-    menu = MenuWindow()
-    menu.show()
-    sys.exit(app.exec_())
+    parser = argparse.ArgumentParser(description='Arithmetic game')
+    parser.add_argument('--sync-url', default=None,
+                        help='leaderboard service to upload finished games to, e.g. http://127.0.0.1:8765')
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='TRACE',
+                        help='time the app\'s hot paths: print a summary table after each game and write '
+                             'a Chrome trace JSON (default: tests/profiles/trace_<time>.json)')
+    args, qt_args = parser.parse_known_args()
+    if args.profile is not None:
+        profiler = profiling.enable(args.profile or None)
+        print(f'Profiling to {profiler.trace_path}')
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    sync = None
+    if args.sync_url:
+        from sync_client import SyncClient
+        sync = SyncClient(args.sync_url)
+    controller = AppController(sync=sync)
+    controller.show()
+    QTimer.singleShot(0, lambda: after_menu_shown(controller))
+    status = app.exec_()
+    if controller.games_started:
+        profiling.session_report(controller.data_manager.current_sheet_name)
+    else:
+        profiling.session_report('startup')
+    sys.exit(status)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
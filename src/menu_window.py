@@ -1,10 +1,19 @@
 # menu_window.py
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit, QMessageBox, QHBoxLayout, QGridLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit, QMessageBox, QHBoxLayout, QGridLayout, QCheckBox, QComboBox
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont, QIntValidator
-from game_window import GameWindow
+from persistence import run_in_background
+from profiling import span
+
+# Wait this long after the last edit before recounting the valid questions
+COUNT_DELAY_MS = 300
+# Fewer valid questions than this is reported as nearly empty
+MIN_QUESTIONS = 10
 
 class MenuWindow(QWidget):
+    # time, ranges, training, profile
+    start_requested = pyqtSignal(int, object, bool, str)
+
     def __init__(self):
         super().__init__()
         self.default_ranges = {
@@ -13,11 +22,23 @@ class MenuWindow(QWidget):
             '×': {'term1': {'min': 1, 'max': 100}, 'term2': {'min': 1, 'max': 12}},
             '÷': {'term1': {'min': 1, 'max': 100}, 'term2': {'min': 1, 'max': 12}}
         }
+        self.count_timer = QTimer(self)
+        self.count_timer.setSingleShot(True)
+        self.count_timer.setInterval(COUNT_DELAY_MS)
+        self.count_timer.timeout.connect(self.update_question_counts)
+        # Only the newest count request updates the labels
+        self.count_request = 0
+        # (ranges, counts) of the newest finished count
+        self.counted = None
+        # (count request, game settings) of a start waiting for its count
+        self.pending_start = None
         self.initUI()
+        # First count once the menu is up, so indexing (and NumPy) doesn't hold up drawing it
+        self.count_timer.start()
 
     def initUI(self):
         self.setWindowTitle('Arithmetic Game - Menu')
-        self.setGeometry(300, 300, 600, 500)
+        self.setGeometry(300, 300, 900, 500)
         
         layout = QVBoxLayout()
         
@@ -26,6 +47,15 @@ class MenuWindow(QWidget):
         title_label.setFont(QFont('Arial', 24, QFont.Bold))
         layout.addWidget(title_label)
 
+        # Pick an existing player or type a new name to create one
+        self.profile_input = QComboBox(self)
+        self.profile_input.setEditable(True)
+        self.profile_input.setInsertPolicy(QComboBox.NoInsert)
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel('Player:'))
+        profile_layout.addWidget(self.profile_input)
+        layout.addLayout(profile_layout)
+
         self.time_input = QLineEdit(self)
         self.time_input.setValidator(QIntValidator(1, 3600))
         self.time_input.setText('120')
@@ -36,6 +66,8 @@ class MenuWindow(QWidget):
 
         range_layout = QGridLayout()
         self.range_inputs = {}
+        self.constraint_inputs = {}
+        self.count_labels = {}
         operations = ['+', '-', '×', '÷']
         for i, op in enumerate(operations):
             range_layout.addWidget(QLabel(f'{op}:'), i, 0)
@@ -65,39 +97,172 @@ class MenuWindow(QWidget):
             term2_layout.addWidget(QLabel('to'))
             term2_layout.addWidget(term2_max)
             range_layout.addLayout(term2_layout, i, 2)
+
+            constraints = QLineEdit(self)
+            constraints.setPlaceholderText('Constraints, e.g. no carry; answer >= 50')
+            range_layout.addWidget(constraints, i, 3)
+            count_label = QLabel(self)
+            count_label.setMinimumWidth(120)
+            range_layout.addWidget(count_label, i, 4)
             
             self.range_inputs[op] = {
                 'term1': (term1_min, term1_max),
                 'term2': (term2_min, term2_max)
             }
+            self.constraint_inputs[op] = constraints
+            self.count_labels[op] = count_label
+            for field in (term1_min, term1_max, term2_min, term2_max, constraints):
+                field.textChanged.connect(self.count_timer.start)
         
         layout.addLayout(range_layout)
 
-        start_button = QPushButton('Start Game', self)
-        start_button.clicked.connect(self.start_game)
-        layout.addWidget(start_button)
+        constraints_help = QLabel(
+            'Constraints are separated by ";": term1/term2/answer compared with a number (answer >= 50), '
+            'answer digits 2, 2-digit by 1-digit, exclude 1, 10, no carry',
+            self
+        )
+        constraints_help.setWordWrap(True)
+        layout.addWidget(constraints_help)
+
+        self.training_checkbox = QCheckBox('Training mode (focus on your weakest questions)', self)
+        layout.addWidget(self.training_checkbox)
+
+        self.start_button = QPushButton('Start Game', self)
+        self.start_button.clicked.connect(self.start_game)
+        layout.addWidget(self.start_button)
 
         self.setLayout(layout)
 
-    def start_game(self):
+    def set_profiles(self, profiles, current):
+        self.profile_input.clear()
+        self.profile_input.addItems(profiles)
+        self.profile_input.setCurrentText(current)
+
+    def read_ranges(self):
+        ranges = {}
+        for op, terms in self.range_inputs.items():
+            ranges[op] = {}
+            for term, (min_input, max_input) in terms.items():
+                min_val = int(min_input.text())
+                max_val = int(max_input.text())
+                if min_val >= max_val:
+                    raise ValueError(f"Invalid range for {op} {term}")
+                ranges[op][term] = {'min': min_val, 'max': max_val}
+            constraints = self.constraint_inputs[op].text().strip()
+            if constraints:
+                ranges[op]['constraints'] = constraints
+        return ranges
+
+    def update_question_counts(self):
+        """Count each operation's valid questions off the GUI thread, building any new index.
+
+        Returns the request number the result will be shown under, or None
+        when the ranges can't be read.
+        """
+        if self.pending_start is not None:
+            # Editing the settings after pressing Start cancels the start
+            self.pending_start = None
+            self.start_button.setEnabled(True)
+        self.count_request += 1
+        request = self.count_request
         try:
-            time = int(self.time_input.text())
-            if time <= 0:
-                raise ValueError("Time must be a positive integer")
-
-            ranges = {}
-            for op, terms in self.range_inputs.items():
-                ranges[op] = {}
-                for term, (min_input, max_input) in terms.items():
-                    min_val = int(min_input.text())
-                    max_val = int(max_input.text())
-                    if min_val >= max_val:
-                        raise ValueError(f"Invalid range for {op} {term}")
-                    ranges[op][term] = {'min': min_val, 'max': max_val}
-
-            self.game_window = GameWindow(time, ranges)
-            self.game_window.show()
-            self.close()
-
-        except ValueError as e:
-            QMessageBox.warning(self, "Invalid Input", str(e))
\ No newline at end of file
+            ranges = self.read_ranges()
+        except ValueError:
+            for label in self.count_labels.values():
+                label.setText('')
+            return None
+
+        def task():
+            counts = {}
+            for op, terms in ranges.items():
+                # Any failure is handed back as the operation's count, so a
+                # pending start is always settled and Start re-enabled; besides
+                # bad constraints (ValueError) the index may not fit in memory
+                # or its cache file may not be writable
+                try:
+                    # Imported here: the index needs NumPy, which the menu shouldn't wait for
+                    from problem_index import question_counts
+                    counts[op] = question_counts({op: terms})[op]
+                except Exception as e:
+                    counts[op] = e
+            return counts
+        run_in_background(task, lambda counts: self.show_question_counts(request, ranges, counts))
+        return request
+
+    def show_question_counts(self, request, ranges, counts):
+        if request != self.count_request:
+            return
+        self.counted = (ranges, counts)
+        for op, count in counts.items():
+            label = self.count_labels[op]
+            if isinstance(count, Exception):
+                label.setText('Invalid constraints' if isinstance(count, ValueError) else 'Counting failed')
+                label.setToolTip(str(count))
+                label.setStyleSheet('color: red')
+                continue
+            label.setToolTip('')
+            if count == 0:
+                label.setText('No questions match')
+                label.setStyleSheet('color: red')
+            elif count < MIN_QUESTIONS:
+                label.setText(f"Only {count} question{'' if count == 1 else 's'}")
+                label.setStyleSheet('color: darkorange')
+            else:
+                label.setText(f'{count:,} questions')
+                label.setStyleSheet('')
+        if self.pending_start is not None and self.pending_start[0] == request:
+            settings = self.pending_start[1]
+            self.pending_start = None
+            self.start_button.setEnabled(True)
+            self.confirm_start(settings, counts)
+
+    def start_game(self):
+        with span('ui.menu_start'):
+            try:
+                profile = self.profile_input.currentText().strip()
+                if not profile:
+                    raise ValueError("Enter a player name")
+
+                time = int(self.time_input.text())
+                if time <= 0:
+                    raise ValueError("Time must be a positive integer")
+
+                ranges = self.read_ranges()
+            except ValueError as e:
+                QMessageBox.warning(self, "Invalid Input", str(e))
+                return
+
+            settings = (time, ranges, self.training_checkbox.isChecked(), profile)
+            if self.counted is not None and self.counted[0] == ranges:
+                self.confirm_start(settings, self.counted[1])
+                return
+            # The count hasn't caught up with the last edit yet; building a
+            # large index can take seconds, so wait for it off the GUI thread
+            self.count_timer.stop()
+            request = self.update_question_counts()
+            self.pending_start = (request, settings)
+            self.start_button.setEnabled(False)
+
+    def confirm_start(self, settings, counts):
+        """Start the game unless an operation has no questions or the user backs out of a sparse one"""
+        for op, count in counts.items():
+            if isinstance(count, ValueError):
+                QMessageBox.warning(self, "Invalid Input", str(count))
+                return
+            if isinstance(count, Exception):
+                QMessageBox.warning(
+                    self, "Error", f"Could not count the {op} questions ({type(count).__name__}: {count})"
+                )
+                return
+            if count == 0:
+                QMessageBox.warning(self, "Invalid Input", f"No {op} questions satisfy the constraints")
+                return
+        sparse = [f"{op}: {count}" for op, count in counts.items() if count < MIN_QUESTIONS]
+        if sparse:
+            answer = QMessageBox.question(
+                self, "Few Questions",
+                f"Only a handful of questions match ({', '.join(sparse)}). Start anyway?"
+            )
+            if answer != QMessageBox.Yes:
+                return
+        self.start_requested.emit(*settings)
@@ -0,0 +1,49 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class PersistenceWorker(QThread):
+    """Run a storage task off the GUI thread and hand its result, or the exception it raised, back"""
+    done = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.task = task
+
+    def run(self):
+        try:
+            result = self.task()
+        except Exception as e:
+            self.failed.emit(e)
+            return
+        self.done.emit(result)
+
+
+def report_failure(error):
+    print(f"Error in background task: {error!r}")
+
+
+# Workers are parentless and kept alive here until they finish, so closing
+# the window that asked for the work never destroys a running thread
+_running = set()
+
+
+def run_in_background(task, callback, error_callback=report_failure):
+    """Run task on a PersistenceWorker and pass its result to callback on the GUI thread.
+
+    If the task raises, error_callback gets the exception instead, so the
+    caller can replace whatever it shows while waiting.
+    """
+    worker = PersistenceWorker(task)
+    worker.done.connect(callback)
+    worker.failed.connect(error_callback)
+    _running.add(worker)
+    worker.finished.connect(lambda: _running.discard(worker))
+    worker.finished.connect(worker.deleteLater)
+    worker.start()
+    return worker
+
+
+def running():
+    """Number of background tasks that haven't finished yet"""
+    return len(_running)
@@ -0,0 +1,239 @@
+"""Per-operation constraints on questions, compiled into an index of every valid draw.
+
+An operation's ranges may carry a 'constraints' string of clauses separated
+by semicolons, for example '+': {..., 'constraints': 'no carry; answer >= 50'}.
+Clauses (case-insensitive):
+
+    term1 >= 10, term2 != 1, answer < 100     compare the question as shown (<, <=, >, >=, =, !=, ≤, ≥, ≠)
+    answer digits 2                           number of digits, ignoring the sign
+    2-digit by 1-digit                        term1 digits 2; term2 digits 1
+    exclude 1, 10                             neither number being combined is 1 or 10
+    no carry                                  no carrying (for - and ÷: in the inverse + or ×)
+
+The numbers being combined are term1 and term2 for + and ×, and the answer
+and term2 for - and ÷ (so 'exclude 1' on ÷ skips dividing by 1 and
+quotients of 1). Every (term1 draw, term2 draw) pair in the ranges that
+passes all clauses is kept in a pair of NumPy arrays, cached on disk by a
+hash of the configuration, so drawing a constrained question is a single
+random index however tight the constraints are.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zipfile
+from functools import lru_cache
+
+import numpy as np
+
+from profiling import count, timed
+from results_store import DATA_DIR
+
+INDEX_DIR = os.path.join(DATA_DIR, 'problem_index')
+# Bump when the meaning of a clause or the pair order changes, so stale caches are ignored
+INDEX_VERSION = 1
+# Constrained ranges bigger than this are refused rather than indexed
+MAX_INDEX_PAIRS = 20_000_000
+# Pairs checked per step while building an index
+CHUNK_PAIRS = 1 << 20
+MEMORY_CACHE_SIZE = 32
+
+_COMPARISONS = {
+    '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+    '=': np.equal, '==': np.equal, '!=': np.not_equal,
+}
+_SYMBOLS = {'≤': '<=', '≥': '>=', '≠': '!='}
+_COMPARE = re.compile(r'(term1|term2|answer)\s*(<=|>=|!=|==|=|<|>)\s*(-?\d+)$')
+_DIGITS = re.compile(r'(term1|term2|answer)\s+digits\s+(\d+)$')
+_BY = re.compile(r'(\d+)[- ]digits? by (\d+)[- ]digits?$')
+_EXCLUDE = re.compile(r'exclude\s+(.*)$')
+_NO_CARRY = {'no carry', 'no carrying', 'no borrow', 'no borrowing'}
+
+
+def question_terms(operation, x, y):
+    """Vectorised build_question: term1/term2 draws into the (term1, term2, answer) shown"""
+    if operation == '-':
+        # Keep the answer non-negative
+        a, b = np.maximum(x, y), np.minimum(x, y)
+        return a, b, a - b
+    if operation == '×':
+        return x, y, x * y
+    if operation == '÷':
+        # Build the dividend from the product so the answer is whole
+        return x * y, y, x
+    return x, y, x + y
+
+
+def has_constraints(terms):
+    return bool(terms.get('constraints', '').strip())
+
+
+def split_clauses(text):
+    """Normalised clauses of a constraints string"""
+    for symbol, replacement in _SYMBOLS.items():
+        text = text.replace(symbol, replacement)
+    return [' '.join(clause.lower().split()) for clause in text.split(';') if clause.strip()]
+
+
+def _digits(values, digits):
+    values = np.abs(values)
+    low = 0 if digits == 1 else 10 ** (digits - 1)
+    return (values >= low) & (values < 10 ** digits)
+
+
+def _no_carry(p, q, operation):
+    """Whether adding (+, -) or long-multiplying (×, ÷) p and q needs no carry"""
+    p, q = np.abs(p), np.abs(q)
+    ok = np.ones(len(p), dtype=bool)
+    if operation in ('+', '-'):
+        while p.any() or q.any():
+            ok &= p % 10 + q % 10 < 10
+            p, q = p // 10, q // 10
+        return ok
+    # Every digit product in the long multiplication stays below 10
+    while p.any():
+        digit = p % 10
+        rest = q
+        while rest.any():
+            ok &= digit * (rest % 10) < 10
+            rest = rest // 10
+        p = p // 10
+    return ok
+
+
+def compile_clause(operation, clause):
+    """Function of (values, operands) returning the mask of pairs a clause allows.
+
+    values maps term1/term2/answer to arrays; operands is the pair of arrays
+    being combined. Raises ValueError for a clause it cannot read.
+    """
+    match = _COMPARE.match(clause)
+    if match:
+        field, symbol, number = match.groups()
+        compare = _COMPARISONS[symbol]
+        return lambda values, operands: compare(values[field], int(number))
+    match = _DIGITS.match(clause)
+    if match:
+        field, digits = match.group(1), int(match.group(2))
+        if digits < 1:
+            raise ValueError(f'{operation}: a number has at least 1 digit ({clause!r})')
+        return lambda values, operands: _digits(values[field], digits)
+    match = _BY.match(clause)
+    if match:
+        digits1, digits2 = int(match.group(1)), int(match.group(2))
+        if digits1 < 1 or digits2 < 1:
+            raise ValueError(f'{operation}: a number has at least 1 digit ({clause!r})')
+        return lambda values, operands: _digits(values['term1'], digits1) & _digits(values['term2'], digits2)
+    match = _EXCLUDE.match(clause)
+    if match:
+        excluded = [int(number) for number in re.findall(r'-?\d+', match.group(1))]
+        if not excluded:
+            raise ValueError(f'{operation}: nothing to exclude in {clause!r}')
+        return lambda values, operands: ~(np.isin(operands[0], excluded) | np.isin(operands[1], excluded))
+    if clause in _NO_CARRY:
+        return lambda values, operands: _no_carry(operands[0], operands[1], operation)
+    raise ValueError(f"{operation}: can't understand the constraint {clause!r}")
+
+
+def compile_constraints(operation, text):
+    """List of clause functions for a constraints string; raises ValueError on the first bad clause"""
+    return [compile_clause(operation, clause) for clause in split_clauses(text)]
+
+
+def index_spec(operation, terms):
+    """Everything an operation's index depends on"""
+    return {
+        'version': INDEX_VERSION,
+        'operation': operation,
+        'term1': [terms['term1']['min'], terms['term1']['max']],
+        'term2': [terms['term2']['min'], terms['term2']['max']],
+        'constraints': split_clauses(terms.get('constraints', '')),
+    }
+
+
+def index_key(spec):
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pair_count(terms):
+    """Number of (term1, term2) draws in an operation's ranges"""
+    return (max(0, terms['term1']['max'] - terms['term1']['min'] + 1)
+            * max(0, terms['term2']['max'] - terms['term2']['min'] + 1))
+
+
+@timed('problem_index.build')
+def build_index(spec):
+    """(term1 draws, term2 draws) of every pair passing the constraints, in term1 then term2 order"""
+    operation = spec['operation']
+    clauses = [compile_clause(operation, clause) for clause in spec['constraints']]
+    (x_min, x_max), (y_min, y_max) = spec['term1'], spec['term2']
+    total = max(0, x_max - x_min + 1) * max(0, y_max - y_min + 1)
+    if total > MAX_INDEX_PAIRS:
+        raise ValueError(f'{operation}: {total:,} term pairs is too many to constrain '
+                         f'(at most {MAX_INDEX_PAIRS:,}); narrow the ranges')
+    dtype = np.int32 if min(x_min, y_min) >= -2**31 and max(x_max, y_max) < 2**31 else np.int64
+    xs = []
+    ys = []
+    y_all = np.arange(y_min, y_max + 1, dtype=np.int64)
+    rows = max(1, CHUNK_PAIRS // max(1, len(y_all)))
+    for start in range(x_min, x_max + 1, rows):
+        x_rows = np.arange(start, min(start + rows, x_max + 1), dtype=np.int64)
+        x = np.repeat(x_rows, len(y_all))
+        y = np.tile(y_all, len(x_rows))
+        term1, term2, answer = question_terms(operation, x, y)
+        values = {'term1': term1, 'term2': term2, 'answer': answer}
+        operands = (answer, term2) if operation in ('-', '÷') else (term1, term2)
+        keep = np.ones(len(x), dtype=bool)
+        for clause in clauses:
+            keep &= clause(values, operands)
+        xs.append(x[keep].astype(dtype))
+        ys.append(y[keep].astype(dtype))
+    if not xs:
+        return np.empty(0, dtype=dtype), np.empty(0, dtype=dtype)
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+@lru_cache(maxsize=MEMORY_CACHE_SIZE)
+def _load_index(key, spec_text, directory):
+    path = os.path.join(directory, f'{key}.npz')
+    try:
+        with np.load(path) as data:
+            x, y = data['x'], data['y']
+        count('problem_index.disk_hits')
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        x, y = build_index(json.loads(spec_text))
+        os.makedirs(directory, exist_ok=True)
+        # Written under a temporary name so a reader never sees half a file
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, x=x, y=y)
+        os.replace(temp_path, path)
+    # Shared between every generator using this configuration
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return x, y
+
+
+def problem_index(operation, terms, directory=INDEX_DIR):
+    """(term1 draws, term2 draws) arrays of every question an operation's ranges and constraints allow.
+
+    Loaded from memory or the disk cache when this configuration was indexed
+    before; raises ValueError for constraints that can't be parsed or ranges
+    too large to index.
+    """
+    spec = index_spec(operation, terms)
+    compile_constraints(operation, terms.get('constraints', ''))
+    return _load_index(index_key(spec), json.dumps(spec, sort_keys=True, ensure_ascii=False), directory)
+
+
+def question_counts(ranges, directory=INDEX_DIR):
+    """Number of distinct draws each operation allows; raises ValueError for a bad configuration"""
+    counts = {}
+    for operation, terms in ranges.items():
+        if has_constraints(terms):
+            counts[operation] = len(problem_index(operation, terms, directory)[0])
+        else:
+            counts[operation] = pair_count(terms)
+    return counts
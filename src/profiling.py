@@ -0,0 +1,245 @@
+"""Opt-in spans, timers and counters showing where the app spends its time.
+
+Hot paths are wrapped with @timed('name'), `with span('name'):` or
+count('name'). Until enable() is called a @timed function is the plain
+function, with its timing wrapper bound in only while profiling is on,
+and span()/count() are a single check of a module global, so they can
+stay in place permanently (profiling_benchmark.py checks what they cost). Once enabled, every span is kept as a Chrome trace
+event (open the JSON in chrome://tracing or https://ui.perfetto.dev) and
+tallied per name for the per-session summary table.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from histogram import LogHistogram
+
+_profiler = None
+# id(plain function) -> (plain function, timing wrapper) for every @timed function
+_hooks = {}
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _NullSpan:
+    """What span() returns while profiling is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Profiler:
+    """Collects trace events for the whole run and span/counter tallies since the last session report"""
+
+    def __init__(self, trace_path):
+        self.trace_path = trace_path
+        os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+        self.reset_tallies()
+
+    def reset_tallies(self):
+        self.window_start = time.perf_counter_ns()
+        # name -> [calls, total ns, max ns, LogHistogram of milliseconds]
+        # (the histogram's range starts at 0.001, which is 1µs in milliseconds)
+        self.spans = {}
+        self.counters = {}
+
+    def record(self, name, start, end, args=None):
+        duration = end - start
+        thread = threading.current_thread()
+        event = {
+            'name': name, 'ph': 'X', 'pid': self.pid, 'tid': thread.ident,
+            'ts': (start - self.origin) / 1e3, 'dur': duration / 1e3,
+        }
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+            self.threads.setdefault(thread.ident, thread.name)
+            tally = self.spans.get(name)
+            if tally is None:
+                self.spans[name] = tally = [0, 0, 0, LogHistogram()]
+            tally[0] += 1
+            tally[1] += duration
+            tally[2] = max(tally[2], duration)
+            tally[3].add(duration / 1e6)
+
+    def count(self, name, value):
+        now = time.perf_counter_ns()
+        with self.lock:
+            self.counters[name] = total = self.counters.get(name, 0) + value
+            self.events.append({
+                'name': name, 'ph': 'C', 'pid': self.pid, 'tid': threading.get_ident(),
+                'ts': (now - self.origin) / 1e3, 'args': {'value': total},
+            })
+
+    def session_report(self, label):
+        """Summary table of the spans and counters since the last report, which starts a new window"""
+        with self.lock:
+            wall = (time.perf_counter_ns() - self.window_start) / 1e9
+            spans, counters = self.spans, self.counters
+            self.reset_tallies()
+        lines = [
+            f'Profile of {label} ({wall:.2f}s wall; span times include nested spans)',
+            f"{'span':<32}{'calls':>8}{'total ms':>11}{'mean ms':>10}{'p99 ms':>10}{'max ms':>10}{'% wall':>8}",
+        ]
+        for name, (calls, total, longest, histogram) in sorted(spans.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f'{name:<32}{calls:>8,}{total / 1e6:>11.2f}{total / calls / 1e6:>10.3f}'
+                f'{histogram.quantile(0.99):>10.3f}{longest / 1e6:>10.2f}'
+                f'{total / 1e9 / wall if wall else 0.0:>8.1%}'
+            )
+        if counters:
+            lines.append('counters: ' + ', '.join(f'{name} {value:,}' for name, value in sorted(counters.items())))
+        return '\n'.join(lines)
+
+    def write_trace(self):
+        """Write every event so far as Chrome trace JSON (rewritten whole, so it is valid after each call)"""
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in threads.items()
+        ]
+        tmp_path = f'{self.trace_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.trace_path)
+
+
+def default_trace_path():
+    # Imported here: the store itself is instrumented, so it imports this module
+    from results_store import DATA_DIR
+    return os.path.join(DATA_DIR, 'profiles', time.strftime('trace_%Y%m%d_%H%M%S.json'))
+
+
+def _namespaces():
+    """The app's modules and the classes in them"""
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if not path or os.path.dirname(os.path.abspath(path)) != SRC_DIR:
+            continue
+        yield module
+        yield from (value for value in vars(module).values() if isinstance(value, type))
+
+
+def _rebind(replacements):
+    """Swap functions in the app's modules and their classes; replacements is {id(old): (old, new)}.
+
+    Covers `from module import function` copies too. References taken
+    before the swap (bound methods, connected slots) keep what they had,
+    so the app enables profiling before building anything.
+    """
+    for owner in _namespaces():
+        for name, value in list(vars(owner).items()):
+            replacement = replacements.get(id(value))
+            if replacement is not None and replacement[0] is value:
+                setattr(owner, name, replacement[1])
+
+
+def enable(trace_path=None):
+    """Start recording and bind the @timed wrappers in; returns the Profiler"""
+    global _profiler
+    _profiler = Profiler(trace_path or default_trace_path())
+    _rebind(_hooks)
+    return _profiler
+
+
+def disable():
+    """Stop recording and put the plain functions back"""
+    global _profiler
+    _profiler = None
+    _rebind({id(wrapper): (wrapper, function) for function, wrapper in _hooks.values()})
+
+
+def bound_hooks():
+    """'owner.name' of every attribute in the app that is currently a @timed wrapper"""
+    wrappers = {id(wrapper) for _, wrapper in _hooks.values()}
+    return sorted({f'{owner.__name__}.{name}' for owner in _namespaces()
+                   for name, value in vars(owner).items() if id(value) in wrappers})
+
+
+def timed_names():
+    """Span names of every @timed function"""
+    return {wrapper.span_name for _, wrapper in _hooks.values()}
+
+
+def enabled():
+    return _profiler is not None
+
+
+def span(name, **args):
+    """Context manager timing a block; args are shown on the trace event"""
+    if _profiler is None:
+        return _NULL_SPAN
+    return _Span(_profiler, name, args)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a span.
+
+    Returns the function itself while profiling is off; enable() binds the
+    timing wrapper in its place.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # Still checked: a reference taken while enabled may outlive disable()
+            if _profiler is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _profiler.record(name, start, time.perf_counter_ns())
+        wrapper.span_name = name
+        _hooks[id(function)] = (function, wrapper)
+        return function if _profiler is None else wrapper
+    return decorate
+
+
+def count(name, value=1):
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+def session_report(label):
+    """Print and save the summary table for the session that just ended, and refresh the trace file"""
+    profiler = _profiler
+    if profiler is None:
+        return None
+    report = profiler.session_report(label)
+    print(report, flush=True)
+    summary_path = os.path.splitext(profiler.trace_path)[0] + '_summary.txt'
+    with open(summary_path, 'a', encoding='utf-8') as f:
+        f.write(report + '\n\n')
+    profiler.write_trace()
+    return report
@@ -0,0 +1,152 @@
+# profiling_benchmark.py
+"""Check that the profiling hooks cost next to nothing while profiling is off.
+
+Examples:
+    python profiling_benchmark.py
+    python profiling_benchmark.py --games 1000 --repeat 5
+
+Switched off, a @timed function is the plain function (enable() binds the
+timing wrappers in), so the script first checks that no wrapper is left
+bound anywhere in the app. The remaining hooks, span() and count(), are a
+check of a module global: a micro-benchmark gives their per-call cost.
+A disabled span still costs a with-statement, so spans stay off the
+per-answer paths and only count toward the whole-game overhead.
+Simulated games are then recorded once and replayed with profiling off and
+on; the real engine, data manager and question generator run without
+touching the disk, so the comparison is not drowned in I/O noise. The
+enabled run counts the span() and count() calls per game, which times
+their cost gives the overhead profiling adds to a game while switched off.
+The script exits with an error if a wrapper is bound while off, if @timed
+or count() costs more than --max-hook-ns per call, or if the overhead is above
+--max-overhead.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import timeit
+
+import profiling
+from game_engine import create_engine
+from replay import replay
+from results_store import ResultsStore
+from simulation import DEFAULT_RANGES, PROFILES, Bot, VirtualClock, print_report
+
+# Per-call cost allowed for a @timed function or count() while profiling is off
+MAX_HOOK_NS = 250
+# Share of a replayed game's time allowed for hooks while profiling is off
+MAX_OVERHEAD = 0.005
+
+
+def micro_benchmark(number=1_000_000):
+    """Nanoseconds per call of each hook while profiling is disabled"""
+    def plain():
+        return None
+
+    hooked = profiling.timed('bench')(plain)
+
+    def with_span():
+        with profiling.span('bench'):
+            return None
+
+    def direct(function):
+        return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e9
+
+    baseline = direct(plain)
+    return {
+        'plain_call_ns': baseline,
+        'timed_overhead_ns': direct(hooked) - baseline,
+        'span_overhead_ns': direct(with_span) - baseline,
+        'count_ns': direct(lambda: profiling.count('bench')),
+    }
+
+
+def record_games(games, seed):
+    """Event logs of `games` simulated games"""
+    rng = random.Random(seed)
+    logs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultsStore(os.path.join(tmp, 'bench.db'))
+        for _ in range(games):
+            clock = VirtualClock()
+            engine = create_engine(120, DEFAULT_RANGES, rng.getrandbits(63), False, store, clock, journal=False)
+            Bot(engine, clock, PROFILES['average'], rng).play()
+            logs.append(engine.event_log.to_bytes())
+    return logs
+
+
+def replay_all(logs):
+    """Seconds to replay every log, and the number of questions answered"""
+    questions = 0
+    start = time.perf_counter()
+    for data in logs:
+        questions += replay(data).questions_asked
+    return time.perf_counter() - start, questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=300, help='games replayed per run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each mode; the fastest counts')
+    parser.add_argument('--max-hook-ns', type=float, default=MAX_HOOK_NS)
+    parser.add_argument('--max-overhead', type=float, default=MAX_OVERHEAD)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    profiling.disable()
+    report = micro_benchmark()
+    logs = record_games(args.games, args.seed)
+    # Replaying imports the rest of the instrumented modules
+    replay(logs[0])
+    report['timed_functions'] = len(profiling.timed_names())
+    problems = []
+    bound = profiling.bound_hooks()
+    if bound:
+        problems.append(f"timing wrappers bound while profiling is off: {', '.join(bound)}")
+
+    # Modes are interleaved so drift in machine speed hits them all alike
+    best = {'disabled': None, 'enabled': None}
+    events = []
+    for _ in range(args.repeat):
+        for mode in best:
+            profiler = profiling.enable(os.path.join(tempfile.gettempdir(), 'bench_trace.json')) \
+                if mode == 'enabled' else None
+            try:
+                seconds, questions = replay_all(logs)
+            finally:
+                profiling.disable()
+            if profiler is not None:
+                events = profiler.events
+            if best[mode] is None or seconds < best[mode]:
+                best[mode] = seconds
+    if profiling.bound_hooks():
+        problems.append('timing wrappers still bound after disable()')
+
+    timed_names = profiling.timed_names()
+    span_calls = sum(event['ph'] == 'X' and event['name'] not in timed_names for event in events)
+    count_calls = sum(event['ph'] == 'C' for event in events)
+    report['games'] = args.games
+    report['questions'] = questions
+    report['timed_calls_per_game'] = (len(events) - span_calls - count_calls) // args.games
+    report['span_calls_per_game'] = span_calls // args.games
+    report['count_calls_per_game'] = count_calls // args.games
+    for mode, seconds in best.items():
+        report[f'{mode}_ms_per_game'] = seconds / args.games * 1e3
+    overhead = (span_calls * report['span_overhead_ns'] + count_calls * report['count_ns']) / 1e9 / best['disabled']
+    report['disabled_overhead'] = f'{overhead:.3%} (hook calls x disabled cost per call)'
+    report['enabled_overhead'] = f"{best['enabled'] / best['disabled'] - 1:+.2%}"
+    print_report(report)
+
+    slow = [key for key in ('timed_overhead_ns', 'count_ns') if report[key] > args.max_hook_ns]
+    if slow:
+        problems.append(f"over {args.max_hook_ns:g}ns per call: {', '.join(slow)}")
+    if overhead > args.max_overhead:
+        problems.append(f'disabled hooks cost {overhead:.3%} of a game (limit {args.max_overhead:.3%})')
+    if problems:
+        raise SystemExit('Profiling hooks cost too much while off: ' + '; '.join(problems))
+    print(f'With profiling off no wrapper is bound and the hooks cost {overhead:.3%} of a game')
+
+
+if __name__ == '__main__':
+    main()
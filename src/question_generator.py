@@ -0,0 +1,94 @@
+import random
+import numpy as np
+from problem_index import has_constraints, problem_index, question_terms
+from profiling import count, timed
+
+BATCH_SIZE = 512
+
+
+def new_seed():
+    """A fresh seed that fits in a signed 64-bit column"""
+    return random.SystemRandom().getrandbits(63)
+
+
+def build_question(operation, x, y):
+    """Turn a draw from the term1/term2 ranges into (operation, term1, term2, answer)"""
+    if operation == '-':
+        a, b = max(x, y), min(x, y)
+        return operation, a, b, a - b
+    if operation == '×':
+        return operation, x, y, x * y
+    if operation == '÷':
+        return operation, x * y, y, x
+    return operation, x, y, x + y
+
+
+class QuestionGenerator:
+    """Draws questions in vectorised batches from a seeded NumPy generator.
+
+    Questions come out of a prefetch buffer as (operation, term1, term2, answer)
+    tuples of plain ints, so the same seed and ranges always reproduce the
+    same sequence of questions. Operations with constraints draw their terms
+    from the problem index of valid pairs instead of the plain ranges.
+    """
+
+    def __init__(self, ranges, seed=None, batch_size=BATCH_SIZE):
+        self.ranges = ranges
+        self.seed = new_seed() if seed is None else seed
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(self.seed)
+        self.operations = list(ranges.keys())
+        self.term1_min = np.array([ranges[op]['term1']['min'] for op in self.operations], dtype=np.int64)
+        self.term1_max = np.array([ranges[op]['term1']['max'] for op in self.operations], dtype=np.int64)
+        self.term2_min = np.array([ranges[op]['term2']['min'] for op in self.operations], dtype=np.int64)
+        self.term2_max = np.array([ranges[op]['term2']['max'] for op in self.operations], dtype=np.int64)
+        self.indexes = {}
+        for code, op in enumerate(self.operations):
+            if has_constraints(ranges[op]):
+                self.indexes[code] = problem_index(op, ranges[op])
+                if not len(self.indexes[code][0]):
+                    raise ValueError(f'No {op} questions satisfy the constraints')
+        self.buffer = []
+        self.position = 0
+
+    def next_question(self):
+        self.prefetch()
+        question = self.buffer[self.position]
+        self.position += 1
+        return question
+
+    def snapshot(self):
+        """What game_engine.question_source_from_snapshot needs to regenerate these questions"""
+        return {'kind': 'uniform', 'seed': self.seed, 'batch_size': self.batch_size}
+
+    def prefetch(self):
+        """Fill the buffer ahead of time so the first question is ready instantly"""
+        if self.position == len(self.buffer):
+            self.buffer = self.generate_batch(self.batch_size)
+            self.position = 0
+
+    def record(self, operation, term1, term2, time_taken, correct):
+        """Uniform generation does not adapt to answers"""
+
+    @timed('questions.generate_batch')
+    def generate_batch(self, size):
+        count('questions_generated', size)
+        codes = self.rng.integers(len(self.operations), size=size)
+        x = self.rng.integers(self.term1_min[codes], self.term1_max[codes], endpoint=True)
+        y = self.rng.integers(self.term2_min[codes], self.term2_max[codes], endpoint=True)
+
+        for code, (index_x, index_y) in self.indexes.items():
+            mask = codes == code
+            picks = self.rng.integers(len(index_x), size=int(mask.sum()))
+            x[mask] = index_x[picks]
+            y[mask] = index_y[picks]
+
+        a = np.empty(size, dtype=np.int64)
+        b = np.empty(size, dtype=np.int64)
+        answer = np.empty(size, dtype=np.int64)
+        for code, op in enumerate(self.operations):
+            mask = codes == code
+            a[mask], b[mask], answer[mask] = question_terms(op, x[mask], y[mask])
+
+        operations = np.array(self.operations, dtype=object)[codes]
+        return list(zip(operations.tolist(), a.tolist(), b.tolist(), answer.tolist()))
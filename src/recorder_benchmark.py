@@ -0,0 +1,103 @@
+# recorder_benchmark.py
+"""Check that recording an answer costs the same at the end of a long game as at the start.
+
+Examples:
+    python recorder_benchmark.py
+    python recorder_benchmark.py --rows 1000000 --block 50000
+
+Appends --rows answers to a SessionRecorder, and through
+DataManager.add_result (journal off), timing each block of --block
+appends. Each run is repeated and the fastest time of every block is kept,
+so a stray pause doesn't count as growth. Latency is flat when the last
+blocks cost no more than MAX_GROWTH times the first ones; otherwise the
+script exits with an error.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from data_manager import DataManager
+from session_recorder import OPERATIONS, SessionRecorder, correct_answer
+from simulation import print_report
+
+# Allowed ratio of the late blocks' median append time to the early blocks'
+MAX_GROWTH = 1.5
+# Fraction of the blocks at each end compared
+EDGE_FRACTION = 0.1
+
+
+def make_rows(rows, seed):
+    rng = random.Random(seed)
+    made = []
+    for _ in range(rows):
+        operation = rng.choice(OPERATIONS)
+        term1, term2 = rng.randint(1, 100), rng.randint(1, 12)
+        answer = correct_answer(operation, term1, term2)
+        made.append((rng.uniform(0.5, 6.0), operation, term1, term2, answer, True, 0.4, 0.2, 0))
+    return made
+
+
+def time_blocks(append, rows, block):
+    """Nanoseconds taken by each block of appends"""
+    times = []
+    for start in range(0, len(rows), block):
+        chunk = rows[start:start + block]
+        began = time.perf_counter_ns()
+        for row in chunk:
+            append(*row)
+        times.append(time.perf_counter_ns() - began)
+    return times
+
+
+def recorder_append():
+    return SessionRecorder().append
+
+
+def data_manager_append():
+    data_manager = DataManager(journal=False)
+
+    def append(time_taken, operation, term1, term2, user_answer, correct, *timing):
+        data_manager.add_result(operation, term1, term2, user_answer, correct)
+    return append
+
+
+def measure(name, make_append, rows, block, repeat):
+    best = None
+    for _ in range(repeat):
+        times = time_blocks(make_append(), rows, block)
+        best = times if best is None else [min(a, b) for a, b in zip(best, times)]
+    per_append = [t / block for t in best]
+    edge = max(1, int(len(per_append) * EDGE_FRACTION))
+    early = statistics.median(per_append[:edge])
+    late = statistics.median(per_append[-edge:])
+    return {
+        f'{name}_early_ns': early,
+        f'{name}_late_ns': late,
+        f'{name}_slowest_block_ns': max(per_append),
+        f'{name}_growth': late / early,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--block', type=int, default=5_000, help='appends timed together')
+    parser.add_argument('--repeat', type=int, default=5, help='runs; the fastest time of each block counts')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.seed)
+    report = {'rows': args.rows, 'blocks': (args.rows + args.block - 1) // args.block}
+    report.update(measure('recorder', recorder_append, rows, args.block, args.repeat))
+    report.update(measure('add_result', data_manager_append, rows, args.block, args.repeat))
+    print_report(report)
+
+    grown = [key for key, value in report.items() if key.endswith('_growth') and value > MAX_GROWTH]
+    if grown:
+        raise SystemExit(f"Append latency grew more than {MAX_GROWTH}x over {args.rows:,} rows: {', '.join(grown)}")
+    print(f'Append latency is flat (within {MAX_GROWTH}x) over {args.rows:,} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+# replay.py
+"""Replay recorded games through the headless engine.
+
+Examples:
+    python replay.py show Game_20240101_120000
+    python replay.py play Game_20240101_120000 --speed 4
+    python replay.py verify --limit 100
+    python replay.py corpus ../tests/replay_corpus --db ../tests/simulated.db --limit 200
+    python replay.py bench ../tests/replay_corpus --save-baseline baseline.json
+    python replay.py bench ../tests/replay_corpus --baseline baseline.json
+
+A replay feeds the logged inputs to a GameEngine whose clock returns the
+logged readings, so the questions, answers and timings come out identical
+to the original game. The corpus commands turn stored logs into files with
+their expected results, for use as a regression and performance suite.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+
+from data_manager import DataManager
+from game_engine import GameEngine, question_source_from_snapshot
+from results_store import ResultsStore, DB_PATH
+from session_log import read_log, START, TEXT, SUBMIT
+from session_recorder import COLUMN_TYPES, SessionRecorder, NAN
+
+CORPUS_SUFFIX = '.zsl'
+EXPECTED_FILE = 'expected.json'
+# A bench run slower than the baseline by more than this fraction fails
+DEFAULT_TOLERANCE = 0.2
+
+
+class ReplayClock:
+    """Engine clock that returns whatever reading the replay last set"""
+
+    def __init__(self):
+        self.now_ns = 0
+
+    def __call__(self):
+        return self.now_ns
+
+
+def replay(data, speed=None, on_submit=None):
+    """Replay an encoded session log and return the engine it was played into.
+
+    speed=None replays as fast as possible; otherwise 1.0 is real time and
+    larger values are faster. on_submit(engine, result) is called after
+    every submitted answer.
+    """
+    header, events = read_log(data)
+    ranges = header['ranges']
+    clock = ReplayClock()
+    data_manager = DataManager(journal=False, seed=header['source']['seed'], ranges=ranges)
+    engine = GameEngine(
+        header['duration'], question_source_from_snapshot(ranges, header['source']), data_manager, clock,
+        record=False
+    )
+    first = events[0][1] if events else 0
+    started = time.perf_counter()
+    for kind, now, text in events:
+        if speed:
+            delay = (now - first) / 1e9 / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        clock.now_ns = now
+        if kind == START:
+            engine.start()
+        elif kind == TEXT:
+            engine.type_text(text)
+        elif kind == SUBMIT:
+            result = engine.submit(text)
+            if on_submit is not None:
+                on_submit(engine, result)
+    return engine
+
+
+def recorder_from_rows(rows):
+    """SessionRecorder holding stored answers (NULLs come back as NaN)"""
+    recorder = SessionRecorder()
+    for row in rows:
+        recorder.append(*(NAN if value is None else value for value in row))
+    return recorder
+
+
+def digest(recorder):
+    """Fingerprint of every recorded column, for comparing a replay with the original"""
+    sha = hashlib.sha256()
+    for name in COLUMN_TYPES:
+        sha.update(getattr(recorder, name)[:len(recorder)].tobytes())
+    return sha.hexdigest()
+
+
+def same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def compare(recorder, rows):
+    """Index of the first answer where a replay differs from the stored rows, or None"""
+    stored = recorder_from_rows(rows)
+    for i in range(max(len(recorder), len(stored))):
+        if i >= len(recorder) or i >= len(stored):
+            return i
+        for name in COLUMN_TYPES:
+            if not same_value(getattr(recorder, name)[i], getattr(stored, name)[i]):
+                return i
+    return None
+
+
+def show(store, name):
+    logs = store.session_logs(name)
+    if not logs:
+        raise SystemExit(f'No recorded session named {name}')
+    session_id, name, data = logs[-1]
+    header, events = read_log(data)
+    engine = replay(data)
+    source = dict(header['source'])
+    if 'skill_summary' in source:
+        source['skill_summary'] = f"{len(source['skill_summary'])} cells"
+    print(f'{name}: {len(data):,} bytes, {len(events):,} events, {header["duration"]}s, source {source}')
+    statistics = engine.data_manager.get_statistics()
+    statistics['Game Session'] = name
+    for key, value in statistics.items():
+        print(f'{key}: {value}')
+
+
+def play(store, name, speed):
+    logs = store.session_logs(name)
+    if not logs:
+        raise SystemExit(f'No recorded session named {name}')
+
+    def on_submit(engine, result):
+        recorder = engine.data_manager.recorder
+        if result is None or not len(recorder):
+            return
+        i = len(recorder) - 1
+        mark = 'correct' if recorder.correct[i] else f'wrong, {recorder.correct_answer_at(i)}'
+        print(f'{recorder.question_at(i)} = {recorder.user_answer[i]:g}  ({mark}, {recorder.time_taken[i]:.2f}s)')
+
+    engine = replay(logs[-1][2], speed, on_submit)
+    print(f'Score: {engine.score} / {engine.questions_asked}')
+
+
+def verify(store, limit=None):
+    """Replay stored sessions and check each one against its stored answers"""
+    checked = 0
+    failures = 0
+    for session_id, name, data in store.session_logs(limit=limit):
+        mismatch = compare(replay(data).data_manager.recorder, store.session_questions(session_id))
+        checked += 1
+        if mismatch is not None:
+            failures += 1
+            print(f'{name}: replay differs from the stored game at answer {mismatch}')
+    print(f'{checked - failures} of {checked} recorded sessions replayed identically')
+    return failures == 0
+
+
+def write_corpus(store, directory, limit=None):
+    """Write stored logs as corpus files plus the results each one must replay to"""
+    os.makedirs(directory, exist_ok=True)
+    expected = {}
+    for session_id, name, data in store.session_logs(limit=limit):
+        filename = f'{name}_{session_id}{CORPUS_SUFFIX}'
+        with open(os.path.join(directory, filename), 'wb') as f:
+            f.write(data)
+        recorder = recorder_from_rows(store.session_questions(session_id))
+        expected[filename] = {
+            'digest': digest(recorder),
+            'questions': len(recorder),
+            'correct': recorder.correct_total,
+        }
+    with open(os.path.join(directory, EXPECTED_FILE), 'w', encoding='utf-8') as f:
+        json.dump(expected, f, indent=1, sort_keys=True)
+    print(f'Wrote {len(expected)} sessions to {directory}')
+
+
+def bench(directory, repeat=3):
+    """Replay every corpus file, check its results and measure replay speed"""
+    with open(os.path.join(directory, EXPECTED_FILE), encoding='utf-8') as f:
+        expected = json.load(f)
+    logs = {}
+    for filename in sorted(expected):
+        with open(os.path.join(directory, filename), 'rb') as f:
+            logs[filename] = f.read()
+
+    failures = [
+        filename for filename, data in logs.items()
+        if digest(replay(data).data_manager.recorder) != expected[filename]['digest']
+    ]
+    events = sum(len(read_log(data)[1]) for data in logs.values())
+    questions = sum(entry['questions'] for entry in expected.values())
+
+    # Best of several passes, to keep noise out of the regression check
+    best = None
+    per_session = []
+    for _ in range(repeat):
+        times = []
+        start = time.perf_counter()
+        for data in logs.values():
+            session_start = time.perf_counter()
+            replay(data)
+            times.append(time.perf_counter() - session_start)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            per_session = sorted(times)
+
+    def percentile(q):
+        return per_session[min(len(per_session) - 1, int(q * len(per_session)))] * 1e3 if per_session else 0.0
+
+    return failures, {
+        'sessions': len(logs),
+        'events': events,
+        'questions': questions,
+        'seconds': best,
+        'sessions_per_second': len(logs) / best if best else 0.0,
+        'events_per_second': events / best if best else 0.0,
+        'p50_ms_per_session': percentile(0.5),
+        'p99_ms_per_session': percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH, help='results store to read recorded sessions from')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('show', help='replay a session and print its statistics')
+    command.add_argument('session')
+    command = commands.add_parser('play', help='replay a session at real or accelerated speed')
+    command.add_argument('session')
+    command.add_argument('--speed', type=float, default=1.0, help='1 is real time, 0 is as fast as possible')
+    command = commands.add_parser('verify', help='check that stored sessions replay identically')
+    command.add_argument('--limit', type=int, default=None)
+    command = commands.add_parser('corpus', help='write stored sessions out as a replay corpus')
+    command.add_argument('directory')
+    command.add_argument('--limit', type=int, default=None)
+    command = commands.add_parser('bench', help='replay a corpus, check its results and time it')
+    command.add_argument('directory')
+    command.add_argument('--repeat', type=int, default=3)
+    command.add_argument('--baseline', default=None, help='fail if slower than this saved bench result')
+    command.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    command.add_argument('--save-baseline', default=None, help='write this run\'s result as a baseline')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        from simulation import print_report
+        failures, report = bench(args.directory, args.repeat)
+        print_report(report)
+        for filename in failures:
+            print(f'{filename}: replay no longer matches the expected results')
+        ok = not failures
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            floor = baseline['events_per_second'] * (1 - args.tolerance)
+            if report['events_per_second'] < floor:
+                print(f"Regression: {report['events_per_second']:,.0f} events/s is below "
+                      f"{floor:,.0f} ({baseline['events_per_second']:,.0f} baseline - {args.tolerance:.0%})")
+                ok = False
+        if args.save_baseline:
+            with open(args.save_baseline, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+        sys.exit(0 if ok else 1)
+
+    store = ResultsStore(args.db)
+    if args.command == 'show':
+        show(store, args.session)
+    elif args.command == 'play':
+        play(store, args.session, args.speed)
+    elif args.command == 'verify':
+        sys.exit(0 if verify(store, args.limit) else 1)
+    elif args.command == 'corpus':
+        write_corpus(store, args.directory, args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# results_benchmark.py
+"""Time opening the results window on a 1M-answer game and a long history, and sorting and filtering its tables.
+
+Examples:
+    python results_benchmark.py
+    python results_benchmark.py --rows 5000000 --games 200000
+
+Runs under QT_QPA_PLATFORM=offscreen. A game's SessionRecorder is filled
+with --rows answers and an all-games history of --games sessions is made
+up. The script then times building the ResultsWindow and painting it,
+filling the All Games tab, and every sort order and filter of both
+tables through their models. Only the first fetched batch of rows ever
+reaches the views, so open times should not depend on --rows. It exits
+with an error if opening takes more than --max-open-ms, or if any sort or
+filter takes more than --max-sort-ms.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication
+
+from data_manager import DataManager
+from results_store import ResultsStore
+from session_recorder import OPERATIONS, correct_answer
+from simulation import print_report
+
+MAX_OPEN_MS = 1000
+MAX_SORT_MS = 1000
+
+
+def fill_recorder(recorder, rows, seed):
+    rng = random.Random(seed)
+    for _ in range(rows):
+        operation = rng.choice(OPERATIONS)
+        term1, term2 = rng.randint(1, 100), rng.randint(1, 12)
+        answer = correct_answer(operation, term1, term2)
+        correct = rng.random() < 0.85
+        recorder.append(rng.uniform(0.5, 6.0), operation, term1, term2, answer if correct else answer + 1, correct,
+                        rng.uniform(0.2, 1.0), rng.uniform(0.1, 0.5), rng.randrange(3))
+
+
+def made_up_history(games, seed):
+    """Rows shaped like DataManager.get_all_game_statistics for `games` sessions"""
+    rng = random.Random(seed)
+    history = []
+    for i in range(games):
+        total = rng.randint(10, 120)
+        correct = rng.randint(0, total)
+        p50 = rng.uniform(1.0, 4.0)
+        history.append({
+            'Game Session': f'Game_{i:08d}',
+            'Total Questions': total,
+            'Correct Answers': correct,
+            'Accuracy': f'{correct / total:.2%}',
+            'Average Time per Question': f'{p50:.2f} seconds',
+            'Average Time Seconds': p50,
+            'Latency Percentiles': {'count': total, 'p50': p50, 'p90': p50 * 2, 'p99': float('nan') if i % 7 == 0 else p50 * 3},
+            'Performance by Operation': {op: rng.random() for op in OPERATIONS},
+        })
+    return history
+
+
+def elapsed_ms(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='answers in the current game')
+    parser.add_argument('--games', type=int, default=100_000, help='sessions in the all-games history')
+    parser.add_argument('--max-open-ms', type=float, default=MAX_OPEN_MS)
+    parser.add_argument('--max-sort-ms', type=float, default=MAX_SORT_MS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    # Imported after the QApplication, as the app does
+    from results_window import ResultsWindow
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_manager = DataManager(ResultsStore(os.path.join(tmp, 'bench.db')), journal=False)
+        recorder = data_manager.recorder
+        start = time.perf_counter()
+        fill_recorder(recorder, args.rows, args.seed)
+        history = made_up_history(args.games, args.seed)
+        report = {'rows': len(recorder), 'games': len(history),
+                  'fill_seconds': time.perf_counter() - start}
+
+        start = time.perf_counter()
+        statistics = data_manager.get_statistics()
+        window = ResultsWindow(recorder.correct_total, len(recorder), recorder.time_total, statistics, data_manager)
+        report['build_window_ms'] = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        window.show()
+        app.processEvents()
+        report['first_paint_ms'] = (time.perf_counter() - start) * 1e3
+        report['all_games_tab_ms'] = elapsed_ms(window.show_all_game_statistics, history)
+        app.processEvents()
+        report['open_ms'] = report['build_window_ms'] + report['first_paint_ms'] + report['all_games_tab_ms']
+
+        sorts = {}
+        for name, model in (('questions', window.question_model), ('games', window.all_games_model)):
+            for column in range(model.columnCount()):
+                for order, suffix in ((Qt.AscendingOrder, 'asc'), (Qt.DescendingOrder, 'desc')):
+                    sorts[f'sort_{name}_{column}_{suffix}'] = elapsed_ms(model.sort, column, order)
+            sorts[f'sort_{name}_unsorted'] = elapsed_ms(model.sort, -1)
+        question_model = window.question_model
+        sorts['filter_operation'] = elapsed_ms(question_model.filter_by, '×')
+        sorts['filter_incorrect'] = elapsed_ms(question_model.filter_by, None, False)
+        sorts['filter_operation_incorrect'] = elapsed_ms(question_model.filter_by, '÷', False)
+        sorts['filter_questions_none'] = elapsed_ms(question_model.filter_by)
+        sorts['filter_games'] = elapsed_ms(window.all_games_model.filter_by, '_0001')
+        sorts['filter_games_none'] = elapsed_ms(window.all_games_model.filter_by, '')
+        slowest = max(sorts, key=sorts.get)
+        report['slowest_sort_or_filter'] = f'{slowest} {sorts[slowest]:,.1f}ms'
+        report.update(sorts)
+        window.close()
+        print_report(report)
+
+    failures = []
+    if report['open_ms'] > args.max_open_ms:
+        failures.append(f"opening took {report['open_ms']:,.0f}ms (limit {args.max_open_ms:g}ms)")
+    slow = [name for name, ms in sorts.items() if ms > args.max_sort_ms]
+    if slow:
+        failures.append(f"over {args.max_sort_ms:g}ms: {', '.join(slow)}")
+    if failures:
+        raise SystemExit('The results window is too slow: ' + '; '.join(failures))
+    print(f'Opened in {report["open_ms"]:,.0f}ms; every sort and filter took under {args.max_sort_ms:g}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,866 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby
+from histogram import BIN_COUNT, QUANTILES, LogHistogram, bin_index, bin_indexes, counts_quantiles, \
+    percentile_summary, quantile_name
+from profiling import timed
+from session_recorder import OPERATIONS
+from skill_buckets import SKILL_TERM1_SQL, bucket_sql, skill_cell
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'tests')
+DB_PATH = os.path.join(DATA_DIR, 'arithmetic_game_results.db')
+LEGACY_XLSX_PATH = os.path.join(DATA_DIR, 'arithmetic_game_results.xlsx')
+# Sessions stored before profiles existed belong to this one
+DEFAULT_PROFILE = 'Default'
+DEFAULT_PROFILE_ID = 1
+# Seconds a process waits for another one's write to finish
+BUSY_TIMEOUT = 60
+
+# Compaction: raw answers of sessions older than the retention are rolled up
+# into per-day or per-week aggregates (the Unix epoch was a Thursday, so weeks
+# are shifted to start on Monday)
+DAY_SECONDS = 86400
+PERIODS = {'day': (DAY_SECONDS, 0), 'week': (7 * DAY_SECONDS, 4 * DAY_SECONDS)}
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_ROLLUP_PERIOD = 'week'
+# Background compaction runs at most this often
+COMPACTION_INTERVAL = DAY_SECONDS
+# Sessions per IN (...) query, well under SQLite's bound-variable limit
+ID_BATCH = 500
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version)
+MIGRATIONS = [
+    """
+    CREATE TABLE sessions (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        started_at REAL NOT NULL
+    );
+    CREATE INDEX sessions_name ON sessions(name);
+    CREATE INDEX sessions_started_at ON sessions(started_at);
+
+    CREATE TABLE questions (
+        session_id INTEGER NOT NULL REFERENCES sessions(id),
+        seq INTEGER NOT NULL,
+        answered_at REAL NOT NULL,
+        time_taken REAL NOT NULL,
+        operation TEXT NOT NULL,
+        term1 INTEGER NOT NULL,
+        term2 INTEGER NOT NULL,
+        user_answer REAL,
+        correct INTEGER NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    ) WITHOUT ROWID;
+    CREATE INDEX questions_operation ON questions(operation);
+    CREATE INDEX questions_answered_at ON questions(answered_at);
+
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE session_summary (
+        session_id INTEGER PRIMARY KEY REFERENCES sessions(id),
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        time_sum REAL NOT NULL
+    );
+
+    CREATE TABLE operation_summary (
+        session_id INTEGER NOT NULL REFERENCES sessions(id),
+        operation TEXT NOT NULL,
+        first_seq INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        time_sum REAL NOT NULL,
+        PRIMARY KEY (session_id, operation)
+    ) WITHOUT ROWID;
+    """,
+    """
+    ALTER TABLE sessions ADD COLUMN seed INTEGER;
+    ALTER TABLE sessions ADD COLUMN ranges TEXT;
+    """,
+    f"""
+    CREATE TABLE skill_summary (
+        operation TEXT NOT NULL,
+        bucket1 INTEGER NOT NULL,
+        bucket2 INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        time_sum REAL NOT NULL,
+        PRIMARY KEY (operation, bucket1, bucket2)
+    ) WITHOUT ROWID;
+
+    INSERT INTO skill_summary
+    SELECT operation, {bucket_sql(SKILL_TERM1_SQL)}, {bucket_sql('term2')},
+           COUNT(*), SUM(correct), SUM(time_taken)
+    FROM questions GROUP BY 1, 2, 3;
+    """,
+    """
+    ALTER TABLE questions ADD COLUMN first_key REAL;
+    ALTER TABLE questions ADD COLUMN submit_delay REAL;
+    ALTER TABLE questions ADD COLUMN corrections INTEGER;
+    """,
+    """
+    ALTER TABLE sessions ADD COLUMN instrumentation TEXT;
+    """,
+    f"""
+    CREATE TABLE profiles (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    INSERT INTO profiles (id, name) VALUES ({DEFAULT_PROFILE_ID}, '{DEFAULT_PROFILE}');
+
+    ALTER TABLE sessions ADD COLUMN profile_id INTEGER NOT NULL DEFAULT {DEFAULT_PROFILE_ID};
+    CREATE INDEX sessions_profile ON sessions(profile_id, started_at);
+
+    CREATE TABLE profile_skill_summary (
+        profile_id INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        bucket1 INTEGER NOT NULL,
+        bucket2 INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        time_sum REAL NOT NULL,
+        PRIMARY KEY (profile_id, operation, bucket1, bucket2)
+    ) WITHOUT ROWID;
+    INSERT INTO profile_skill_summary SELECT {DEFAULT_PROFILE_ID}, * FROM skill_summary;
+    DROP TABLE skill_summary;
+    ALTER TABLE profile_skill_summary RENAME TO skill_summary;
+    """,
+    """
+    CREATE TABLE session_logs (
+        session_id INTEGER PRIMARY KEY REFERENCES sessions(id),
+        log BLOB NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE sessions ADD COLUMN compacted INTEGER NOT NULL DEFAULT 0;
+    CREATE INDEX sessions_compacted ON sessions(compacted, started_at);
+
+    CREATE TABLE question_rollups (
+        profile_id INTEGER NOT NULL,
+        period_start REAL NOT NULL,
+        operation TEXT NOT NULL,
+        bucket1 INTEGER NOT NULL,
+        bucket2 INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        histogram BLOB NOT NULL,
+        PRIMARY KEY (profile_id, period_start, operation, bucket1, bucket2)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE fact_rollups (
+        profile_id INTEGER NOT NULL,
+        period_start REAL NOT NULL,
+        operation TEXT NOT NULL,
+        term1 INTEGER NOT NULL,
+        term2 INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        time_sum REAL NOT NULL,
+        PRIMARY KEY (profile_id, period_start, operation, term1, term2)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE session_sketches (
+        session_id INTEGER NOT NULL REFERENCES sessions(id),
+        operation TEXT NOT NULL,
+        question_count INTEGER NOT NULL,
+        histogram BLOB NOT NULL,
+        PRIMARY KEY (session_id, operation)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE fact_tallies (
+        profile_id INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        term1 INTEGER NOT NULL,
+        term2 INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        correct_count INTEGER NOT NULL,
+        time_sum REAL NOT NULL,
+        PRIMARY KEY (profile_id, operation, term1, term2)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE cell_latency_bins (
+        profile_id INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        bucket1 INTEGER NOT NULL,
+        bucket2 INTEGER NOT NULL,
+        bin INTEGER NOT NULL,
+        question_count INTEGER NOT NULL,
+        PRIMARY KEY (profile_id, operation, bucket1, bucket2, bin)
+    ) WITHOUT ROWID;
+    """,
+]
+
+# Column order of the row tuples passed around for questions (after session_id)
+QUESTION_COLUMNS = (
+    'seq', 'answered_at', 'time_taken', 'operation', 'term1', 'term2', 'user_answer', 'correct',
+    'first_key', 'submit_delay', 'corrections',
+)
+
+
+def split_statements(script):
+    """Split a migration script into single statements for Connection.execute"""
+    statements = []
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ''
+    return statements
+
+
+def period_start(timestamp, period):
+    """Start of the day or week (UTC) a timestamp falls in"""
+    length, offset = PERIODS[period]
+    return (timestamp - offset) // length * length + offset
+
+
+def parse_session_time(name, default):
+    """Recover the start time encoded in a Game_YYYYmmdd_HHMMSS session name"""
+    try:
+        return datetime.strptime(name, 'Game_%Y%m%d_%H%M%S').timestamp()
+    except ValueError:
+        return default
+
+
+class ResultsStore:
+    """Append-only SQLite store holding every game session and its answers.
+
+    Many processes may share one database: it runs in WAL mode, so readers
+    never block, and every write takes the write lock up front (BEGIN
+    IMMEDIATE) and waits for it instead of failing part-way through.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as conn:
+            self.migrate(conn)
+
+    @contextmanager
+    def connect(self, write=False):
+        """Open a connection that commits on success and is always closed.
+
+        With write=True the transaction holds the write lock from the start,
+        so whatever it reads cannot be changed by another process before it
+        writes.
+        """
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        try:
+            with conn:
+                if write:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+        finally:
+            conn.close()
+
+    def migrate(self, conn):
+        if conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS):
+            return
+        # Several processes may open a new database at once; only the first
+        # to get the write lock applies the migrations
+        conn.execute('BEGIN IMMEDIATE')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for i in range(version, len(MIGRATIONS)):
+            for statement in split_statements(MIGRATIONS[i]):
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {i + 1}')
+
+    @timed('store.save_session')
+    def save_session(self, name, started_at, recorder, seed=None, ranges=None, instrumentation=None,
+                     profile=DEFAULT_PROFILE, event_log=None):
+        """Append one finished game; cost depends only on the size of that game.
+
+        The question seed and ranges are kept so the session can be regenerated,
+        instrumentation holds the GUI latency histograms measured during it and
+        event_log is the encoded session_log used to replay it.
+        """
+        rows = []
+        answered_at = started_at
+        for i in range(len(recorder)):
+            answered_at += recorder.time_taken[i]
+            rows.append((
+                i, answered_at, recorder.time_taken[i], recorder.operation_at(i),
+                recorder.term1[i], recorder.term2[i], recorder.user_answer[i], recorder.correct[i],
+                recorder.first_key[i], recorder.submit_delay[i], recorder.corrections[i],
+            ))
+        with self.connect(write=True) as conn:
+            profile_id = self._profile_id(conn, profile)
+            session_id = self._insert_session(
+                conn, name, started_at, rows, seed, ranges, instrumentation, profile_id
+            )
+            if event_log is not None:
+                conn.execute('INSERT INTO session_logs (session_id, log) VALUES (?, ?)', (session_id, event_log))
+            return session_id
+
+    def session_logs(self, name=None, limit=None):
+        """(session_id, name, encoded log) for recorded sessions, oldest first"""
+        sql = 'SELECT s.id, s.name, l.log FROM session_logs l JOIN sessions s ON s.id = l.session_id'
+        params = ()
+        if name is not None:
+            sql += ' WHERE s.name = ?'
+            params = (name,)
+        sql += ' ORDER BY s.started_at, s.id'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with self.connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def session_questions(self, session_id):
+        """Stored answers of one session in SessionRecorder.append argument order"""
+        with self.connect() as conn:
+            return conn.execute(
+                'SELECT time_taken, operation, term1, term2, user_answer, correct, first_key, submit_delay, '
+                'corrections FROM questions WHERE session_id = ? ORDER BY seq', (session_id,)
+            ).fetchall()
+
+    def profiles(self):
+        """Names of all player profiles, alphabetically"""
+        with self.connect() as conn:
+            return [name for (name,) in conn.execute('SELECT name FROM profiles ORDER BY name COLLATE NOCASE')]
+
+    def add_profile(self, name):
+        with self.connect(write=True) as conn:
+            self._profile_id(conn, name)
+
+    def _profile_id(self, conn, name):
+        """Id of the named profile, created on first use (call inside a write transaction)"""
+        conn.execute('INSERT OR IGNORE INTO profiles (name) VALUES (?)', (name,))
+        return conn.execute('SELECT id FROM profiles WHERE name = ?', (name,)).fetchone()[0]
+
+    def session_settings(self, name):
+        """Seed and ranges a stored session was generated with"""
+        with self.connect() as conn:
+            row = conn.execute(
+                'SELECT seed, ranges FROM sessions WHERE name = ? ORDER BY id DESC', (name,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def has_session(self, name, started_at):
+        with self.connect() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM sessions WHERE name = ? AND started_at = ?', (name, started_at)
+            ).fetchone()
+        return row is not None
+
+    def _insert_session(self, conn, name, started_at, rows, seed=None, ranges=None, instrumentation=None,
+                        profile_id=DEFAULT_PROFILE_ID):
+        cursor = conn.execute(
+            'INSERT INTO sessions (name, started_at, seed, ranges, instrumentation, profile_id) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (name, started_at, seed,
+             None if ranges is None else json.dumps(ranges, ensure_ascii=False),
+             None if instrumentation is None else json.dumps(instrumentation),
+             profile_id)
+        )
+        session_id = cursor.lastrowid
+        conn.executemany(
+            f"INSERT INTO questions (session_id, {', '.join(QUESTION_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(QUESTION_COLUMNS)})",
+            [(session_id,) + tuple(row) for row in rows]
+        )
+        self._insert_summary(conn, session_id, rows, profile_id)
+        return session_id
+
+    def _insert_summary(self, conn, session_id, rows, profile_id, skills_included=False):
+        """Write the small per-session rows that history screens read instead of raw answers"""
+        correct_count = 0
+        time_sum = 0.0
+        operations = {}
+        skills = {}
+        sketches = {}
+        facts = {}
+        bins = {}
+        for row in rows:
+            seq, _, time_taken, operation, term1, term2, _, correct = row[:8]
+            correct_count += correct
+            time_sum += time_taken
+            tally = operations.get(operation)
+            if tally is None:
+                operations[operation] = tally = [seq, 0, 0, 0.0]
+            tally[1] += 1
+            tally[2] += correct
+            tally[3] += time_taken
+            sketch = sketches.get(operation)
+            if sketch is None:
+                sketches[operation] = sketch = LogHistogram()
+            sketch.add(time_taken)
+            cell = skill_cell(operation, term1, term2)
+            tally = skills.get(cell)
+            if tally is None:
+                skills[cell] = tally = [0, 0, 0.0]
+            tally[0] += 1
+            tally[1] += correct
+            tally[2] += time_taken
+            fact = (operation, term1, term2)
+            tally = facts.get(fact)
+            if tally is None:
+                facts[fact] = tally = [0, 0, 0.0]
+            tally[0] += 1
+            tally[1] += correct
+            tally[2] += time_taken
+            latency_bin = cell + (bin_index(time_taken),)
+            bins[latency_bin] = bins.get(latency_bin, 0) + 1
+        conn.execute(
+            'INSERT OR REPLACE INTO session_summary (session_id, question_count, correct_count, time_sum) '
+            'VALUES (?, ?, ?, ?)', (session_id, len(rows), correct_count, time_sum)
+        )
+        conn.executemany(
+            'INSERT OR REPLACE INTO operation_summary (session_id, operation, first_seq, '
+            'question_count, correct_count, time_sum) VALUES (?, ?, ?, ?, ?, ?)',
+            [(session_id, operation) + tuple(tally) for operation, tally in operations.items()]
+        )
+        self._insert_sketches(conn, session_id, sketches)
+        conn.executemany(
+            'INSERT INTO skill_summary (profile_id, operation, bucket1, bucket2, question_count, '
+            'correct_count, time_sum) VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (profile_id, operation, bucket1, bucket2) DO UPDATE SET '
+            'question_count = question_count + excluded.question_count, '
+            'correct_count = correct_count + excluded.correct_count, '
+            'time_sum = time_sum + excluded.time_sum',
+            [] if skills_included else [(profile_id,) + cell + tuple(tally) for cell, tally in skills.items()]
+        )
+        # Once built, the weakness tallies already hold every answer the store had then
+        if not skills_included and self._has_weakness_tallies(conn):
+            self._add_weakness_tallies(
+                conn, [(profile_id,) + fact + tuple(tally) for fact, tally in facts.items()],
+                [(profile_id,) + latency_bin + (count,) for latency_bin, count in bins.items()]
+            )
+
+    @staticmethod
+    def _has_weakness_tallies(conn):
+        return conn.execute("SELECT 1 FROM meta WHERE key = 'weakness_tallies'").fetchone() is not None
+
+    @staticmethod
+    def _add_weakness_tallies(conn, facts, bins):
+        conn.executemany(
+            'INSERT INTO fact_tallies (profile_id, operation, term1, term2, question_count, correct_count, '
+            'time_sum) VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (profile_id, operation, term1, term2) DO UPDATE SET '
+            'question_count = question_count + excluded.question_count, '
+            'correct_count = correct_count + excluded.correct_count, '
+            'time_sum = time_sum + excluded.time_sum',
+            facts
+        )
+        conn.executemany(
+            'INSERT INTO cell_latency_bins (profile_id, operation, bucket1, bucket2, bin, question_count) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (profile_id, operation, bucket1, bucket2, bin) DO UPDATE SET '
+            'question_count = question_count + excluded.question_count',
+            bins
+        )
+
+    def _insert_sketches(self, conn, session_id, sketches):
+        """Store a session's {operation: LogHistogram} latency sketches; mostly empty bins, so compressed"""
+        conn.executemany(
+            'INSERT OR REPLACE INTO session_sketches (session_id, operation, question_count, histogram) '
+            'VALUES (?, ?, ?, ?)',
+            [(session_id, operation, sketch.total(), zlib.compress(sketch.to_bytes()))
+             for operation, sketch in sketches.items()]
+        )
+
+    @timed('store.rebuild_missing_summaries')
+    def _rebuild_missing_summaries(self, conn):
+        """Summarise sessions that were written without one (e.g. by an older schema)"""
+        missing = conn.execute(
+            'SELECT id, profile_id FROM sessions WHERE id NOT IN (SELECT session_id FROM session_summary)'
+        ).fetchall()
+        for session_id, profile_id in missing:
+            rows = conn.execute(
+                f"SELECT {', '.join(QUESTION_COLUMNS)} FROM questions WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+            # Migration 4 already folded every pre-existing answer into skill_summary
+            self._insert_summary(conn, session_id, rows, profile_id, skills_included=True)
+        self._rebuild_missing_sketches(conn)
+
+    def _rebuild_missing_sketches(self, conn):
+        """Sketch sessions saved before latency sketches existed, from their raw answers.
+
+        Sessions compacted before then have no raw answers left and stay unsketched.
+        """
+        import numpy as np
+
+        missing = [session_id for (session_id,) in conn.execute(
+            'SELECT s.id FROM sessions s JOIN session_summary m ON m.session_id = s.id '
+            'WHERE s.compacted = 0 AND m.question_count > 0 '
+            'AND s.id NOT IN (SELECT session_id FROM session_sketches)'
+        )]
+        for i in range(0, len(missing), ID_BATCH):
+            batch = missing[i:i + ID_BATCH]
+            rows = conn.execute(
+                f"SELECT session_id, operation, time_taken FROM questions "
+                f"WHERE session_id IN ({', '.join('?' * len(batch))}) ORDER BY session_id, operation", batch
+            ).fetchall()
+            for session_id, group in groupby(rows, key=lambda row: row[0]):
+                sketches = {}
+                for operation, answers in groupby(group, key=lambda row: row[1]):
+                    times = np.array([row[2] for row in answers], dtype=np.float64)
+                    sketches[operation] = LogHistogram(
+                        np.bincount(bin_indexes(times), minlength=BIN_COUNT).tolist()
+                    )
+                self._insert_sketches(conn, session_id, sketches)
+
+    def signature(self):
+        """Size and mtime of the database files, used to validate cached aggregates"""
+        signature = []
+        for path in (self.path, self.path + '-wal'):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    @timed('store.session_statistics')
+    def session_statistics(self, session_ids=None, profile=None):
+        """Totals per session plus per-operation accuracy, oldest session first.
+
+        Only the summary tables are read, so the cost grows with the number of
+        sessions rather than the number of answers; a profile's sessions are
+        found through the (profile_id, started_at) index.
+        """
+        with self.connect() as conn:
+            self._rebuild_missing_summaries(conn)
+            where = ''
+            params = ()
+            if session_ids is not None:
+                where += f" AND s.id IN ({', '.join('?' * len(session_ids))})"
+                params += tuple(session_ids)
+            if profile is not None:
+                where += ' AND s.profile_id = (SELECT id FROM profiles WHERE name = ?)'
+                params += (profile,)
+            sessions = conn.execute(
+                'SELECT s.id, s.name, m.question_count, m.correct_count, m.time_sum '
+                'FROM sessions s JOIN session_summary m ON m.session_id = s.id '
+                f'WHERE m.question_count > 0 {where} ORDER BY s.started_at, s.id', params
+            ).fetchall()
+            performance = {}
+            for session_id, operation, count, correct in conn.execute(
+                'SELECT o.session_id, o.operation, o.question_count, o.correct_count '
+                'FROM operation_summary o JOIN sessions s ON s.id = o.session_id '
+                f'WHERE 1 {where} ORDER BY o.session_id, o.first_seq', params
+            ):
+                performance.setdefault(session_id, {})[operation] = correct / count
+            latency = self._session_percentiles(
+                [session_id for session_id, *_ in sessions],
+                conn.execute(
+                    'SELECT k.session_id, k.histogram FROM session_sketches k '
+                    f'JOIN sessions s ON s.id = k.session_id WHERE 1 {where}', params
+                )
+            )
+
+        return [
+            (name, total, correct, time_sum / total, performance.get(session_id, {}), percentiles)
+            for (session_id, name, total, correct, time_sum), percentiles in zip(sessions, latency)
+        ]
+
+    @staticmethod
+    def _session_percentiles(session_ids, sketch_rows):
+        """{'p50': seconds, ...} for each session, merging its (session_id, histogram blob) sketch rows"""
+        import numpy as np
+
+        rows = {session_id: i for i, session_id in enumerate(session_ids)}
+        counts = np.zeros((len(session_ids), BIN_COUNT), dtype=np.int64)
+        for session_id, histogram in sketch_rows:
+            i = rows.get(session_id)
+            if i is not None:
+                counts[i] += np.frombuffer(zlib.decompress(histogram), dtype=np.int64)
+        names = [quantile_name(q) for q in QUANTILES]
+        return [dict(zip(names, values)) for values in counts_quantiles(counts).tolist()]
+
+    @timed('store.latency_percentiles')
+    def latency_percentiles(self, session_ids=None, profile=None, operations=None, since=None, until=None):
+        """Answer-time percentiles over any selection of sessions, by merging their sketches.
+
+        Returns {operation: {'count': n, 'p50': seconds, ...}} for each
+        operation answered, plus 'All' for the whole selection. Only one
+        small sketch per session and operation is read, never the answers,
+        so the cost grows with the number of sessions selected.
+        """
+        import numpy as np
+
+        conditions = []
+        params = []
+        if session_ids is not None:
+            conditions.append(f"s.id IN ({', '.join('?' * len(session_ids))})")
+            params.extend(session_ids)
+        if profile is not None:
+            conditions.append('s.profile_id = (SELECT id FROM profiles WHERE name = ?)')
+            params.append(profile)
+        if operations:
+            conditions.append(f"k.operation IN ({', '.join('?' * len(operations))})")
+            params.extend(operations)
+        if since is not None:
+            conditions.append('s.started_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('s.started_at < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        merged = {}
+        with self.connect() as conn:
+            self._rebuild_missing_summaries(conn)
+            for operation, histogram in conn.execute(
+                'SELECT k.operation, k.histogram FROM session_sketches k '
+                f'JOIN sessions s ON s.id = k.session_id {where}', params
+            ):
+                counts = np.frombuffer(zlib.decompress(histogram), dtype=np.int64)
+                merged[operation] = merged[operation] + counts if operation in merged else counts.copy()
+        total = np.zeros(BIN_COUNT, dtype=np.int64)
+        percentiles = {}
+        for operation in [op for op in OPERATIONS if op in merged]:
+            total += merged[operation]
+            percentiles[operation] = percentile_summary(merged[operation].tolist())
+        percentiles['All'] = percentile_summary(total.tolist())
+        return percentiles
+
+    @timed('store.skill_summary')
+    def skill_summary(self, profile=DEFAULT_PROFILE):
+        """A profile's all-time (operation, bucket1, bucket2, count, correct, time_sum) rows for training mode"""
+        with self.connect() as conn:
+            self._rebuild_missing_summaries(conn)
+            return conn.execute(
+                'SELECT operation, bucket1, bucket2, question_count, correct_count, time_sum '
+                'FROM skill_summary WHERE profile_id = (SELECT id FROM profiles WHERE name = ?)', (profile,)
+            ).fetchall()
+
+    @timed('store.weakness_tallies')
+    def weakness_tallies(self, profile=None):
+        """All-time weakness report inputs for one profile, or all of them summed.
+
+        Returns (facts, bins): (operation, term1, term2, count, correct,
+        time_sum) rows and (operation, bucket1, bucket2, bin, count) latency
+        histogram rows. They are kept up to date as sessions are saved, after
+        being built from the raw answers and rollups the first time they are
+        asked for, so reading them doesn't depend on the length of the history.
+        """
+        with self.connect() as conn:
+            built = self._has_weakness_tallies(conn)
+        if not built:
+            self._build_weakness_tallies()
+        if profile is None:
+            fact_sql = ('SELECT operation, term1, term2, SUM(question_count), SUM(correct_count), SUM(time_sum) '
+                        'FROM fact_tallies GROUP BY operation, term1, term2')
+            bin_sql = ('SELECT operation, bucket1, bucket2, bin, SUM(question_count) '
+                       'FROM cell_latency_bins GROUP BY operation, bucket1, bucket2, bin')
+            params = ()
+        else:
+            where = 'WHERE profile_id = (SELECT id FROM profiles WHERE name = ?)'
+            fact_sql = ('SELECT operation, term1, term2, question_count, correct_count, time_sum '
+                        f'FROM fact_tallies {where}')
+            bin_sql = f'SELECT operation, bucket1, bucket2, bin, question_count FROM cell_latency_bins {where}'
+            params = (profile,)
+        with self.connect() as conn:
+            conn.execute('BEGIN')
+            return conn.execute(fact_sql, params).fetchall(), conn.execute(bin_sql, params).fetchall()
+
+    @timed('store.build_weakness_tallies')
+    def _build_weakness_tallies(self):
+        """Fold each profile's raw answers and rollups into the weakness tallies, once"""
+        from analytics import WeaknessAccumulator, fold_history
+
+        with self.connect(write=True) as conn:
+            # Another process may have built them while this one waited for the lock
+            if self._has_weakness_tallies(conn):
+                return
+            for (profile_id,) in conn.execute('SELECT id FROM profiles').fetchall():
+                accumulator = WeaknessAccumulator()
+                fold_history(
+                    conn, accumulator,
+                    'WHERE session_id IN (SELECT id FROM sessions WHERE profile_id = ?)',
+                    'WHERE profile_id = ?', (profile_id,)
+                )
+                self._add_weakness_tallies(
+                    conn, [(profile_id,) + row for row in accumulator.fact_rollups()],
+                    [(profile_id,) + row for row in accumulator.cell_bins()]
+                )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('weakness_tallies', '1')")
+
+    def compaction_settings(self):
+        """(retention days, rollup period) used when compacting without explicit arguments"""
+        with self.connect() as conn:
+            return self._compaction_settings(conn)
+
+    def set_compaction_settings(self, retention_days, period):
+        if period not in PERIODS:
+            raise ValueError(f'Unknown rollup period {period!r}')
+        with self.connect(write=True) as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                [('retention_days', str(retention_days)), ('rollup_period', period)]
+            )
+
+    def _compaction_settings(self, conn):
+        meta = dict(conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('retention_days', 'rollup_period')"
+        ))
+        retention_days = float(meta.get('retention_days', DEFAULT_RETENTION_DAYS))
+        return retention_days, meta.get('rollup_period', DEFAULT_ROLLUP_PERIOD)
+
+    def compaction_due(self, now=None):
+        """Whether the background compaction hasn't run for COMPACTION_INTERVAL"""
+        now = time.time() if now is None else now
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_compaction'").fetchone()
+        return row is None or now - float(row[0]) >= COMPACTION_INTERVAL
+
+    @timed('store.compact')
+    def compact(self, retention_days=None, period=None, now=None):
+        """Replace the raw answers of sessions older than the retention with rollups.
+
+        Answers are folded into per-(profile, day or week) rollups of the
+        weakness report's cells and facts, and their rows and replay logs are
+        deleted. Sessions, their summaries and the skill summary are kept, so
+        history, training mode and the weakness report come out the same.
+        Everything happens in one write transaction, so an interrupted
+        compaction leaves the store exactly as it was.
+        """
+        now = time.time() if now is None else now
+        with self.connect(write=True) as conn:
+            saved_retention, saved_period = self._compaction_settings(conn)
+            retention_days = saved_retention if retention_days is None else retention_days
+            period = saved_period if period is None else period
+            if period not in PERIODS:
+                raise ValueError(f'Unknown rollup period {period!r}')
+            self._rebuild_missing_summaries(conn)
+            sessions = conn.execute(
+                'SELECT profile_id, started_at, id FROM sessions WHERE compacted = 0 AND started_at < ? '
+                'ORDER BY profile_id, started_at', (now - retention_days * DAY_SECONDS,)
+            ).fetchall()
+            questions = 0
+            for (profile_id, start), group in groupby(
+                    sessions, key=lambda row: (row[0], period_start(row[1], period))):
+                questions += self._roll_up(conn, profile_id, start, [row[2] for row in group])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_compaction', ?)", (str(now),))
+        return {'sessions': len(sessions), 'questions': questions}
+
+    def _roll_up(self, conn, profile_id, start, session_ids):
+        """Fold one profile's sessions from one period into its rollups and drop their raw rows"""
+        from analytics import ROW_SQL, WeaknessAccumulator
+
+        accumulator = WeaknessAccumulator()
+        questions = 0
+        for i in range(0, len(session_ids), ID_BATCH):
+            batch = session_ids[i:i + ID_BATCH]
+            placeholders = ', '.join('?' * len(batch))
+            rows = conn.execute(
+                f'SELECT {ROW_SQL} FROM questions WHERE session_id IN ({placeholders})', batch
+            ).fetchall()
+            if rows:
+                accumulator.add_rows(rows)
+                questions += len(rows)
+            conn.execute(f'DELETE FROM questions WHERE session_id IN ({placeholders})', batch)
+            conn.execute(f'DELETE FROM session_logs WHERE session_id IN ({placeholders})', batch)
+            conn.execute(f'UPDATE sessions SET compacted = 1 WHERE id IN ({placeholders})', batch)
+        if not questions:
+            return 0
+
+        # Merge with whatever an earlier compaction already rolled up for this period
+        for row in conn.execute(
+            'SELECT operation, bucket1, bucket2, question_count, correct_count, histogram '
+            'FROM question_rollups WHERE profile_id = ? AND period_start = ?', (profile_id, start)
+        ).fetchall():
+            accumulator.add_cell(*row)
+        conn.executemany(
+            'INSERT OR REPLACE INTO question_rollups (profile_id, period_start, operation, bucket1, bucket2, '
+            'question_count, correct_count, histogram) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(profile_id, start) + row for row in accumulator.cell_rollups()]
+        )
+        conn.executemany(
+            'INSERT INTO fact_rollups (profile_id, period_start, operation, term1, term2, question_count, '
+            'correct_count, time_sum) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (profile_id, period_start, operation, term1, term2) DO UPDATE SET '
+            'question_count = question_count + excluded.question_count, '
+            'correct_count = correct_count + excluded.correct_count, '
+            'time_sum = time_sum + excluded.time_sum',
+            [(profile_id, start) + row for row in accumulator.fact_rollups()]
+        )
+        return questions
+
+    @timed('store.import_legacy_xlsx')
+    def import_legacy_xlsx(self, path=LEGACY_XLSX_PATH):
+        """Copy sheets from the old one-sheet-per-game workbook into the store.
+
+        The workbook's size and mtime are remembered, so it is only opened
+        again if it changes; sheets that were already imported are skipped.
+        """
+        if not os.path.exists(path):
+            return 0
+        stat = os.stat(path)
+        signature = f'{stat.st_size}:{stat.st_mtime_ns}'
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'legacy_xlsx'").fetchone()
+            if row and row[0] == signature:
+                return 0
+
+        import pandas as pd
+
+        imported = 0
+        excel_file = pd.ExcelFile(path)
+        with self.connect(write=True) as conn:
+            # Checked under the write lock so two instances never import a sheet twice
+            known = {name for (name,) in conn.execute(
+                'SELECT name FROM sessions WHERE profile_id = ?', (DEFAULT_PROFILE_ID,)
+            )}
+            for sheet_name in excel_file.sheet_names:
+                if sheet_name in known:
+                    continue
+                df = pd.read_excel(excel_file, sheet_name=sheet_name)
+                started_at = parse_session_time(sheet_name, stat.st_mtime)
+                times = df['Time_Taken_Seconds'].astype(float)
+                answered = started_at + times.cumsum()
+                user_answers = df['User_Answer'] if 'User_Answer' in df else [None] * len(df)
+                rows = [
+                    (i, float(answered.iat[i]), float(times.iat[i]), str(df['Operation'].iat[i]),
+                     int(df['Term1'].iat[i]), int(df['Term2'].iat[i]),
+                     None if pd.isna(user_answers[i]) else float(user_answers[i]),
+                     int(df['Correct'].iat[i]), None, None, None)
+                    for i in range(len(df))
+                ]
+                self._insert_session(conn, sheet_name, started_at, rows)
+                imported += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_xlsx', ?)", (signature,)
+            )
+        return imported
+
+    @timed('store.export_xlsx')
+    def export_xlsx(self, path, profile=None):
+        """Write every session (or one profile's) to a workbook with one sheet per game"""
+        import pandas as pd
+
+        with self.connect() as conn, pd.ExcelWriter(path, engine='openpyxl') as writer:
+            if profile is None:
+                sessions = conn.execute('SELECT id, name FROM sessions ORDER BY started_at, id').fetchall()
+            else:
+                sessions = conn.execute(
+                    'SELECT id, name FROM sessions WHERE profile_id = (SELECT id FROM profiles WHERE name = ?) '
+                    'ORDER BY started_at, id', (profile,)
+                ).fetchall()
+            for session_id, name in sessions:
+                df = pd.read_sql_query(
+                    'SELECT time_taken AS Time_Taken_Seconds, operation AS Operation, '
+                    'term1 AS Term1, term2 AS Term2, user_answer AS User_Answer, correct AS Correct, '
+                    'first_key AS First_Key_Seconds, submit_delay AS Submit_Delay_Seconds, '
+                    'corrections AS Corrections '
+                    'FROM questions WHERE session_id = ? ORDER BY seq',
+                    conn, params=(session_id,)
+                )
+                df.to_excel(writer, sheet_name=name[:31], index=False)
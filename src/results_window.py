@@ -1,18 +1,45 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel, 
-                           QScrollArea, QTableWidget, QTableWidgetItem, QTabWidget)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QPixmap, QColor
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
+                           QScrollArea, QTableView, QTableWidget, QTableWidgetItem, QTabWidget,
+                           QComboBox, QLineEdit, QShortcut)
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QFont, QPixmap, QKeySequence
+from session_recorder import OPERATIONS
+from table_models import QuestionHistoryModel, AllGamesModel
+from persistence import run_in_background
+from profiling import timed
+from charts import ChartCache, latency_points, request_chart
+from analytics import bucket_label
+from histogram import QUANTILES, quantile_name
+from skill_buckets import BUCKET_COUNT
+
+CHARTS = [('latency', 'Time per Question'), ('accuracy', 'Accuracy by Operation'), ('heatmap', 'Median Time by Term Range')]
+PERCENTILE_LABEL = ' / '.join(quantile_name(q) for q in QUANTILES)
+# Rows measured when sizing table columns to their contents
+RESIZE_ROWS = 100
+
+
+def format_percentiles(summary):
+    """'1.20s / 2.45s / 4.10s' for a {'p50': ..., ...} percentile summary"""
+    return ' / '.join(f'{summary[quantile_name(q)]:.2f}s' for q in QUANTILES)
+
 
 class ResultsWindow(QWidget):
-    def __init__(self, score, total_questions, total_time, statistics, question_history):
+    # Emitted from chart pool threads; delivered on the GUI thread
+    chart_ready = pyqtSignal(str, str)
+    play_again_requested = pyqtSignal()
+    rematch_requested = pyqtSignal()
+
+    def __init__(self, score, total_questions, total_time, statistics, data_manager):
         super().__init__()
         self.score = score
         self.total_questions = total_questions
         self.total_time = total_time
         self.statistics = statistics
-        self.question_history = question_history
+        self.data_manager = data_manager
+        self.recorder = data_manager.recorder
         self.initUI()
 
+    @timed('ui.results_window')
     def initUI(self):
         self.setWindowTitle('Game Results')
         self.setGeometry(300, 300, 1200, 800)
@@ -38,6 +65,13 @@ class ResultsWindow(QWidget):
                           f'{(self.score / self.total_questions) * 100:.2f}%' if self.total_questions > 0 else 'N/A')
         self.add_statistic(current_game_layout, 'Average Time per Question', 
                           f'{self.total_time / self.total_questions:.2f} seconds' if self.total_questions > 0 else 'N/A')
+        latency = self.statistics.get('Latency Percentiles', {})
+        if latency:
+            self.add_statistic(current_game_layout, f'Time per Question {PERCENTILE_LABEL}',
+                               format_percentiles(latency['All']))
+            self.add_statistic(current_game_layout, f'By Operation {PERCENTILE_LABEL}', ',  '.join(
+                f'{op}: {format_percentiles(summary)}' for op, summary in latency.items() if op != 'All'
+            ))
         
         # Add question history table
         history_label = QLabel('Question History:', self)
@@ -57,14 +91,52 @@ class ResultsWindow(QWidget):
         all_games_title.setFont(QFont('Arial', 24, QFont.Bold))
         all_games_layout.addWidget(all_games_title)
         
-        # Add table with all games history
-        all_games_layout.addWidget(self.create_all_games_table())
+        # Filled in by show_all_game_statistics once the game has been saved
+        self.all_games_layout = all_games_layout
+        self.all_games_placeholder = QLabel('Saving results...', self)
+        self.all_games_placeholder.setAlignment(Qt.AlignCenter)
+        all_games_layout.addWidget(self.all_games_placeholder)
         
         all_games_tab.setLayout(all_games_layout)
         
+        # Weak Areas Tab
+        weak_areas_tab = QWidget()
+        weak_areas_layout = QVBoxLayout()
+        
+        weak_areas_title = QLabel('Weak Areas', self)
+        weak_areas_title.setAlignment(Qt.AlignCenter)
+        weak_areas_title.setFont(QFont('Arial', 24, QFont.Bold))
+        weak_areas_layout.addWidget(weak_areas_title)
+        
+        # Filled in by show_weakness_report once the history has been analysed
+        self.weak_areas_layout = weak_areas_layout
+        self.weak_areas_placeholder = QLabel('Analysing history...', self)
+        self.weak_areas_placeholder.setAlignment(Qt.AlignCenter)
+        weak_areas_layout.addWidget(self.weak_areas_placeholder)
+        
+        weak_areas_tab.setLayout(weak_areas_layout)
+        
+        # Charts Tab
+        charts_tab = QScrollArea()
+        charts_tab.setWidgetResizable(True)
+        charts_widget = QWidget()
+        charts_layout = QVBoxLayout()
+        self.chart_labels = {}
+        for kind, title in CHARTS:
+            chart_title = QLabel(title, self)
+            chart_title.setFont(QFont('Arial', 18, QFont.Bold))
+            charts_layout.addWidget(chart_title)
+            self.chart_labels[kind] = QLabel('Rendering...', self)
+            self.chart_labels[kind].setAlignment(Qt.AlignCenter)
+            charts_layout.addWidget(self.chart_labels[kind])
+        charts_widget.setLayout(charts_layout)
+        charts_tab.setWidget(charts_widget)
+        
         # Add tabs to tab widget
         tab_widget.addTab(current_game_tab, "Current Game")
         tab_widget.addTab(all_games_tab, "All Games History")
+        tab_widget.addTab(weak_areas_tab, "Weak Areas")
+        tab_widget.addTab(charts_tab, "Charts")
         
         layout.addWidget(tab_widget)
         
@@ -72,82 +144,184 @@ class ResultsWindow(QWidget):
         self.play_again_button = QPushButton('Play Again', self)
         self.play_again_button.setFont(QFont('Arial', 18))
         self.play_again_button.clicked.connect(self.play_again)
-        layout.addWidget(self.play_again_button)
+        self.rematch_button = QPushButton('Rematch (R)', self)
+        self.rematch_button.setFont(QFont('Arial', 18))
+        self.rematch_button.clicked.connect(self.rematch_requested)
+        QShortcut(QKeySequence('R'), self, self.rematch_requested.emit)
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.play_again_button)
+        buttons_layout.addWidget(self.rematch_button)
+        layout.addLayout(buttons_layout)
         
         self.setLayout(layout)
 
-    def create_question_history_table(self):
-        table = QTableWidget()
-        table.setColumnCount(4)
-        table.setHorizontalHeaderLabels(['Question', 'Your Answer', 'Correct Answer', 'Result'])
-        table.setRowCount(len(self.question_history))
-        table.setMinimumHeight(300)
-        
-        for i, record in enumerate(self.question_history):
-            question_item = QTableWidgetItem(record['question'])
-            user_answer_item = QTableWidgetItem(str(record['user_answer']))
-            correct_answer_item = QTableWidgetItem(str(record['correct_answer']))
-            result_item = QTableWidgetItem('Correct' if record['is_correct'] else 'Incorrect')
-            
-            if record['is_correct']:
-                result_item.setBackground(QColor(144, 238, 144))  # Light green
-            else:
-                result_item.setBackground(QColor(255, 182, 193))  # Light red
-            
-            table.setItem(i, 0, question_item)
-            table.setItem(i, 1, user_answer_item)
-            table.setItem(i, 2, correct_answer_item)
-            table.setItem(i, 3, result_item)
-        
+        self.chart_cache = ChartCache()
+        self.chart_ready.connect(self.show_chart)
+        self.request_chart('latency', *latency_points(self.recorder.time_taken[:len(self.recorder)]))
+
+    def request_chart(self, kind, data, params):
+        request_chart(self.chart_cache, kind, data, params, lambda path: self.chart_done(kind, path))
+
+    def chart_done(self, kind, path):
+        """Called on a pool thread; hands the chart to the GUI thread"""
+        try:
+            self.chart_ready.emit(kind, path)
+        except RuntimeError:
+            pass  # the window was closed before the chart finished
+
+    def show_chart(self, kind, path):
+        self.chart_labels[kind].setPixmap(QPixmap(path))
+
+    def create_table_view(self, model):
+        table = QTableView()
+        table.setModel(model)
+        # Keep the recorded order until the user clicks a header
+        table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        table.setSortingEnabled(True)
+        # Only the first rows of the first fetched batch are measured, not the whole history
+        table.horizontalHeader().setResizeContentsPrecision(RESIZE_ROWS)
         table.resizeColumnsToContents()
         return table
 
-    def create_all_games_table(self):
-        from data_manager import DataManager
-        all_stats = DataManager().get_all_game_statistics()
-        
-        table = QTableWidget()
-        table.setColumnCount(6)
-        table.setHorizontalHeaderLabels([
-            'Game Session', 
-            'Total Questions', 
-            'Correct Answers', 
-            'Accuracy',
-            'Avg Time/Question',
-            'Performance by Operation'
-        ])
-        table.setRowCount(len(all_stats))
-        
-        for i, game in enumerate(all_stats):
-            session_item = QTableWidgetItem(game['Game Session'])
-            total_q_item = QTableWidgetItem(str(game['Total Questions']))
-            correct_item = QTableWidgetItem(str(game['Correct Answers']))
-            accuracy_item = QTableWidgetItem(game['Accuracy'])
-            time_item = QTableWidgetItem(game['Average Time per Question'])
-            
-            # Format performance by operation as a string
-            performance_str = ', '.join(
-                [f"{op}: {acc:.2%}" for op, acc in game['Performance by Operation'].items()]
-            )
-            performance_item = QTableWidgetItem(performance_str)
-            
-            table.setItem(i, 0, session_item)
-            table.setItem(i, 1, total_q_item)
-            table.setItem(i, 2, correct_item)
-            table.setItem(i, 3, accuracy_item)
-            table.setItem(i, 4, time_item)
-            table.setItem(i, 5, performance_item)
-        
+    @timed('ui.question_history_table')
+    def create_question_history_table(self):
+        container = QWidget()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.question_model = QuestionHistoryModel(self.recorder, self)
+        filter_layout = QHBoxLayout()
+        self.operation_filter = QComboBox()
+        self.operation_filter.addItems(['All operations'] + OPERATIONS)
+        self.result_filter = QComboBox()
+        self.result_filter.addItems(['All results', 'Correct', 'Incorrect'])
+        self.operation_filter.currentIndexChanged.connect(self.filter_question_history)
+        self.result_filter.currentIndexChanged.connect(self.filter_question_history)
+        filter_layout.addWidget(self.operation_filter)
+        filter_layout.addWidget(self.result_filter)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
+        table = self.create_table_view(self.question_model)
+        table.setMinimumHeight(300)
+        layout.addWidget(table)
+        container.setLayout(layout)
+        return container
+
+    def filter_question_history(self):
+        operation_index = self.operation_filter.currentIndex()
+        result_index = self.result_filter.currentIndex()
+        self.question_model.filter_by(
+            OPERATIONS[operation_index - 1] if operation_index > 0 else None,
+            None if result_index == 0 else result_index == 1
+        )
+
+    @timed('ui.all_games_tab')
+    def show_all_game_statistics(self, all_stats):
+        self.all_games_layout.removeWidget(self.all_games_placeholder)
+        self.all_games_placeholder.deleteLater()
+        self.history_percentiles_label = QLabel('Merging latency sketches...', self)
+        self.history_percentiles_label.setFont(QFont('Arial', 14))
+        self.all_games_layout.addWidget(self.history_percentiles_label)
+        self.all_games_layout.addWidget(self.create_all_games_table(all_stats))
+
+        # The game is stored now, so the analysis includes it
+        run_in_background(
+            self.data_manager.get_latency_percentiles, self.show_history_percentiles,
+            lambda error: self.show_error(self.history_percentiles_label, 'Could not merge latency sketches', error)
+        )
+        run_in_background(
+            self.data_manager.get_weakness_report, self.show_weakness_report,
+            lambda error: self.show_error(self.weak_areas_placeholder, 'Could not analyse history', error)
+        )
+
+    def show_all_games_error(self, error):
+        """Shown instead of the All Games tab when saving the game or reloading the history failed"""
+        self.show_error(self.all_games_placeholder, 'Saving or loading results failed', error)
+
+    def show_error(self, label, message, error):
+        print(f"Error: {message}: {error!r}")
+        label.setText(f'{message}:\n{error}')
+        label.setWordWrap(True)
+        label.setStyleSheet('color: red')
+
+    @timed('ui.history_percentiles')
+    def show_history_percentiles(self, percentiles):
+        if not percentiles['All']['count']:
+            self.history_percentiles_label.setText('No answer times recorded yet')
+            return
+        lines = [f"All games ({percentiles['All']['count']:,} answers), time per question {PERCENTILE_LABEL}: "
+                 f"{format_percentiles(percentiles['All'])}"]
+        lines.extend(
+            f"{op} ({summary['count']:,}): {format_percentiles(summary)}"
+            for op, summary in percentiles.items() if op != 'All'
+        )
+        self.history_percentiles_label.setText('\n'.join(lines))
+
+    @timed('ui.weakness_tab')
+    def show_weakness_report(self, report):
+        self.weak_areas_layout.removeWidget(self.weak_areas_placeholder)
+        self.weak_areas_placeholder.deleteLater()
+
+        percentiles = ['p50', 'p90', 'p99']
+        sections = [
+            ('By Operation', ['Operation', 'Questions', 'Accuracy'] + percentiles,
+             [[row['operation'], row['count'], row['accuracy']] + [row[p] for p in percentiles]
+              for row in report['operations']]),
+            ('Weakest Term Ranges', ['Operation', 'Term 1', 'Term 2', 'Questions', 'Accuracy'] + percentiles,
+             [[row['operation'], row['term1'], row['term2'], row['count'], row['accuracy']]
+              + [row[p] for p in percentiles] for row in report['cells'][:15]]),
+            ('Costliest Questions', ['Question', 'Attempts', 'Accuracy', 'Avg Time'],
+             [[row['question'], row['count'], row['accuracy'], row['mean_time']] for row in report['facts']]),
+        ]
+        for title, headers, rows in sections:
+            label = QLabel(title, self)
+            label.setFont(QFont('Arial', 18, QFont.Bold))
+            self.weak_areas_layout.addWidget(label)
+            self.weak_areas_layout.addWidget(self.create_report_table(headers, rows))
+
+        self.request_chart('accuracy', [[row['operation'], row['accuracy']] for row in report['operations']], {})
+        self.request_chart(
+            'heatmap',
+            [[row['operation'], row['term1'], row['term2'], row['p50']] for row in report['cells']],
+            {'labels': [bucket_label(i) for i in range(BUCKET_COUNT)],
+             'operations': OPERATIONS, 'metric': 'p50 (s)'}
+        )
+
+    def create_report_table(self, headers, rows):
+        table = QTableWidget(len(rows), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                if headers[j] == 'Accuracy':
+                    text = f'{value:.2%}'
+                elif isinstance(value, float):
+                    text = f'{value:.2f}s'
+                else:
+                    text = str(value)
+                table.setItem(i, j, QTableWidgetItem(text))
         table.resizeColumnsToContents()
         return table
 
+    def create_all_games_table(self, all_stats):
+        container = QWidget()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.all_games_model = AllGamesModel(all_stats, self)
+        session_filter = QLineEdit()
+        session_filter.setPlaceholderText('Filter by game session')
+        session_filter.textChanged.connect(self.all_games_model.filter_by)
+        layout.addWidget(session_filter)
+
+        layout.addWidget(self.create_table_view(self.all_games_model))
+        container.setLayout(layout)
+        return container
+
     def add_statistic(self, layout, label, value):
         stat_label = QLabel(f'{label}: {value}', self)
         stat_label.setFont(QFont('Arial', 16))
         layout.addWidget(stat_label)
 
     def play_again(self):
-        from menu_window import MenuWindow
-        self.menu_window = MenuWindow()
-        self.menu_window.show()
-        self.close()
\ No newline at end of file
+        self.play_again_requested.emit()
\ No newline at end of file
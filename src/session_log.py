@@ -0,0 +1,58 @@
+import json
+import struct
+import zlib
+
+MAGIC = b'ZSL1'
+# Event kinds
+START = 0
+TEXT = 1
+SUBMIT = 2
+
+# Clock reading in ns, kind, length of the UTF-8 text that follows
+_EVENT = struct.Struct('<qBH')
+_HEADER_LENGTH = struct.Struct('<I')
+MAX_TEXT = 0xFFFF
+
+
+class SessionEventLog:
+    """Compact binary record of one game, enough to replay it exactly.
+
+    The header holds the duration, ranges and a snapshot of the question
+    source (seed, and for training mode the skill summary it started from);
+    after it comes every input event with the engine clock reading it was
+    handled at. The whole log is zlib-compressed when saved.
+    """
+
+    def __init__(self, duration, ranges, source):
+        self.header = {'duration': duration, 'ranges': ranges, 'source': source}
+        self.events = bytearray()
+
+    def record(self, kind, now, text=''):
+        data = text.encode('utf-8')[:MAX_TEXT]
+        self.events += _EVENT.pack(now, kind, len(data))
+        self.events += data
+
+    def __len__(self):
+        return len(self.events)
+
+    def to_bytes(self):
+        header = json.dumps(self.header, ensure_ascii=False).encode('utf-8')
+        return MAGIC + zlib.compress(_HEADER_LENGTH.pack(len(header)) + header + bytes(self.events))
+
+
+def read_log(data):
+    """Decode a saved log into (header, [(kind, now_ns, text), ...])"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a session log')
+    body = zlib.decompress(data[len(MAGIC):])
+    (length,) = _HEADER_LENGTH.unpack_from(body)
+    offset = _HEADER_LENGTH.size
+    header = json.loads(body[offset:offset + length].decode('utf-8'))
+    offset += length
+    events = []
+    while offset < len(body):
+        now, kind, size = _EVENT.unpack_from(body, offset)
+        offset += _EVENT.size
+        events.append((kind, now, body[offset:offset + size].decode('utf-8', 'replace')))
+        offset += size
+    return header, events
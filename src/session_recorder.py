@@ -0,0 +1,106 @@
+from array import array
+from histogram import LogHistogram
+
+OPERATIONS = ['+', '-', '×', '÷']
+OPERATION_CODES = {op: code for code, op in enumerate(OPERATIONS)}
+COLUMN_TYPES = {
+    'time_taken': 'd', 'operation': 'b', 'term1': 'q', 'term2': 'q', 'user_answer': 'd',
+    'correct': 'b', 'first_key': 'd', 'submit_delay': 'd', 'corrections': 'l',
+}
+NAN = float('nan')
+INITIAL_CAPACITY = 1024
+
+
+def correct_answer(operation, term1, term2):
+    """Work out the expected answer for a question"""
+    if operation == '+':
+        return term1 + term2
+    if operation == '-':
+        return term1 - term2
+    if operation == '×':
+        return term1 * term2
+    return term1 // term2
+
+
+class SessionRecorder:
+    """Columnar record of every answer submitted during one game.
+
+    Columns are typed arrays that grow by doubling, so appending a row is
+    O(1); the store reads the columns directly when the game is saved.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.count = 0
+        self.capacity = capacity
+        for name, typecode in COLUMN_TYPES.items():
+            setattr(self, name, array(typecode, bytes(array(typecode).itemsize * capacity)))
+        # Running tallies so statistics never need a scan
+        self.correct_total = 0
+        self.time_total = 0.0
+        self.operation_counts = [0] * len(OPERATIONS)
+        self.operation_correct = [0] * len(OPERATIONS)
+        self.operation_time = [0.0] * len(OPERATIONS)
+        # Latency sketch per operation, merged for the game's percentiles
+        self.operation_latency = [LogHistogram() for _ in OPERATIONS]
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        for name in COLUMN_TYPES:
+            column = getattr(self, name)
+            column.extend(column)
+        self.capacity *= 2
+
+    def append(self, time_taken, operation, term1, term2, user_answer, correct,
+               first_key=NAN, submit_delay=NAN, corrections=0):
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        code = OPERATION_CODES[operation]
+        self.time_taken[i] = time_taken
+        self.operation[i] = code
+        self.term1[i] = term1
+        self.term2[i] = term2
+        self.user_answer[i] = user_answer
+        self.correct[i] = 1 if correct else 0
+        self.first_key[i] = NAN if first_key is None else first_key
+        self.submit_delay[i] = NAN if submit_delay is None else submit_delay
+        self.corrections[i] = corrections or 0
+        self.count = i + 1
+
+        self.time_total += time_taken
+        self.operation_counts[code] += 1
+        self.operation_time[code] += time_taken
+        self.operation_latency[code].add(time_taken)
+        if correct:
+            self.correct_total += 1
+            self.operation_correct[code] += 1
+
+    def operation_at(self, i):
+        return OPERATIONS[self.operation[i]]
+
+    def question_at(self, i):
+        return f"{self.term1[i]} {self.operation_at(i)} {self.term2[i]}"
+
+    def correct_answer_at(self, i):
+        return round(correct_answer(self.operation_at(i), self.term1[i], self.term2[i]), 6)
+
+    def performance_by_operation(self):
+        """Accuracy for each operation that was asked at least once"""
+        return {
+            op: self.operation_correct[code] / self.operation_counts[code]
+            for code, op in enumerate(OPERATIONS)
+            if self.operation_counts[code]
+        }
+
+    def latency_percentiles(self):
+        """Percentile summary of answer times per operation asked, plus 'All' for the whole game"""
+        total = LogHistogram()
+        percentiles = {}
+        for code, op in enumerate(OPERATIONS):
+            if self.operation_counts[code]:
+                total.merge(self.operation_latency[code])
+                percentiles[op] = self.operation_latency[code].percentiles()
+        percentiles['All'] = total.percentiles()
+        return percentiles
@@ -0,0 +1,236 @@
+# simulation.py
+"""Headless load/benchmark harness: scripted bots play full games against GameEngine.
+
+Examples:
+    python simulation.py --bots 2000 --profile average --db ../tests/simulated.db
+    python simulation.py --processes 16 --bots 50     # concurrent-save stress test
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from game_engine import create_engine
+from results_store import ResultsStore, DEFAULT_PROFILE
+
+DEFAULT_RANGES = {
+    '+': {'term1': {'min': 1, 'max': 100}, 'term2': {'min': 1, 'max': 100}},
+    '-': {'term1': {'min': 1, 'max': 100}, 'term2': {'min': 1, 'max': 100}},
+    '×': {'term1': {'min': 1, 'max': 100}, 'term2': {'min': 1, 'max': 12}},
+    '÷': {'term1': {'min': 1, 'max': 100}, 'term2': {'min': 1, 'max': 12}}
+}
+
+# Seconds of thinking per question (mean, spread), seconds per keystroke,
+# chance of submitting a wrong answer and chance of a typo that gets backspaced
+BotProfile = namedtuple('BotProfile', ['think_time', 'think_spread', 'key_interval', 'error_rate', 'typo_rate'])
+
+PROFILES = {
+    'novice': BotProfile(6.0, 2.5, 0.25, 0.15, 0.10),
+    'average': BotProfile(3.0, 1.2, 0.15, 0.06, 0.05),
+    'expert': BotProfile(1.2, 0.4, 0.08, 0.02, 0.02),
+}
+
+# Simulated games are spread out this far apart in stored history
+GAME_SPACING_SECONDS = 3600
+
+
+class VirtualClock:
+    """Nanosecond clock that only moves when the simulation advances it"""
+
+    def __init__(self):
+        self.now_ns = 0
+
+    def __call__(self):
+        return self.now_ns
+
+    def advance(self, seconds):
+        self.now_ns += int(seconds * 1e9)
+
+
+class Bot:
+    """Plays one game against an engine on a virtual clock"""
+
+    def __init__(self, engine, clock, profile, rng):
+        self.engine = engine
+        self.clock = clock
+        self.profile = profile
+        self.rng = rng
+
+    def wait(self, seconds):
+        """Let virtual time pass; returns True once the game is over"""
+        self.clock.advance(seconds)
+        return self.engine.is_over
+
+    def play(self):
+        engine = self.engine
+        profile = self.profile
+        rng = self.rng
+        engine.start()
+        while True:
+            if self.wait(max(0.1, rng.gauss(profile.think_time, profile.think_spread))):
+                return
+            answer = engine.answer
+            if rng.random() < profile.error_rate:
+                answer += rng.choice((-1, 1)) * rng.randint(1, 10)
+            typed = ''
+            for ch in str(answer):
+                if rng.random() < profile.typo_rate:
+                    if self.wait(profile.key_interval):
+                        return
+                    engine.type_text(typed + str(rng.randint(0, 9)))
+                    if self.wait(profile.key_interval):
+                        return
+                    engine.type_text(typed)
+                typed += ch
+                if self.wait(profile.key_interval):
+                    return
+                engine.type_text(typed)
+            if self.wait(profile.key_interval):
+                return
+            engine.submit()
+
+
+def timed(function, totals, key):
+    """Wrap function so the time spent in it is added to totals[key]"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            totals[key] += time.perf_counter() - start
+    return wrapper
+
+
+def run_simulation(store, bots, profile, duration=120, ranges=DEFAULT_RANGES, seed=None, training=False,
+                   player=DEFAULT_PROFILE):
+    """Play `bots` games back to back into store as `player` and return throughput figures"""
+    rng = random.Random(seed)
+    totals = {'play': 0.0, 'record': 0.0, 'save': 0.0}
+    questions = 0
+    first_game = time.time() - bots * GAME_SPACING_SECONDS
+
+    for i in range(bots):
+        clock = VirtualClock()
+        engine = create_engine(
+            duration, ranges, rng.getrandbits(63), training, store, clock,
+            journal=False, started_at=first_game + i * GAME_SPACING_SECONDS, profile=player
+        )
+        data_manager = engine.data_manager
+        data_manager.add_result = timed(data_manager.add_result, totals, 'record')
+
+        start = time.perf_counter()
+        Bot(engine, clock, profile, rng).play()
+        totals['play'] += time.perf_counter() - start
+        questions += engine.questions_asked
+
+        start = time.perf_counter()
+        data_manager.save_results()
+        totals['save'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    sessions = len(store.session_statistics(profile=player))
+    statistics_time = time.perf_counter() - start
+
+    return {
+        'games': bots,
+        'questions': questions,
+        'questions_per_second': questions / totals['play'] if totals['play'] else 0.0,
+        'record_seconds': totals['record'],
+        'record_us_per_question': totals['record'] / questions * 1e6 if questions else 0.0,
+        'save_seconds': totals['save'],
+        'save_ms_per_game': totals['save'] / bots * 1e3 if bots else 0.0,
+        'statistics_seconds': statistics_time,
+        'sessions_per_second': sessions / statistics_time if statistics_time else 0.0,
+    }
+
+
+def _stress_worker(path, player, bots, profile, duration, seed, training):
+    store = ResultsStore(path)
+    return run_simulation(store, bots, PROFILES[profile], duration, seed=seed, training=training, player=player)
+
+
+def run_stress_test(path, processes, bots, profile, duration=120, seed=None, training=False):
+    """Have `processes` players save games into one store at the same time, then check the store.
+
+    Every process plays as its own profile, so afterwards each profile must
+    hold exactly its own games and the summaries must agree with the raw answers.
+    """
+    players = [f'Bot {i + 1}' for i in range(processes)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [
+            pool.submit(_stress_worker, path, player, bots, profile, duration,
+                        None if seed is None else seed + i, training)
+            for i, player in enumerate(players)
+        ]
+        reports = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    store = ResultsStore(path)
+    mismatched = sum(len(store.session_statistics(profile=player)) != bots for player in players)
+    with store.connect() as conn:
+        integrity = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        answers = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+        summarised = conn.execute('SELECT COALESCE(SUM(question_count), 0) FROM session_summary').fetchone()[0]
+        skills = conn.execute('SELECT COALESCE(SUM(question_count), 0) FROM skill_summary').fetchone()[0]
+    if integrity != 'ok' or mismatched or not answers == summarised == skills:
+        raise RuntimeError(
+            f'Store inconsistent after stress test: integrity={integrity}, '
+            f'profiles with wrong game count={mismatched}, answers={answers}, '
+            f'summarised={summarised}, skill cells={skills}'
+        )
+
+    saves = sum(report['save_seconds'] for report in reports)
+    return {
+        'processes': processes,
+        'games': sum(report['games'] for report in reports),
+        'questions': answers,
+        'wall_seconds': elapsed,
+        'games_saved_per_second': processes * bots / elapsed if elapsed else 0.0,
+        'save_ms_per_game': saves / (processes * bots) * 1e3 if bots else 0.0,
+        'integrity': integrity,
+    }
+
+
+def print_report(report):
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        if isinstance(value, float):
+            print(f'{key:<{width}}  {value:,.3f}')
+        elif isinstance(value, int):
+            print(f'{key:<{width}}  {value:,}')
+        else:
+            print(f'{key:<{width}}  {value}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bots', type=int, default=1000, help='number of games to simulate')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='average')
+    parser.add_argument('--duration', type=int, default=120, help='game length in seconds')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--training', action='store_true', help='use the adaptive scheduler')
+    parser.add_argument('--db', default=None, help='store to fill (default: a temporary file)')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='stress test: this many processes each save --bots games at the same time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.abspath(args.db) if args.db else os.path.join(tmp, 'simulated.db')
+        if args.processes:
+            report = run_stress_test(
+                path, args.processes, args.bots, args.profile, args.duration, args.seed, args.training
+            )
+        else:
+            report = run_simulation(
+                ResultsStore(path), args.bots, PROFILES[args.profile], args.duration,
+                seed=args.seed, training=args.training
+            )
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+from bisect import bisect_right
+
+# Upper bounds (exclusive) of the term buckets; anything >= 1000 shares the last bucket
+BUCKET_EDGES = (10, 20, 50, 100, 1000)
+BUCKET_COUNT = len(BUCKET_EDGES) + 1
+
+
+def term_bucket(value):
+    return bisect_right(BUCKET_EDGES, value)
+
+
+def bucket_bounds(bucket):
+    """Inclusive (low, high) values of a bucket; None means unbounded"""
+    low = BUCKET_EDGES[bucket - 1] if bucket > 0 else None
+    high = BUCKET_EDGES[bucket] - 1 if bucket < len(BUCKET_EDGES) else None
+    return low, high
+
+
+def skill_terms(operation, term1, term2):
+    """The terms a question was drawn from; a division is bucketed by its quotient"""
+    if operation == '÷' and term2:
+        return term1 // term2, term2
+    return term1, term2
+
+
+def skill_cell(operation, term1, term2):
+    x, y = skill_terms(operation, term1, term2)
+    return operation, term_bucket(x), term_bucket(y)
+
+
+def bucket_sql(column):
+    """SQL expression equivalent to term_bucket for a column or expression"""
+    cases = ' '.join(f'WHEN {column} < {edge} THEN {i}' for i, edge in enumerate(BUCKET_EDGES))
+    return f'(CASE {cases} ELSE {len(BUCKET_EDGES)} END)'
+
+
+SKILL_TERM1_SQL = "(CASE WHEN operation = '÷' AND term2 != 0 THEN term1 / term2 ELSE term1 END)"
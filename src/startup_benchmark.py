@@ -0,0 +1,140 @@
+# startup_benchmark.py
+"""Measure how long the app takes to show its menu, and fail if startup regresses.
+
+Examples:
+    python startup_benchmark.py
+    python startup_benchmark.py --repeat 10 --max-menu-ms 800
+
+Each run starts a fresh interpreter under QT_QPA_PLATFORM=offscreen:
+  - 'python -X importtime -c "import main"' gives the import time of main
+    and of PyQt5.QtWidgets within it, and the modules loaded;
+  - a second process runs main.main() and reports once the menu has been
+    drawn (the point main.py opens the store and starts warming imports),
+    so time-to-menu covers interpreter start, imports and building the
+    menu.
+The medians are compared with the thresholds. Startup also fails outright
+if any module in HEAVY_MODULES is loaded before the menu.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from simulation import print_report
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+# Loaded after the menu is shown (warmup.py) or on first use, never before
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'pyarrow', 'game_engine', 'problem_index', 'results_window',
+                 'charts', 'multiprocessing', 'sqlite3', 'results_store', 'data_manager', 'journal')
+# Defaults for the regression thresholds, in milliseconds
+MAX_APP_IMPORT_MS = 50
+MAX_MENU_MS = 1000
+# A run that hasn't shown the menu by then is killed and counts as a failure
+MENU_TIMEOUT_SECONDS = 30
+
+# Runs main.main() until the menu has been drawn, then prints the heavy modules loaded so far and quits
+MENU_PROBE = '''
+import sys
+import main
+from PyQt5.QtWidgets import QApplication
+
+def menu_shown(controller):
+    print(' '.join(name for name in {heavy!r} if name in sys.modules), flush=True)
+    QApplication.instance().quit()
+
+main.after_menu_shown = menu_shown
+sys.argv = ['main.py']
+main.main()
+'''
+
+
+def child_env():
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    return env
+
+
+def import_times():
+    """(ms to import main, ms of that spent in PyQt5.QtWidgets, set of module names loaded)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=SRC_DIR, env=child_env(), capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, total, name = line.split('|')
+        # The first (outermost) import of a module is the one that paid for it
+        cumulative.setdefault(name.strip(), int(total) / 1e3)
+    return cumulative['main'], cumulative.get('PyQt5.QtWidgets', 0.0), set(cumulative)
+
+
+def time_to_menu():
+    """(ms from launching the app until its menu has been drawn, heavy modules loaded by then)"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', MENU_PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=SRC_DIR, env=child_env(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    watchdog = threading.Timer(MENU_TIMEOUT_SECONDS, process.kill)
+    watchdog.start()
+    try:
+        line = process.stdout.readline()
+        elapsed = (time.perf_counter() - start) * 1e3
+        process.wait()
+    finally:
+        watchdog.cancel()
+    if process.returncode or not line:
+        raise SystemExit(f'The app never reported showing its menu (exit status {process.returncode})')
+    return elapsed, set(line.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='runs; the medians are reported')
+    parser.add_argument('--max-app-import-ms', type=float, default=MAX_APP_IMPORT_MS,
+                        help="fail if importing main takes longer than this beyond PyQt5's own import")
+    parser.add_argument('--max-menu-ms', type=float, default=MAX_MENU_MS,
+                        help='fail if launching the app takes longer than this to show the menu')
+    args = parser.parse_args()
+
+    main_ms, qt_ms, menu_ms = [], [], []
+    heavy = set()
+    for _ in range(args.repeat):
+        total, qt, modules = import_times()
+        main_ms.append(total)
+        qt_ms.append(qt)
+        heavy |= modules.intersection(HEAVY_MODULES)
+        elapsed, loaded = time_to_menu()
+        menu_ms.append(elapsed)
+        heavy |= loaded
+
+    app_ms = [total - qt for total, qt in zip(main_ms, qt_ms)]
+    report = {
+        'import_main_ms': statistics.median(main_ms),
+        'import_pyqt5_widgets_ms': statistics.median(qt_ms),
+        'import_app_ms': statistics.median(app_ms),
+        'time_to_menu_ms': statistics.median(menu_ms),
+        'heavy_modules_before_menu': ', '.join(sorted(heavy)) or 'none',
+    }
+    print_report(report)
+
+    failures = []
+    if heavy:
+        failures.append(f"loaded before the menu: {', '.join(sorted(heavy))}")
+    if report['import_app_ms'] > args.max_app_import_ms:
+        failures.append(f"importing main beyond PyQt5 took {report['import_app_ms']:.1f}ms "
+                        f'(limit {args.max_app_import_ms:g}ms)')
+    if report['time_to_menu_ms'] > args.max_menu_ms:
+        failures.append(f"the menu took {report['time_to_menu_ms']:.0f}ms to appear (limit {args.max_menu_ms:g}ms)")
+    if failures:
+        raise SystemExit('Startup regressed: ' + '; '.join(failures))
+    print('Startup is within the thresholds')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# store_benchmark.py
+"""Check that saving a game takes as long with 10,000 stored games as with 10.
+
+Examples:
+    python store_benchmark.py
+    python store_benchmark.py --sizes 10 1000 100000 --games 100
+
+For each size a store is filled with that many synthetic games (as in
+export_benchmark.py, 100 answers each) and its summaries are built, then
+--games simulated games are played and saved into it. Save time is flat
+when the largest store's mean save costs no more than MAX_GROWTH times the
+smallest's; otherwise the script exits with an error.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from export_benchmark import QUESTIONS_PER_SESSION, build_store
+from results_store import ResultsStore
+from simulation import PROFILES, print_report, run_simulation
+
+# Allowed ratio of the largest store's mean save time to the smallest's
+MAX_GROWTH = 1.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10_000],
+                        help='stored games before the timed saves')
+    parser.add_argument('--games', type=int, default=50, help='games saved and timed at each size')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            db = os.path.join(tmp, f'store_{size}.db')
+            start = time.perf_counter()
+            build_store(db, size * QUESTIONS_PER_SESSION, args.seed)
+            store = ResultsStore(db)
+            # Build the per-session summaries and weakness tallies the app keeps up to date as it saves
+            store.session_statistics()
+            store.weakness_tallies()
+            report[f'build_{size}_games_seconds'] = time.perf_counter() - start
+            result = run_simulation(store, args.games, PROFILES['average'], seed=args.seed)
+            report[f'save_ms_at_{size}_games'] = result['save_ms_per_game']
+            os.remove(db)
+
+    smallest, largest = min(args.sizes), max(args.sizes)
+    growth = report[f'save_ms_at_{largest}_games'] / report[f'save_ms_at_{smallest}_games']
+    report['save_growth'] = growth
+    print_report(report)
+    if growth > MAX_GROWTH:
+        raise SystemExit(f'Saving a game got {growth:.2f}x slower from {smallest:,} to {largest:,} stored games')
+    print(f'Save time is flat (within {MAX_GROWTH}x) from {smallest:,} to {largest:,} stored games')
+
+
+if __name__ == '__main__':
+    main()
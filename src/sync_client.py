@@ -0,0 +1,199 @@
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+from profiling import timed
+from results_store import DATA_DIR
+from session_recorder import OPERATIONS
+
+SYNC_QUEUE_DIR = os.path.join(DATA_DIR, 'sync_queue')
+BATCH_SIZE = 500
+TIMEOUT_SECONDS = 10
+# Retry delay after a failed upload doubles from the first value up to the second
+RETRY_SECONDS = (1, 60)
+
+
+def session_payload(session):
+    """Summary of a finished GameSession as uploaded to the leaderboard service"""
+    recorder = session.recorder
+    return {
+        'player': session.profile,
+        'session': session.name,
+        'started_at': session.started_at,
+        'ranges': session.ranges,
+        'operations': {
+            op: [recorder.operation_counts[code], recorder.operation_correct[code], recorder.operation_time[code]]
+            for code, op in enumerate(OPERATIONS)
+            if recorder.operation_counts[code]
+        },
+    }
+
+
+class SyncClient:
+    """Uploads finished sessions to a leaderboard service from a background thread.
+
+    Each session is first written to a queue directory, so uploads survive
+    the service being unreachable or the app being closed; the thread sends
+    whatever is queued in batches over one kept-alive connection and backs
+    off while the service is down. The service ignores sessions it already
+    has, so a batch that was sent but not acknowledged is simply sent again.
+    Sessions the service can't accept are renamed to .rejected one by one;
+    the rest of their batch still goes through.
+    """
+
+    def __init__(self, url, directory=SYNC_QUEUE_DIR, batch_size=BATCH_SIZE):
+        url = urlsplit(url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = url.path.rstrip('/') + '/sessions'
+        self.directory = directory
+        self.batch_size = batch_size
+        self.connection = None
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.idle = threading.Event()
+        self.last_error = None
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name='sync-upload', daemon=True)
+        self.thread.start()
+
+    @timed('sync.submit_session')
+    def submit_session(self, session):
+        self.submit(session_payload(session))
+
+    def submit(self, payload):
+        """Queue one session summary for upload; returns immediately"""
+        with self.lock:
+            self.sequence += 1
+            name = f'{time.time_ns():020d}_{os.getpid()}_{self.sequence}.json'
+        path = os.path.join(self.directory, name)
+        # Written under a temporary name so the uploader never reads half a file
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        self.idle.clear()
+        self.wakeup.set()
+
+    def pending(self):
+        return sorted(entry for entry in os.listdir(self.directory) if entry.endswith('.json'))
+
+    def flush(self, timeout=None):
+        """Wait until the queue is empty (or an upload fails); returns True if empty"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            self.wakeup.set()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if (remaining is not None and remaining <= 0) or not self.idle.wait(remaining):
+                return False
+            if self.last_error is not None:
+                return not self.pending()
+            # Otherwise something was queued just as the uploader went idle; go round again
+            self.idle.clear()
+        return True
+
+    def _run(self):
+        delay = RETRY_SECONDS[0]
+        while True:
+            try:
+                while self._send_batch():
+                    pass
+                self.last_error = None
+                delay = RETRY_SECONDS[0]
+                timeout = None
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.last_error = e
+                self._disconnect()
+                timeout = delay
+                delay = min(delay * 2, RETRY_SECONDS[1])
+            self.idle.set()
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+    def _send_batch(self):
+        """Upload the oldest queued sessions; returns False once the queue is empty"""
+        entries = self.pending()[:self.batch_size]
+        if not entries:
+            return False
+        sent = []
+        sessions = []
+        for entry in entries:
+            try:
+                with open(os.path.join(self.directory, entry), encoding='utf-8') as f:
+                    sessions.append(json.load(f))
+            except FileNotFoundError:
+                continue  # sent by another instance sharing the queue
+            except ValueError:
+                self._reject(entry)
+                continue
+            sent.append(entry)
+        if sent:
+            self._upload(sent, sessions)
+        return True
+
+    def _upload(self, entries, sessions):
+        result = self._post(json.dumps({'sessions': sessions}, ensure_ascii=False).encode('utf-8'))
+        if result is None:
+            if len(entries) == 1:
+                self._reject(entries[0])
+                return
+            # The whole batch was refused (too large, or a service that stops at the first bad
+            # session); halves narrow it down to the sessions at fault
+            middle = len(entries) // 2
+            self._upload(entries[:middle], sessions[:middle])
+            self._upload(entries[middle:], sessions[middle:])
+            return
+        rejected = {item['index'] for item in result.get('rejected', [])}
+        for index, entry in enumerate(entries):
+            if index in rejected:
+                self._reject(entry)
+                continue
+            try:
+                os.remove(os.path.join(self.directory, entry))
+            except FileNotFoundError:
+                pass
+
+    def _reject(self, entry):
+        """Set a session aside: retrying one the service refuses would block the queue forever"""
+        path = os.path.join(self.directory, entry)
+        try:
+            os.replace(path, path + '.rejected')
+        except FileNotFoundError:
+            pass
+
+    def _post(self, body):
+        """The service's reply to an upload, or None if it refused the whole upload"""
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=TIMEOUT_SECONDS)
+            response = self._request(body)
+        else:
+            try:
+                response = self._request(body)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The kept-alive connection went stale while idle; reconnect once
+                self._disconnect()
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=TIMEOUT_SECONDS)
+                response = self._request(body)
+        data = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            self._disconnect()
+        if 400 <= response.status < 500:
+            print(f"Leaderboard service rejected an upload ({response.status}): {data[:200]!r}")
+            return None
+        if response.status != 200:
+            raise ValueError(f'upload failed ({response.status})')
+        result = json.loads(data)
+        for item in result.get('rejected', []):
+            print(f"Leaderboard service rejected a session: {item.get('error')}")
+        return result
+
+    def _request(self, body):
+        self.connection.request('POST', self.path, body, {'Content-Type': 'application/json'})
+        return self.connection.getresponse()
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
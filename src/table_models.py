@@ -0,0 +1,285 @@
+import math
+from array import array
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
+from histogram import QUANTILES, quantile_name
+from session_recorder import OPERATION_CODES
+
+# Rows handed to the view per fetchMore call
+FETCH_SIZE = 500
+
+CORRECT_COLOUR = QColor(144, 238, 144)  # Light green
+INCORRECT_COLOUR = QColor(255, 182, 193)  # Light red
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """Read-only table over column arrays, with no per-cell objects.
+
+    `rows` holds the indexes of the visible rows in display order; sorting and
+    filtering only rebuild it. Rows reach the view in FETCH_SIZE batches
+    through canFetchMore/fetchMore, so opening a huge table costs one batch.
+    Columns that sort_columns can give as NumPy arrays are sorted there
+    rather than with a Python key per row.
+    """
+    headers = []
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = array('q', range(self.total_rows()))
+        self.loaded = min(FETCH_SIZE, len(self.rows))
+
+    def total_rows(self):
+        raise NotImplementedError
+
+    def value(self, row, column):
+        """Display value of a cell, by index into the underlying columns"""
+        raise NotImplementedError
+
+    def sort_key(self, column):
+        """Key function over row indexes used to sort by column"""
+        return lambda row: self.value(row, column)
+
+    def sort_columns(self, column):
+        """NumPy arrays indexed by row to sort by column, most significant first, or None to use sort_key"""
+        return None
+
+    def background(self, row, column):
+        return None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return str(self.value(row, index.column()))
+        if role == Qt.BackgroundRole:
+            return self.background(row, index.column())
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(FETCH_SIZE, len(self.rows) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        import numpy as np
+
+        self.beginResetModel()
+        keys = None if column < 0 else self.sort_columns(column)
+        rows = np.frombuffer(self.rows, dtype=np.int64)
+        if column < 0:
+            self.rows = array('q', np.sort(rows).tobytes())
+        elif keys is not None:
+            descending = order == Qt.DescendingOrder
+            if descending:
+                rows = rows[::-1]
+            # lexsort is stable and takes the most significant key last; sorting the
+            # reversed rows and reversing back keeps ties in order when descending
+            rows = rows[np.lexsort([key[rows] for key in reversed(keys)])]
+            self.rows = array('q', (rows[::-1] if descending else rows).tobytes())
+        else:
+            key = self.sort_key(column)
+            self.rows = array('q', sorted(self.rows, key=key, reverse=order == Qt.DescendingOrder))
+        del rows
+        self.loaded = min(max(self.loaded, FETCH_SIZE), len(self.rows))
+        self.endResetModel()
+
+    def set_filter(self, predicate=None):
+        """Show only rows whose index satisfies predicate (all rows if None)"""
+        self.beginResetModel()
+        rows = range(self.total_rows())
+        self.rows = array('q', rows if predicate is None else filter(predicate, rows))
+        self.loaded = min(FETCH_SIZE, len(self.rows))
+        self.endResetModel()
+
+    def set_mask(self, mask):
+        """Show only the rows where a NumPy boolean array indexed by row is true"""
+        import numpy as np
+
+        self.beginResetModel()
+        self.rows = array('q', np.flatnonzero(mask).astype(np.int64).tobytes())
+        self.loaded = min(FETCH_SIZE, len(self.rows))
+        self.endResetModel()
+
+
+def column_array(values, count):
+    """NumPy copy of the first count items of an array.array column"""
+    import numpy as np
+
+    # A copy rather than a view, so the column can still grow
+    return np.frombuffer(values, dtype=values.typecode, count=count).copy()
+
+
+class QuestionHistoryModel(ColumnarTableModel):
+    """Questions of the current game, read straight from the SessionRecorder columns"""
+    headers = ['Question', 'Your Answer', 'Correct Answer', 'Result']
+
+    def __init__(self, recorder, parent=None):
+        self.recorder = recorder
+        super().__init__(parent)
+
+    def total_rows(self):
+        return len(self.recorder)
+
+    def value(self, row, column):
+        if column == 0:
+            return self.recorder.question_at(row)
+        if column == 1:
+            return self.recorder.user_answer[row]
+        if column == 2:
+            return self.recorder.correct_answer_at(row)
+        return 'Correct' if self.recorder.correct[row] else 'Incorrect'
+
+    def sort_columns(self, column):
+        import numpy as np
+
+        recorder = self.recorder
+        n = len(recorder)
+        if column == 1:
+            return [column_array(recorder.user_answer, n)]
+        if column == 3:
+            return [column_array(recorder.correct, n)]
+        operation = column_array(recorder.operation, n)
+        term1 = column_array(recorder.term1, n)
+        term2 = column_array(recorder.term2, n)
+        if column == 0:
+            # Question order: by operation, then terms
+            return [operation, term1, term2]
+        # Correct answers, as session_recorder.correct_answer works them out
+        return [np.select(
+            [operation == OPERATION_CODES['+'], operation == OPERATION_CODES['-'], operation == OPERATION_CODES['×']],
+            [term1 + term2, term1 - term2, term1 * term2],
+            term1 // np.where(term2 == 0, 1, term2)
+        )]
+
+    def background(self, row, column):
+        if column != 3:
+            return None
+        return CORRECT_COLOUR if self.recorder.correct[row] else INCORRECT_COLOUR
+
+    def filter_by(self, operation=None, correct=None):
+        """Restrict to one operation and/or to correct (True) or incorrect (False) answers"""
+        import numpy as np
+
+        recorder = self.recorder
+        n = len(recorder)
+        if operation is None and correct is None:
+            self.set_filter()
+            return
+        mask = np.ones(n, dtype=bool)
+        if operation is not None:
+            mask &= column_array(recorder.operation, n) == OPERATION_CODES[operation]
+        if correct is not None:
+            mask &= column_array(recorder.correct, n) == (1 if correct else 0)
+        self.set_mask(mask)
+
+
+class AllGamesModel(ColumnarTableModel):
+    """One row per stored game, built from DataManager.get_all_game_statistics"""
+    headers = [
+        'Game Session',
+        'Total Questions',
+        'Correct Answers',
+        'Accuracy',
+        'Avg Time/Question',
+        'p50 Time',
+        'p90 Time',
+        'p99 Time',
+        'Performance by Operation'
+    ]
+
+    def __init__(self, all_stats, parent=None):
+        self.sessions = []
+        self.totals = array('q')
+        self.correct = array('q')
+        self.average_times = array('d')
+        names = [quantile_name(q) for q in QUANTILES]
+        self.percentiles = [array('d') for _ in names]
+        # Formatted when shown, so a long history opens without building a string per game
+        self.performance = []
+        # One pass over the history, as it can hold every game ever played
+        for game in all_stats:
+            self.sessions.append(game['Game Session'])
+            self.totals.append(game['Total Questions'])
+            self.correct.append(game['Correct Answers'])
+            self.average_times.append(game['Average Time Seconds'])
+            latency = game['Latency Percentiles']
+            for column, name in zip(self.percentiles, names):
+                column.append(latency[name])
+            self.performance.append(game['Performance by Operation'])
+        self.performance_text = None
+        super().__init__(parent)
+
+    def total_rows(self):
+        return len(self.sessions)
+
+    def accuracy(self, row):
+        return self.correct[row] / self.totals[row]
+
+    def value(self, row, column):
+        if column == 0:
+            return self.sessions[row]
+        if column == 1:
+            return self.totals[row]
+        if column == 2:
+            return self.correct[row]
+        if column == 3:
+            return f'{self.accuracy(row):.2%}'
+        if column == 4:
+            return f'{self.average_times[row]:.2f} seconds'
+        if column - 5 < len(self.percentiles):
+            value = self.percentiles[column - 5][row]
+            # Sessions compacted before sketches existed have none
+            return 'N/A' if math.isnan(value) else f'{value:.2f} seconds'
+        if self.performance_text is not None:
+            return self.performance_text[row]
+        return ', '.join(f"{op}: {acc:.2%}" for op, acc in self.performance[row].items())
+
+    def sort_key(self, column):
+        if column == len(self.headers) - 1 and self.performance_text is None:
+            # Sorting by it shows every string, so build them all once
+            self.performance_text = [self.value(row, column) for row in range(len(self.sessions))]
+        if column == len(self.headers) - 1:
+            return self.performance_text.__getitem__
+        return super().sort_key(column)
+
+    def sort_columns(self, column):
+        n = len(self.sessions)
+        if column == 1:
+            return [column_array(self.totals, n)]
+        if column == 2:
+            return [column_array(self.correct, n)]
+        if column == 3:
+            return [column_array(self.correct, n) / column_array(self.totals, n)]
+        if column == 4:
+            return [column_array(self.average_times, n)]
+        if 5 <= column < 5 + len(self.percentiles):
+            # NumPy sorts NaN (no sketch) after every number
+            return [column_array(self.percentiles[column - 5], n)]
+        return None
+
+    def filter_by(self, session_text=''):
+        """Show sessions whose name contains session_text"""
+        text = session_text.strip().lower()
+        sessions = self.sessions
+        if text:
+            self.set_filter(lambda row: text in sessions[row].lower())
+        else:
+            self.set_filter()
@@ -0,0 +1,20 @@
+import importlib
+import threading
+
+# Only needed once a game starts (question generation) or ends (results screen,
+# DataFrame export, analytics), so never imported before the menu is shown
+WARM_MODULES = ['numpy', 'game_engine', 'pandas', 'results_window']
+
+
+def warm_imports(modules=WARM_MODULES):
+    """Import heavy modules on a background thread while the user sets up a game"""
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+
+    thread = threading.Thread(target=run, name='warm-imports', daemon=True)
+    thread.start()
+    return thread